@@ -1,10 +1,11 @@
 from tkinter import messagebox as dialog
 import morpho.gui as gui
 import os, sys
+import multiprocessing
 
 pwd = gui.pwd
 
-def runMRM(filename=pwd+"resources"+os.sep+"lastplay.mrm", exportFilename="", autoclose=False):
+def runMRM(filename=pwd+"resources"+os.sep+"lastplay.mrm", exportFilename="", autoclose=False, start=0):
     try:
         state = gui.GUIstate()
         try:
@@ -23,40 +24,58 @@ def runMRM(filename=pwd+"resources"+os.sep+"lastplay.mrm", exportFilename="", au
             return
 
         if exportFilename == "":
-            state.run(autoclose=autoclose)
+            state.run(autoclose=autoclose, start=start)
         else:
             state.export(exportFilename)
     except:
         gui.showStandardError()
 
-# Parse script parameters
-export = False
-play = False
-argv = sys.argv[:]
-while "--export" in argv:
-    argv.remove("--export")
-    export = True
-
-while "--play" in argv:
-    argv.remove("--play")
-    play = True
-
-autoclose = False
-while "--autoclose" in argv:
-    argv.remove("--autoclose")
-    autoclose = True
-
-if export:
-    if len(argv) != 3:
-        raise Exception("--export flag requires exactly two file paths!")
-    runMRM(argv[1], argv[2], autoclose=autoclose)
-if play:
-    if len(argv) < 2:
-        raise Exception("No MRM supplied to play!")
-    runMRM(argv[1], autoclose=autoclose)
-if not(export) and not(play):
-    # If just one parameter, just start up the Morpho GUI normally
-    if len(argv) == 1:
-        gui.startGUI()
-    else:
-        gui.startGUI(argv[1])
+# The guard keeps the worker processes Morpho starts (see
+# morpho.parallel) from running this script again when they
+# import it. In the frozen executable the workers are started by
+# running it again, and freeze_support() hands them over to their
+# job instead.
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+
+    # Parse script parameters
+    export = False
+    play = False
+    argv = sys.argv[:]
+    while "--export" in argv:
+        argv.remove("--export")
+        export = True
+
+    while "--play" in argv:
+        argv.remove("--play")
+        play = True
+
+    autoclose = False
+    while "--autoclose" in argv:
+        argv.remove("--autoclose")
+        autoclose = True
+
+    # Seconds into the animation to start playing from
+    start = 0
+    while "--start" in argv:
+        i = argv.index("--start")
+        try:
+            start = float(argv[i+1])
+        except (IndexError, ValueError):
+            raise Exception("--start flag requires a number of seconds!") from None
+        del argv[i:i+2]
+
+    if export:
+        if len(argv) != 3:
+            raise Exception("--export flag requires exactly two file paths!")
+        runMRM(argv[1], argv[2], autoclose=autoclose)
+    if play:
+        if len(argv) < 2:
+            raise Exception("No MRM supplied to play!")
+        runMRM(argv[1], autoclose=autoclose, start=start)
+    if not(export) and not(play):
+        # If just one parameter, just start up the Morpho GUI normally
+        if len(argv) == 1:
+            gui.startGUI()
+        else:
+            gui.startGUI(argv[1])
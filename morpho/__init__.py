@@ -1,5 +1,13 @@
+import morpho.cache as cache
+import morpho.compiler as compiler
 import morpho.engine as engine
 import morpho.functions as functions
 import morpho.giffer as giffer
 import morpho.gui as gui
+import morpho.memo as memo
+import morpho.mpfunctions as mpfunctions
+import morpho.parallel as parallel
+import morpho.special as special
+import morpho.surrogate as surrogate
+import morpho.vfunctions as vfunctions
 import morpho.whitelist as whitelist
@@ -0,0 +1,201 @@
+'''
+This module implements an on-disk cache of computed keyframes so
+that playing or exporting an animation again doesn't recompute
+any of the function images that haven't changed since last time.
+
+Each keyframe is stored as a binary array of its (non-static)
+nodes under a key that hashes together everything its nodes
+depend on:
+
+* The Morpho version and the cache format version
+* The source code of the modules that evaluate formulas (see
+  sourceVersion()), so changing any of them doesn't bring back
+  keyframes computed the old way
+* The view (which the polar grid depends on)
+* Whether the special functions use mpmath
+* The nodes of the domain frame (which covers all of the domain
+  frame settings that can affect them)
+* The chain of function formulas leading from the domain frame
+  down to the keyframe
+
+Things like timing, colors and frame rate aren't part of the key,
+so changing them reuses the cached nodes.
+
+The cache lives in resources/cache and is trimmed back to maxBytes
+(dropping the least recently used keyframes) whenever something
+new is stored.
+
+Caching is off by default. Turn it on with
+
+    morpho.cache.enabled = True
+'''
+
+import os
+import hashlib
+import numpy as np
+
+import morpho.engine as eng
+import morpho.functions as functions
+
+# Bump this whenever the way keyframes get computed changes
+# in a way the rest of the key doesn't capture.
+version = 1
+
+# Caching is opt-in
+enabled = False
+
+# Location of the cache
+directory = eng.pwd + "resources" + os.sep + "cache"
+
+# Largest total size of the cached files (in bytes)
+maxBytes = 256*2**20
+
+# Number of keyframes found and not found in the cache
+hits = 0
+misses = 0
+
+# Hashes the given parts (strings, numbers or numpy arrays) into a
+# hex digest key.
+def key(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            data = np.ascontiguousarray(part)
+            h.update(("array %s %s\n" % (data.dtype.str, data.shape)).encode())
+            h.update(data.tobytes())
+        else:
+            h.update(("%s %r\n" % (type(part).__name__, part)).encode())
+    return h.hexdigest()
+
+# Modules whose code decides the values formulas come out with
+_evaluators = ["compiler", "functions", "vfunctions", "mpfunctions",
+    "special", "surrogate"]
+_sourceVersion = None
+
+# Hash of the source code of the modules evaluating formulas. Any
+# change to them (which may change the last bits of some values)
+# changes every key.
+def sourceVersion():
+    global _sourceVersion
+    if _sourceVersion is None:
+        h = hashlib.sha256()
+        for name in _evaluators:
+            path = os.path.join(os.path.dirname(__file__), name + ".py")
+            try:
+                with open(path, "rb") as file:
+                    h.update(file.read())
+            except OSError:
+                h.update(name.encode())
+        _sourceVersion = h.hexdigest()
+    return _sourceVersion
+
+# Key of the domain frame of an animation with the given Morpho
+# version and view. All keys of the keyframes descending from it
+# are built on this one (see childKey()).
+# Keys are only worked out while the cache is enabled, and are None
+# otherwise.
+def rootKey(frame, morphoVersion, view):
+    if not enabled:
+        return None
+    return key("root", version, sourceVersion(), morphoVersion,
+        list(view), functions.useMpmath, frame.pack().dynamicNodes())
+
+# Key of the keyframe made by applying the given formula to the
+# keyframe with the given key. Any options changing how the
+# formula gets evaluated (e.g. using conjugate symmetry or a
+# surrogate, which change the last bits of the values) are part
+# of the key too.
+def childKey(parentKey, formula, *options):
+    if parentKey is None:
+        return None
+    return key("child", parentKey, formula, *options)
+
+def _filename(k):
+    return os.path.join(directory, k + ".npy")
+
+# Returns the node array stored under the given key or None if
+# there isn't one (or it can't be read, or doesn't have the
+# expected number of nodes).
+def load(k, count=None):
+    filename = _filename(k)
+    try:
+        values = np.load(filename, allow_pickle=False)
+    except (OSError, ValueError):
+        return None
+    if values.dtype != complex or values.ndim != 1 or \
+        (count is not None and len(values) != count):
+        return None
+    try:
+        os.utime(filename)  # Mark as recently used
+    except OSError:
+        pass
+    return values
+
+# Is True if there is something stored under the given key
+def contains(k):
+    return os.path.isfile(_filename(k))
+
+# Stores the node array under the given key. Failing to write
+# just means the keyframe doesn't get cached.
+def save(k, values):
+    try:
+        os.makedirs(directory, exist_ok=True)
+        temp = _filename(k) + ".%d.tmp" % os.getpid()
+        with open(temp, "wb") as file:
+            np.save(file, np.asarray(values, dtype=complex), allow_pickle=False)
+        os.replace(temp, _filename(k))
+    except OSError:
+        return
+    trim()
+
+# Deletes the least recently used files until the cache takes up
+# at most maxBytes.
+def trim():
+    try:
+        entries = []
+        for entry in os.scandir(directory):
+            if entry.name.endswith(".npy"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+        return
+    total = sum(size for mtime, size, path in entries)
+    for mtime, size, path in sorted(entries):
+        if total <= maxBytes: break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+# Deletes the whole cache
+def clear():
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return
+    for entry in entries:
+        if entry.name.endswith(".npy"):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+# Returns the image of the frame under func (like frame.fimage(func))
+# using the nodes cached under the given key if there are any.
+# Otherwise the image is computed and its nodes stored under the key.
+def fimage(frame, func, k):
+    global hits, misses
+    if not enabled:
+        return frame.fimage(func)
+
+    nodes = frame.pack().dynamicNodes()
+    values = load(k, len(nodes))
+    if values is not None:
+        hits += 1
+        return frame.withDynamicNodes(values)
+
+    misses += 1
+    values = eng.evalUniqueNodes(func, nodes)
+    save(k, values)
+    return frame.withDynamicNodes(values)
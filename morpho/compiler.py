@@ -0,0 +1,1324 @@
+'''
+This module turns Morpho function formulas (e.g. "s^2 + 1")
+into Evaluator objects.
+
+An Evaluator can be called on a single complex number exactly
+like the lambdas the GUI used to build, but it can also evaluate
+a whole numpy array of nodes in one go with its evalArray()
+method. To do this, the formula is translated into numpy
+operations on the array versions of the Morpho functions found
+in morpho.vfunctions. Formulas that can't be translated (e.g.
+ones using a function with no array version) simply fall back
+to calling the scalar lambda on every node.
+
+Array values are exactly the scalar lambda's, down to the last
+bit: arithmetic is rounded the way python rounds it, and the
+transcendental functions are the C library's ones python uses
+(see morpho.vfunctions).
+
+IMP: Only compile formulas that have already passed
+whitelist.safeExpr()!
+'''
+
+import re
+import ast
+import types
+import operator
+import threading
+import numpy as np
+
+import morpho.engine as eng
+import morpho.functions as functions
+import morpho.mpfunctions as mpfunctions
+import morpho.vfunctions as vfunctions
+
+# Names available to scalar formulas. This is the same namespace
+# the GUI provides: everything in morpho.functions plus isbadnum.
+scalarNamespace = {}
+for name, value in vars(functions).items():
+    if name.startswith("_") or isinstance(value, types.ModuleType):
+        continue
+    scalarNamespace[name] = value
+scalarNamespace["isbadnum"] = eng.isbadnum
+
+# Names available to array formulas. Only names that also exist
+# in the scalar namespace count, so a formula means the same thing
+# in both.
+arrayNamespace = {}
+for name, value in vars(vfunctions).items():
+    if name.startswith("_") or isinstance(value, types.ModuleType):
+        continue
+    if name in scalarNamespace:
+        arrayNamespace[name] = value
+arrayNamespace.update(vfunctions.builtins)
+
+# The only attributes formulas may use on values. The matrix ones
+# only work on mats.
+_attributes = {"real", "imag"}
+_matAttributes = {"T", "I", "inv"}
+
+# Set this to True to have frames evaluated under real-analytic
+# formulas (ones with f(conj(s)) = conj(f(s)), see realAnalytic())
+# only evaluate the nodes in the upper half plane and mirror the
+# values over to the lower half. Individual Evaluators can
+# override this with their useSymmetry attribute.
+conjugateSymmetry = False
+
+# Set this to True to have Evaluators redo the nodes where double
+# precision fails in mpmath (at mpfunctions.dps digits): nodes whose
+# value comes out inf or nan, and nodes where a sum loses more than
+# half its digits to cancellation (see _ErrorMask). Everything else
+# keeps its double precision value.
+hybrid = False
+
+# Describes the precision Evaluators currently work in, for keys of
+# cached values (see morpho.cache and morpho.surrogate).
+def precision():
+    if hybrid:
+        return ("hybrid", mpfunctions.dps)
+    return "double"
+
+
+# Compiled formula. Behaves like the function
+#   lambda s: complex(<formula>)
+# when called, and also provides the array evaluator evalArray().
+# Extra keyword arguments are extra names the formula can use
+# (e.g. polargrid). Extras that are themselves Evaluators or plain
+# numbers work in array formulas too, any other kind of extra
+# forces the scalar fallback if the formula uses it.
+class Evaluator(object):
+    def __init__(self, expr, **extras):
+        self.expr = expr
+        pyexpr = expr.replace("^", "**")  # Pythonize carets
+        self.pyexpr = pyexpr
+        self.extras = extras
+
+        namespace = dict(scalarNamespace)
+        namespace.update(extras)
+        self.scalar = eval(_code(("scalar", pyexpr), lambda: compile(
+            "lambda s: complex(" + pyexpr + ")", "<string>", "eval")),
+            namespace)
+
+        # Array version of the formula. None if it can't be done.
+        arrayExtras = {}
+        for name, value in extras.items():
+            if isinstance(value, Evaluator):
+                if value.vector is not None:
+                    arrayExtras[name] = value.arrayFunction
+            elif isinstance(value, (int, float, complex)):
+                arrayExtras[name] = value
+        self.vector = vectorize(pyexpr, arrayExtras)
+
+        # Whether evaluating the formula on every node costs less
+        # than engine.evalUniqueNodes() would spend finding the
+        # duplicate ones to skip. That's the case for vectorized
+        # formulas without sums or products (which add up lots of
+        # terms at every node) or special functions like zeta.
+        self.cheap = self.vector is not None \
+            and not any(word in _reductions or word in _special
+                for word in re.findall(r"\w+", pyexpr)) \
+            and all(value.cheap for value in extras.values()
+                if isinstance(value, Evaluator))
+
+        # Whether the formula is known to satisfy
+        # f(conj(s)) = conj(f(s)) (see realAnalytic()), and whether
+        # to make use of that when evaluating a whole frame. If
+        # useSymmetry is None, the module setting conjugateSymmetry
+        # decides.
+        self.realAnalytic = realAnalytic(pyexpr, extras)
+        self.useSymmetry = None
+
+        # Number of nodes evalArray() has had to hand over to the
+        # scalar lambda so far, and number of nodes (or calls)
+        # redone in mpmath in hybrid mode. engine.evalNodes() can
+        # call evalArray() from several threads at once, so these
+        # are only updated through _count().
+        self.scalarCount = 0
+        self.preciseCount = 0
+        self._countLock = threading.Lock()
+
+        self._mpFunction = None
+        self._mpDps = None
+
+    # In hybrid mode, a value that comes out inf or nan (or raises
+    # an error) in double precision is redone in mpmath.
+    def __call__(self, s):
+        if not hybrid:
+            return self.scalar(s)
+        try:
+            value = self.scalar(s)
+            if not eng.isbadnum(value):
+                return value
+        except Exception:
+            pass
+        self._count(precise=1)
+        return mpfunctions.evaluate(self.mpFunction, s)
+
+    # The formula as a function of an mpc giving an mpmath number
+    # (see morpho.mpfunctions). Only built when first needed, and
+    # built again whenever mpfunctions.dps has changed since, since
+    # the constants in it (e.g. pi) are only good to the dps it was
+    # built at.
+    @property
+    def mpFunction(self):
+        if self._mpFunction is None or self._mpDps != mpfunctions.dps:
+            self._mpDps = mpfunctions.dps
+            extras = {}
+            for name, value in self.extras.items():
+                if isinstance(value, Evaluator):
+                    value = value.mpFunction
+                extras[name] = value
+            self._mpFunction = mpfunctions.makeLambda(self.pyexpr, extras)
+        return self._mpFunction
+
+    # Evaluates the formula at every node of the given array in
+    # mpmath. Nodes where it raises an error come out nan.
+    def evalPrecise(self, nodes):
+        func = self.mpFunction
+        values = np.empty(len(nodes), dtype=complex)
+        for n, z in enumerate(nodes.tolist()):
+            try:
+                values[n] = mpfunctions.evaluate(func, z)
+            except Exception:
+                values[n] = nan
+        self._count(precise=len(nodes))
+        return values
+
+    def _count(self, scalar=0, precise=0):
+        with self._countLock:
+            self.scalarCount += scalar
+            self.preciseCount += precise
+
+    # Is True if engine.evalUniqueNodes() should only evaluate the
+    # formula in the upper half plane and get the values in the
+    # lower half plane by conjugating those of the mirror nodes.
+    @property
+    def symmetric(self):
+        if self.useSymmetry is not None:
+            return self.useSymmetry
+        return conjugateSymmetry and self.realAnalytic
+
+    # Is True if evalArray() can actually vectorize the formula.
+    @property
+    def vectorized(self):
+        return self.vector is not None
+
+    # Evaluates the formula on every node of the given complex
+    # array. Returns a complex array of the results, or None if the
+    # formula can't be evaluated as an array. In that case the
+    # caller should fall back to calling the evaluator node by node
+    # (engine.evalNodes() does this automatically).
+    #
+    # The array evaluation runs with numpy's floating point errors
+    # silenced, but keeps track of every node where the scalar
+    # version would have raised an error (e.g. log(0) or 1/s at the
+    # origin). Those nodes, along with any node whose value came out
+    # inf or nan, are then re-evaluated through the scalar lambda
+    # (each distinct one just once) so that the same nodes come out
+    # finite as in the node by node evaluation, and with the same
+    # values (see tests/test_conformance.py).
+    # In hybrid mode, the nodes still coming out inf or nan after
+    # that, and the ones with too much cancellation, are then redone
+    # in mpmath.
+    def evalArray(self, nodes):
+        if self.vector is None: return None
+        err = _ErrorMask(track=hybrid)
+        try:
+            with np.errstate(all="ignore"):
+                values = self.vector(nodes, err)
+        except Exception:
+            return None
+
+        redo = np.broadcast_to(err.mask, values.shape) | ~np.isfinite(values)
+        if np.any(redo):
+            values[redo] = eng.evalUniqueNodes(self.scalar, nodes[redo])
+            self._count(scalar=int(np.count_nonzero(redo)))
+        if hybrid:
+            slow = np.broadcast_to(err.lossy, values.shape) | ~np.isfinite(values)
+            if np.any(slow):
+                values[slow] = self.evalPrecise(nodes[slow])
+        return values
+
+    # Array version of the evaluator for use inside other formulas.
+    # Unlike evalArray() it doesn't re-evaluate anything. Nodes that
+    # would have raised an error just come out nan, which the outer
+    # formula picks up on.
+    def arrayFunction(self, s):
+        err = _ErrorMask()
+        values = self.vector(s, err)
+        if np.any(err.mask):
+            values[np.broadcast_to(err.mask, values.shape)] = nan
+        return values
+
+    def __repr__(self):
+        return "Evaluator(" + repr(self.expr) + ")"
+
+# Convenience function. Same as Evaluator(expr, **extras).
+def compileExpr(expr, **extras):
+    return Evaluator(expr, **extras)
+
+
+### TRANSLATION INTO NUMPY ###
+
+# Raised when a formula uses something with no array version.
+class NotVectorizable(Exception):
+    pass
+
+# Builds the array version of a (pythonized) formula.
+# The result is a function vector(s, err) taking an array (or a
+# single number) s and an _ErrorMask err, and returning
+# complex(<formula>) as a complex array of the same shape as s.
+# Nodes where the scalar formula would raise an error are flagged
+# in err. Returns None if the formula can't be vectorized.
+def vectorize(pyexpr, extras=None):
+    if extras is None: extras = {}
+    namespace = dict(arrayNamespace)
+    namespace.update(extras)
+    compiled = _code(("vector", pyexpr, tuple(sorted(extras))),
+        lambda: _translate(pyexpr, namespace))
+    if compiled is None:
+        return None
+    code, series = compiled
+    namespace.update(_helpers)
+    namespace.update(series)
+    return eval(code, namespace)
+
+# Formulas parsed and compiled so far, so that building an
+# animation again doesn't compile all its formulas again. At most
+# maxCompiled are kept, the oldest being dropped first.
+maxCompiled = 256
+_compiled = {}
+
+# Parse tree or code stored under key, made by build() the first
+# time
+def _code(key, build):
+    if key in _compiled:
+        return _compiled[key]
+    code = _compiled[key] = build()
+    while len(_compiled) > maxCompiled:
+        del _compiled[next(iter(_compiled))]
+    return code
+
+# Translates a formula (see vectorize()) using the names in
+# namespace, and compiles it. Returns the code along with the
+# values of the series in it, or None if it can't be vectorized.
+def _translate(pyexpr, namespace):
+    # Parse the formula the same way the scalar lambda sees it,
+    # i.e. as the arguments of a call to complex().
+    source = "complex(" + pyexpr + ")"
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError:
+        return None
+    call = tree.body
+    if len(call.args) != 1 or len(call.keywords) != 0 \
+        or isinstance(call.args[0], ast.Starred):
+        return None
+
+    subexpressions = _Subexpressions(source.encode())
+    subexpressions.scan(call.args[0])
+    translator = _ArrayTranslator(namespace, subexpressions)
+    try:
+        body = translator.visit(call.args[0])
+    except NotVectorizable:
+        return None
+    lam = ast.Expression(body=_lambda(["s", "_err"],
+        _call("_complex", [body, _name("s")])))
+    return compile(lam, "<formula>", "eval"), translator.series
+
+# Syntax tree building shortcuts. The formula is all on one line,
+# so every new node just gets put at the start of it (which is a
+# lot quicker than ast.fix_missing_locations() on a big formula).
+# Names are only ever loaded, so each one is made once and shared.
+_at = {"lineno": 1, "col_offset": 0, "end_lineno": 1, "end_col_offset": 0}
+_nameNodes = {}
+
+def _name(id):
+    node = _nameNodes.get(id)
+    if node is None:
+        node = _nameNodes[id] = ast.Name(id=id, ctx=ast.Load(), **_at)
+    return node
+
+def _literal(value):
+    return ast.Constant(value=value, **_at)
+
+def _call(name, args):
+    return ast.Call(func=_name(name), args=args, keywords=[], **_at)
+
+def _lambda(argnames, body):
+    return ast.Lambda(
+        args=ast.arguments(posonlyargs=[],
+            args=[ast.arg(arg=name, **_at) for name in argnames],
+            kwonlyargs=[], kw_defaults=[], defaults=[]),
+        body=body, **_at)
+
+# Wraps a subexpression that python may never get round to
+# evaluating (e.g. the unused branch of an if-else) in a
+# "lambda _err, s: ..." so it gets its own error mask and can be
+# evaluated at just some of the nodes, by handing it just those
+# values of the variables in scope (see _evalAt()).
+def _thunk(node, variables):
+    return _lambda(["_err"] + variables, node)
+
+# Looks through a formula for the subexpressions it repeats (like
+# the s.real%12%3 all over a fractal's if-elses), which get
+# evaluated once and reused (see _ArrayTranslator.visit()).
+# Subexpressions are told apart by their text in the formula
+# (source, as bytes), and the same text always translates to the
+# same thing.
+class _Subexpressions(object):
+    def __init__(self, source):
+        self.source = source
+        self.nodes = {}  # One node for each subexpression's text
+        self.always = {}
+        self.repeated = set()
+
+    def text(self, node):
+        return self.source[node.col_offset:node.end_col_offset]
+
+    # Texts of the subexpressions python evaluates every time it
+    # evaluates node (node's own one included), as the keys of a
+    # dict, innermost first. Each text is only looked into once.
+    def scan(self, node):
+        if isinstance(node, (ast.Name, ast.Constant)):
+            return {}
+        text = self.text(node)
+        found = self.always.get(text)
+        if found is not None:
+            self.repeated.add(text)
+            return found
+        if isinstance(node, ast.IfExp):
+            found = dict(self.scan(node.test))
+            orelse = self.scan(node.orelse)
+            found.update((t, None) for t in self.scan(node.body)
+                if t in orelse)
+        elif isinstance(node, ast.BoolOp):
+            found = dict(self.scan(node.values[0]))
+            for value in node.values[1:]:
+                self.scan(value)
+        elif isinstance(node, ast.Compare):
+            found = dict(self.scan(node.left))
+            found.update(self.scan(node.comparators[0]))
+            for comp in node.comparators[1:]:
+                self.scan(comp)
+        elif isinstance(node, (ast.GeneratorExp, ast.ListComp)):
+            # Series terms are evaluated on their own (see
+            # visit_Reduction())
+            self.scanChildren(node)
+            found = {}
+        else:
+            found = self.scanChildren(node)
+        found[text] = None
+        self.always[text] = found
+        self.nodes[text] = node
+        return found
+
+    # What scan() found for node, without counting it as a repeat
+    def alwaysIn(self, node):
+        if isinstance(node, (ast.Name, ast.Constant)):
+            return {}
+        return self.always[self.text(node)]
+
+    def scanChildren(self, node):
+        found = {}
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, ast.expr):
+                found.update(self.scan(child))
+            elif not isinstance(child, ast.expr_context):
+                found.update(self.scanChildren(child))
+        return found
+
+# Part of the formula with its own variables: the whole formula, the
+# term of a series, or a thunk. bound maps the repeated
+# subexpressions already evaluated in it to the names holding their
+# values, and used lists the names a thunk needs handed to it from
+# the scopes around it.
+class _Scope(object):
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.bound = {}
+        self.used = []
+
+# Rewrites a formula's syntax tree into one that works on arrays.
+# Arithmetic is replaced by helpers (addition and subtraction just
+# to check for cancellation, the others to copy python's complex
+# arithmetic), and everything else that can raise an error (function
+# calls, ordering complex numbers) or that depends on truth values
+# (if-else, and, or, not) is replaced by a call to one of the
+# elementwise helpers below, which all take the current error mask
+# _err as their first argument.
+# sum() and prod() over a literal list, range() or seq() become
+# calls to _series() (see below), and the values they run over are
+# collected in the series dict (to be added to the namespace).
+# Anything else raises NotVectorizable.
+# The original tree is left as it is, so the same node can be
+# translated more than once.
+class _ArrayTranslator(ast.NodeTransformer):
+    def __init__(self, namespace, subexpressions):
+        self.namespace = namespace
+        self.subexpressions = subexpressions
+        self.series = {}
+        self.loopVar = None  # Variable of the series being translated
+        self.scope = _Scope()
+        self.count = 0  # Variables made for repeated subexpressions
+
+    # Repeated subexpressions are evaluated the first time they come
+    # up and their value is kept in a variable (with :=) that later
+    # occurrences use instead, including ones inside thunks, which
+    # get handed just the part of the value they need like any other
+    # variable. The translator visits everything in the order python
+    # evaluates it, so a value is always there before it's used.
+    def visit(self, node):
+        subs = self.subexpressions
+        if isinstance(node, (ast.Name, ast.Constant)):
+            return ast.NodeTransformer.visit(self, node)
+        text = subs.text(node)
+        if text not in subs.repeated:
+            return ast.NodeTransformer.visit(self, node)
+        name = self.lookup(text)
+        if name is not None:
+            return _name(name)
+        return self.bind(text, ast.NodeTransformer.visit(self, node))
+
+    # Name holding the value of the subexpression with the given
+    # text, or None if it hasn't been evaluated yet in this scope or
+    # the ones around it.
+    def lookup(self, text):
+        inner = []
+        scope = self.scope
+        while scope is not None:
+            name = scope.bound.get(text)
+            if name is not None:
+                for thunk in inner:
+                    if name not in thunk.used:
+                        thunk.used.append(name)
+                return name
+            inner.append(scope)
+            scope = scope.parent
+        return None
+
+    # Keeps the value of node (translated) in a new variable
+    def bind(self, text, node):
+        name = "_v" + str(self.count)
+        self.count += 1
+        self.scope.bound[text] = name
+        return ast.NamedExpr(target=ast.Name(id=name, ctx=ast.Store(), **_at),
+            value=node, **_at)
+
+    def generic_visit(self, node):
+        raise NotVectorizable(type(node).__name__)
+
+    def visit_Constant(self, node):
+        if type(node.value) not in (int, float, complex, bool):
+            raise NotVectorizable("non-numeric constant")
+        return node
+
+    def visit_Name(self, node):
+        if node.id != "s" and node.id != self.loopVar \
+            and node.id not in self.namespace:
+            raise NotVectorizable(node.id)
+        return node
+
+    # Names of the variables in scope: s, and the variable of the
+    # series being translated (which may hide s)
+    def variables(self):
+        if self.loopVar is None or self.loopVar == "s":
+            return ["s"]
+        return ["s", self.loopVar]
+
+    # Translates the part of the formula build() translates as the
+    # body of a thunk, in a scope of its own
+    def branch(self, build):
+        scope = _Scope(self.scope)
+        self.scope = scope
+        try:
+            return build(), scope
+        finally:
+            self.scope = scope.parent
+
+    # Thunks (see _thunk()) of the given branches, followed by a
+    # tuple of the current values of the variables they all take.
+    # Values evaluated just for the thunks (hoisted, as := nodes) go
+    # at the start of the tuple.
+    def thunks(self, branches, hoisted=()):
+        variables = [value.target.id for value in hoisted] + self.variables()
+        for body, scope in branches:
+            variables += [name for name in scope.used
+                if name not in variables]
+        values = list(hoisted) + [_name(name)
+            for name in variables[len(hoisted):]]
+        return [_thunk(body, variables) for body, scope in branches] + \
+            [ast.Tuple(elts=values, ctx=ast.Load(), **_at)]
+
+    # Evaluates the repeated subexpressions that both branches of an
+    # if-else would evaluate anyway before picking between them, so
+    # they're worked out once for all the nodes rather than once in
+    # each branch. Returns the := nodes doing that.
+    def hoist(self, node):
+        subs = self.subexpressions
+        orelse = subs.alwaysIn(node.orelse)
+        both = [text for text in subs.alwaysIn(node.body)
+            if text in orelse and text in subs.repeated]
+        inner = set()
+        for text in both:
+            inner.update(t for t in subs.always[text] if t != text)
+        hoisted = []
+        for text in both:
+            if text not in inner:
+                value = self.visit(subs.nodes[text])
+                if isinstance(value, ast.NamedExpr):
+                    hoisted.append(value)
+        return hoisted
+
+    def visit_Attribute(self, node):
+        if node.attr in _matAttributes:
+            return _call("_matAttr", [self.visit(node.value),
+                _literal(node.attr)])
+        if node.attr not in _attributes:
+            raise NotVectorizable("." + node.attr)
+        return ast.Attribute(value=self.visit(node.value), attr=node.attr,
+            ctx=ast.Load(), **_at)
+
+    def visit_BinOp(self, node):
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        name = _binops.get(type(node.op))
+        if name is None:
+            raise NotVectorizable(type(node.op).__name__)
+        return _call(name, [_name("_err"), left, right])
+
+    def visit_UnaryOp(self, node):
+        operand = self.visit(node.operand)
+        if isinstance(node.op, ast.Not):
+            return _call("_not", [operand])
+        if not isinstance(node.op, (ast.USub, ast.UAdd)):
+            raise NotVectorizable(type(node.op).__name__)
+        return ast.UnaryOp(op=node.op, operand=operand, **_at)
+
+    def visit_Compare(self, node):
+        return self.chain(self.visit(node.left), node.ops,
+            node.comparators)
+
+    # Chained comparisons like a < b < c become
+    # (a < b) and (b < c), with b only evaluated once.
+    def chain(self, left, ops, comparators):
+        name = _comparisons.get(type(ops[0]))
+        if name is None:
+            raise NotVectorizable(type(ops[0]).__name__)
+        right = comparators[0]
+        value = self.visit(right)
+        if len(ops) == 1:
+            return _call(name, [_name("_err"), left, value])
+        if not isinstance(value, (ast.Name, ast.Constant, ast.NamedExpr)):
+            text = self.subexpressions.text(right)
+            self.subexpressions.repeated.add(text)
+            value = self.bind(text, value)
+        rest = self.branch(lambda: self.chain(self.visit(right),
+            ops[1:], comparators[1:]))
+        return _call("_both", [_name("_err"),
+            _call(name, [_name("_err"), left, value])] + self.thunks([rest]))
+
+    def visit_BoolOp(self, node):
+        return self.boolChain("_and" if isinstance(node.op, ast.And)
+            else "_or", node.values)
+
+    def boolChain(self, name, values):
+        first = self.visit(values[0])
+        if len(values) == 1:
+            return first
+        rest = self.branch(lambda: self.boolChain(name, values[1:]))
+        return _call(name, [_name("_err"), first] + self.thunks([rest]))
+
+    def visit_IfExp(self, node):
+        test = self.visit(node.test)
+        hoisted = self.hoist(node)
+        body = self.branch(lambda: self.visit(node.body))
+        orelse = self.branch(lambda: self.visit(node.orelse))
+        return _call("_where", [_name("_err"), test] +
+            self.thunks([body, orelse], hoisted))
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name):
+            raise NotVectorizable("call")
+        if node.func.id in _reductions and node.func.id != self.loopVar:
+            return self.visit_Reduction(node)
+        func = self.visit(node.func)
+        if func.id == "s" or func.id == self.loopVar:
+            raise NotVectorizable("call")
+        for arg in node.args:
+            if isinstance(arg, ast.Starred):
+                raise NotVectorizable("starred argument")
+        args = [_name("_err"), func] + [self.visit(arg) for arg in node.args]
+        keywords = []
+        for keyword in node.keywords:
+            if keyword.arg is None:
+                raise NotVectorizable("** argument")
+            keywords.append(ast.keyword(arg=keyword.arg,
+                value=self.visit(keyword.value), **_at))
+        return ast.Call(func=_name("_apply"), args=args, keywords=keywords,
+            **_at)
+
+    # sum() or prod() of a list of expressions, or of a generator
+    # expression (or list comprehension) running over a literal
+    # list, range() or seq() of numbers.
+    def visit_Reduction(self, node):
+        kind = _reductions[node.func.id]
+        if len(node.args) != 1 or len(node.keywords) != 0:
+            raise NotVectorizable(node.func.id)
+        arg = node.args[0]
+        if isinstance(arg, (ast.List, ast.Tuple)):
+            terms = ast.List(elts=[self.visit(elt) for elt in arg.elts],
+                ctx=ast.Load(), **_at)
+            return _call("_total", [_name("_err"), _literal(kind),
+                terms])
+        if not isinstance(arg, (ast.GeneratorExp, ast.ListComp)) \
+            or len(arg.generators) != 1 or self.loopVar is not None:
+            raise NotVectorizable(node.func.id)
+        gen = arg.generators[0]
+        if gen.ifs or gen.is_async or not isinstance(gen.target, ast.Name):
+            raise NotVectorizable(node.func.id)
+
+        name = "_series" + str(len(self.series))
+        self.series[name] = _seriesValues(gen.iter)
+        # The term gets a fresh scope since it's evaluated for whole
+        # columns of values of the series variable at once.
+        self.loopVar = gen.target.id
+        scope, self.scope = self.scope, _Scope()
+        try:
+            term = _lambda([self.loopVar, "_err"], self.visit(arg.elt))
+        finally:
+            self.loopVar = None
+            self.scope = scope
+        return _call("_series", [_name("_err"), _name("s"),
+            _literal(kind), _name(name), term])
+
+
+### ELEMENTWISE HELPERS ###
+
+nan = float("nan")
+
+# Keeps track of which nodes would have raised an error had the
+# formula been evaluated node by node. The mask is False until
+# something gets flagged, after which it's a boolean array
+# (or a single boolean for formulas not involving s).
+# If track is True, it also keeps track of the nodes where a sum
+# (or difference) lost more than half its digits to cancellation,
+# i.e. came out much smaller than the biggest of its terms. Those
+# are marked in lossy.
+class _ErrorMask(object):
+    def __init__(self, track=False):
+        self.mask = False
+        self.track = track
+        self.lossy = False
+
+    def flag(self, mask):
+        self.mask = np.logical_or(self.mask, mask)
+
+    def flagLossy(self, mask):
+        self.lossy = np.logical_or(self.lossy, mask)
+
+    # New mask for a subexpression, tracking if this one does
+    def sub(self):
+        return _ErrorMask(self.track)
+
+    # Checks the sum of terms whose largest absolute value is
+    # scale for cancellation.
+    def checkSum(self, total, scale):
+        if self.track and not _ismat(total):
+            with np.errstate(invalid="ignore"):
+                self.flagLossy(np.abs(total) < _cancellation*scale)
+
+# Sums coming out smaller than this fraction of their biggest term
+# count as having lost too many digits.
+_cancellation = 2.0**-26
+
+def _isarray(x):
+    return isinstance(x, np.ndarray)
+
+# Mats (see vfunctions._Mat) handle their own arithmetic. Anything
+# they don't support raises an error that sends the whole formula
+# back to the scalar evaluator.
+def _ismat(x):
+    return isinstance(x, vfunctions._Mat)
+
+def _matAttr(value, attr):
+    if not _ismat(value):
+        raise TypeError("." + attr + " only works on mats")
+    return getattr(value, attr)
+
+# Elementwise python truth value
+def _truth(x):
+    return np.asarray(x) != 0
+
+def _finite(x):
+    if _ismat(x): return x.finite()
+    return np.isfinite(x)
+
+# Applies a python operator to two plain numbers (i.e. parts of a
+# formula that don't involve s). An error flags every node.
+def _scalarOp(err, op, a, b):
+    if isinstance(a, np.generic): a = a.item()
+    if isinstance(b, np.generic): b = b.item()
+    try:
+        return op(a, b)
+    except (ArithmeticError, ValueError, TypeError):
+        err.flag(True)
+        return nan
+
+# Calls a function from the array namespace. Inf or nan going in
+# or coming out means the scalar version may well have raised an
+# error or given something else (cmath raises on overflow and has
+# its own rules for non-finite arguments), so those nodes are
+# flagged to be looked at again. The functions in _infArguments
+# handle infinite arguments just like their scalar versions do
+# (e.g. norm(s, inf)), so only their results are checked. The ones
+# in _integerFunctions can't give integers too big for numpy (see
+# vfunctions._integers()), so those nodes are flagged as well.
+def _apply(err, func, *args, **kwargs):
+    result = func(*args, **kwargs)
+    ok = _finite(result)
+    if func not in _infArguments:
+        for arg in args + tuple(kwargs.values()):
+            ok = ok & _finite(arg)
+    if func in _integerFunctions:
+        ok = ok & (np.abs(args[0]) < vfunctions._intLimit)
+    err.flag(~ok)
+    return result
+
+_infArguments = {vfunctions.norm}
+_integerFunctions = {vfunctions.ceil, vfunctions.floor, vfunctions.trunc}
+
+# Complex multiplication and division done exactly the way python
+# does them (numpy's own versions can round differently in the
+# last bit)
+_cmul = vfunctions._cmul
+_cquot = vfunctions._cquot
+
+# Addition and subtraction are done by numpy exactly like python
+# would. These only add the check for cancellation (see
+# _ErrorMask.checkSum()).
+def _magnitude(x):
+    return 0 if _ismat(x) else np.abs(x)
+
+# floor(), ceil() and friends give int64 arrays, which wrap around
+# where python's integers would just keep growing. Whenever both
+# operands are integers, the same operation is redone in floats and
+# any node anywhere near the int64 limit is flagged, leaving it to
+# the scalar lambda.
+def _checkIntegers(err, op, a, b, result):
+    if _ismat(result) or np.asarray(result).dtype.kind not in "iu":
+        return
+    with np.errstate(all="ignore"):
+        approx = op(np.asarray(a, dtype=float), np.asarray(b, dtype=float))
+    err.flag(~(np.abs(approx) < _intLimit))
+
+# Comfortably below 2^63 so that the float estimate's rounding
+# can't hide an overflow
+_intLimit = 2.0**62
+
+def _add(err, a, b):
+    result = a + b
+    _checkIntegers(err, np.add, a, b, result)
+    if err.track:
+        err.checkSum(result, np.maximum(_magnitude(a), _magnitude(b)))
+    return result
+
+def _sub(err, a, b):
+    result = a - b
+    _checkIntegers(err, np.subtract, a, b, result)
+    if err.track:
+        err.checkSum(result, np.maximum(_magnitude(a), _magnitude(b)))
+    return result
+
+# Python's * operator
+def _mul(err, a, b):
+    if _ismat(a) or _ismat(b): return a * b
+    if np.iscomplexobj(a) or np.iscomplexobj(b):
+        return _cmul(np.asarray(a, dtype=complex), np.asarray(b, dtype=complex))
+    result = np.multiply(a, b)
+    _checkIntegers(err, np.multiply, a, b, result)
+    return result
+
+# Python's / operator. Dividing by zero raises an error.
+def _div(err, a, b):
+    if _ismat(a) or _ismat(b): return a / b
+    if not _isarray(a) and not _isarray(b):
+        return _scalarOp(err, lambda x, y: x / y, a, b)
+    err.flag(np.asarray(b) == 0)
+    if np.iscomplexobj(a) or np.iscomplexobj(b):
+        return _cquot(a, b)
+    return np.true_divide(a, b)
+
+# Python's % and // operators. Like division, zero divisors are an
+# error, and complex numbers can't be used at all.
+def _mod(err, a, b):
+    if _ismat(a) or _ismat(b): return a % b
+    if not _isarray(a) and not _isarray(b):
+        return _scalarOp(err, lambda x, y: x % y, a, b)
+    if np.iscomplexobj(a) or np.iscomplexobj(b):
+        err.flag(True)
+        return np.full(np.broadcast(a, b).shape, nan)
+    err.flag(np.asarray(b) == 0)
+    return np.remainder(a, b)
+
+def _floordiv(err, a, b):
+    if _ismat(a) or _ismat(b): return a // b
+    if not _isarray(a) and not _isarray(b):
+        return _scalarOp(err, lambda x, y: x // y, a, b)
+    if np.iscomplexobj(a) or np.iscomplexobj(b):
+        err.flag(True)
+        return np.full(np.broadcast(a, b).shape, nan)
+    err.flag(np.asarray(b) == 0)
+    result = np.floor_divide(a, b)
+    _checkIntegers(err, np.floor_divide, a, b, result)
+    return result
+
+# Python's ** operator. Differs from numpy's in that a negative
+# real number raised to a non-integer real power gives a complex
+# number instead of nan, and integers raised to negative powers
+# are fine. Integers raised to integers stay integers (checked for
+# overflow like the other integer arithmetic). Real powers are
+# worked out by the C library's pow() like python does (see
+# vfunctions.pow()) and complex powers the way python does them
+# (see _cpow()).
+# Raising zero to a negative (or complex) power is an error, and
+# so is overflowing. Nodes involving inf or nan are flagged too
+# since python's complex powers raise errors on most of those.
+def _pow(err, a, b):
+    if _ismat(a) or _ismat(b): return a ** b
+    if not _isarray(a) and not _isarray(b):
+        return _scalarOp(err, lambda x, y: x ** y, a, b)
+    a = np.asarray(a)
+    b = np.asarray(b)
+    err.flag((a == 0) & ((b.real < 0) | (b.imag != 0)))
+
+    if np.iscomplexobj(a) or np.iscomplexobj(b):
+        result = _cpow(a, b, err)
+    elif a.dtype.kind in "iu" and b.dtype.kind in "iu" and np.all(b >= 0):
+        result = np.power(a, b)
+        _checkIntegers(err, np.power, a, b, result)
+    else:
+        a, b = np.broadcast_arrays(np.asarray(a, dtype=float),
+            np.asarray(b, dtype=float))
+        neg = (a < 0) & (b != np.floor(b))
+        result = vfunctions.pow(a, b)
+        if np.any(neg):
+            result = np.asarray(result, dtype=complex)
+            result[neg] = _cpow(a[neg], b[neg], err, neg)
+    err.flag(~(_finite(a) & _finite(b) & _finite(result)))
+    return result
+
+# Python's complex power (see complex_pow() in CPython's
+# complexobject.c). Small integer powers are done by repeated
+# multiplication (which also decides the signs of any zeros in the
+# result) and the rest through polar form (see _cpowPolar).
+# Negative powers of numbers so small their positive power
+# underflows to zero divide by zero, which gets flagged in err.
+# (where is the boolean mask of nodes a and b came from when they
+# are just part of the whole array)
+def _cpow(a, b, err=None, where=None):
+    a = np.asarray(a, dtype=complex)
+    b = np.asarray(b, dtype=complex)
+    small = (b.imag == 0) & (b.real == np.floor(b.real)) \
+        & (np.abs(b.real) <= 100)
+    if not np.any(small):
+        return _cpowPolar(a, b)
+
+    a, b = np.broadcast_arrays(a, b)
+    small = np.broadcast_to(small, a.shape)
+    result = np.empty(a.shape, dtype=complex)
+    if not np.all(small):
+        result[~small] = _cpowPolar(a[~small], b[~small])
+
+    n = b.real[small].astype(int)
+    x = a[small]
+    pos = n > 0
+    powers = np.empty(len(n), dtype=complex)
+    powers[pos] = _cpowu(x[pos], n[pos])
+    denom = _cpowu(x[~pos], -n[~pos])
+    powers[~pos] = _cquot(1, denom)
+    result[small] = powers
+
+    if err is not None and np.any(denom == 0):
+        zero = np.zeros(a.shape, dtype=bool)
+        zero.flat[np.flatnonzero(small)[np.flatnonzero(~pos)[denom == 0]]] = True
+        if where is not None:
+            full = np.zeros(where.shape, dtype=bool)
+            full[where] = zero
+            zero = full
+        err.flag(zero)
+    return result
+
+# x**n for integers n >= 0 by repeated squaring (c_powu())
+def _cpowu(x, n):
+    r = np.ones(x.shape, dtype=complex)
+    p = x
+    mask = 1
+    top = n.max() if len(n) > 0 else 0
+    while mask <= top:
+        r = np.where((n & mask) != 0, _cmul(r, p), r)
+        mask <<= 1
+        p = _cmul(p, p)
+    return r
+
+# Complex power through polar form (_Py_c_pow()), which takes the
+# C library's exp(), log(), cos(), ... of every node. Only python's
+# own power rounds exactly like that, so it's applied node by node.
+_cpowPolar = vfunctions._elementwise(operator.pow, complex, 2)
+
+# sum() and prod() both accept the same kinds of series
+_reductions = {"sum": "sum", "prod": "prod", "product": "prod"}
+
+# Functions costing a lot more than the rest at every node
+_special = {"zeta", "gamma", "loggamma"}
+
+# Values of a number written in a formula (possibly negative)
+def _constant(node):
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _constant(node.operand)
+        return -value if isinstance(node.op, ast.USub) else value
+    if isinstance(node, ast.Constant) \
+        and type(node.value) in (int, float, complex, bool):
+        return node.value
+    raise NotVectorizable("non-constant series")
+
+# Values a series runs over: a literal list of numbers, or a
+# range() or seq() of literal integers.
+def _seriesValues(node):
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [_constant(elt) for elt in node.elts]
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) \
+        and node.func.id in ("range", "seq") and len(node.keywords) == 0:
+        args = [_constant(arg) for arg in node.args]
+        func = range if node.func.id == "range" else functions.seq
+        try:
+            return func(*args)
+        except (TypeError, ValueError):
+            raise NotVectorizable("bad range")
+    raise NotVectorizable("non-constant series")
+
+_binops = {ast.Add: "_add", ast.Sub: "_sub", ast.Mult: "_mul", ast.Div: "_div",
+    ast.Mod: "_mod", ast.FloorDiv: "_floordiv", ast.Pow: "_pow"}
+
+# Comparisons. Like python, complex numbers can't be ordered, so
+# trying to is an error at every node.
+def _ordered(err, a, b):
+    if np.iscomplexobj(a) or np.iscomplexobj(b):
+        err.flag(True)
+        return False
+    return True
+
+def _lt(err, a, b):
+    if not _ordered(err, a, b): return False
+    return np.less(a, b)
+
+def _le(err, a, b):
+    if not _ordered(err, a, b): return False
+    return np.less_equal(a, b)
+
+def _gt(err, a, b):
+    if not _ordered(err, a, b): return False
+    return np.greater(a, b)
+
+def _ge(err, a, b):
+    if not _ordered(err, a, b): return False
+    return np.greater_equal(a, b)
+
+def _eq(err, a, b):
+    return np.equal(a, b)
+
+def _ne(err, a, b):
+    return np.not_equal(a, b)
+
+_comparisons = {
+    ast.Lt: "_lt", ast.LtE: "_le", ast.Gt: "_gt", ast.GtE: "_ge",
+    ast.Eq: "_eq", ast.NotEq: "_ne"
+    }
+
+# The helpers below take the parts python might skip as thunks
+# (see _thunk()) along with the values of the variables in scope,
+# and only evaluate them at the nodes where python really would
+# have. That way nested if-elses cost no more than the branches
+# actually taken.
+
+# Shape of x (a mat's is that of its entries)
+def _shape(x):
+    if _ismat(x):
+        return np.broadcast_shapes(*[np.shape(v) for v in x.entries])
+    return np.shape(x)
+
+# Shape of the truth values t broadcast against the variables
+def _fullShape(t, variables):
+    return np.broadcast_shapes(np.shape(t), *[_shape(v) for v in variables])
+
+# Values of x at the nodes where pick is True. Plain numbers are the
+# same at every node, so they're left as they are.
+def _subset(x, full, pick):
+    if _ismat(x):
+        return vfunctions._Mat(*[_subset(v, full, pick) for v in x.entries])
+    if _isarray(x):
+        return np.broadcast_to(x, full)[pick]
+    return x
+
+# Evaluates the thunk branch at just the nodes where pick (a boolean
+# array of the full shape) is True and flags its errors at those
+# nodes. Returns its values there as a flat array (or a single
+# value if they're all the same).
+def _evalAt(err, pick, branch, variables, full):
+    sub = err.sub()
+    value = branch(sub, *[_subset(v, full, pick) for v in variables])
+    count = np.count_nonzero(pick)
+    for mask, flag in ((sub.mask, err.flag), (sub.lossy, err.flagLossy)):
+        if np.any(mask):
+            spread = np.zeros(full, dtype=bool)
+            spread[pick] = np.broadcast_to(mask, (count,))
+            flag(spread)
+    return value
+
+# Array of the full shape holding a where pick is True and b where
+# it isn't (a and b being as _evalAt() returns them)
+def _merge(full, pick, a, b):
+    if _ismat(a) or _ismat(b):
+        raise TypeError("Can't pick between mats node by node")
+    result = np.empty(full, dtype=np.result_type(a, b))
+    result[pick] = a
+    result[~pick] = b
+    return result
+
+# "a < b < c" is "a < b" if that's false, otherwise "b < c".
+def _both(err, comp, rest, variables):
+    t = _truth(comp)
+    if not np.any(t): return t
+    if np.all(t): return np.logical_and(t, rest(err, *variables))
+    full = _fullShape(t, variables)
+    t = np.broadcast_to(t, full)
+    result = np.zeros(full, dtype=bool)
+    result[t] = _truth(_evalAt(err, t, rest, variables, full))
+    return result
+
+# "a and b" is a if a is false, otherwise b.
+def _and(err, a, b, variables):
+    t = _truth(a)
+    if not np.any(t): return a
+    if np.all(t): return b(err, *variables)
+    full = _fullShape(t, variables)
+    t = np.broadcast_to(t, full)
+    return _merge(full, t, _evalAt(err, t, b, variables, full),
+        np.broadcast_to(a, full)[~t])
+
+# "a or b" is a if a is true, otherwise b.
+def _or(err, a, b, variables):
+    t = _truth(a)
+    if np.all(t): return a
+    if not np.any(t): return b(err, *variables)
+    full = _fullShape(t, variables)
+    t = np.broadcast_to(t, full)
+    return _merge(full, t, np.broadcast_to(a, full)[t],
+        _evalAt(err, ~t, b, variables, full))
+
+def _not(a):
+    return np.logical_not(_truth(a))
+
+# "body if test else orelse"
+def _where(err, test, body, orelse, variables):
+    t = _truth(test)
+    if np.all(t): return body(err, *variables)
+    if not np.any(t): return orelse(err, *variables)
+    full = _fullShape(t, variables)
+    t = np.broadcast_to(t, full)
+    return _merge(full, t, _evalAt(err, t, body, variables, full),
+        _evalAt(err, ~t, orelse, variables, full))
+
+# Final complex() conversion of the formula's value. The result
+# always has the shape of the input s even if the formula doesn't
+# depend on s (e.g. "2").
+def _complex(value, s):
+    value = np.asarray(value)
+    if value.dtype == object:
+        raise TypeError("Non-numeric value")
+    return np.broadcast_to(value, np.shape(s)).astype(complex)
+
+### SUM AND PRODUCT ###
+
+# Python's sum() and functions.prod() of a series of terms, i.e.
+#   sum(term(n) for n in values)
+# The terms are computed a chunk at a time in one go by giving
+# term() a whole column of values of n, which broadcasts against
+# the nodes along a new leading axis. Each chunk holds at most
+# about _seriesChunk numbers so long series can't use up too much
+# memory. A node is flagged if any of its terms raises an error.
+# Broadcasting saves the python overhead of the generator at each
+# node, but not the cost of the terms themselves. A term like p^-s
+# is python's own complex power at every node (see _cpowPolar), so
+# e.g. prod(1/(1-p^-s) for p in primes) costs about as much per
+# prime as one elementary function of s, and n^s series are no
+# faster than the scalar lambda. Adding up logarithms of the
+# factors instead would be much faster, but wouldn't round like
+# the scalar lambda does.
+_seriesChunk = 2**16
+
+def _series(err, s, kind, values, term):
+    total = 0 if kind == "sum" else 1
+    rows = max(1, _seriesChunk // max(1, np.size(s)))
+    for start in range(0, len(values), rows):
+        n = np.asarray(values[start:start+rows])
+        if n.dtype == object:
+            raise TypeError("Series values too big")
+        n = n.reshape(n.shape + (1,)*np.ndim(s))
+        sub = err.sub()
+        terms = term(n, sub)
+        shape = np.broadcast(n, terms).shape
+        terms = np.broadcast_to(terms, shape)
+        err.flag(np.any(np.broadcast_to(sub.mask, shape), axis=0))
+        err.flagLossy(np.any(np.broadcast_to(sub.lossy, shape), axis=0))
+        total = _total(err, kind, terms, total)
+    return total
+
+# Adds up (or multiplies) the terms one by one in order, exactly
+# like python would.
+def _total(err, kind, terms, total=None):
+    if total is None:
+        total = 0 if kind == "sum" else 1
+    scale = _magnitude(total) if err.track and kind == "sum" else 0
+    for term in terms:
+        if kind == "sum":
+            result = total + term
+            _checkIntegers(err, np.add, total, term, result)
+            total = result
+            if err.track:
+                scale = np.maximum(scale, _magnitude(term))
+        else:
+            total = _mul(err, total, term)
+    if err.track and kind == "sum":
+        err.checkSum(total, scale)
+    return total
+
+_helpers = {
+    "_apply": _apply, "_add": _add, "_sub": _sub, "_mul": _mul,
+    "_div": _div, "_mod": _mod, "_floordiv": _floordiv, "_pow": _pow,
+    "_lt": _lt, "_le": _le, "_gt": _gt, "_ge": _ge,
+    "_eq": _eq, "_ne": _ne, "_both": _both, "_and": _and,
+    "_or": _or, "_not": _not, "_where": _where, "_complex": _complex,
+    "_matAttr": _matAttr, "_series": _series, "_total": _total
+    }
+
+### CONJUGATE SYMMETRY ###
+
+# Functions f with f(conj(s)) = conj(f(s)). Besides the usual
+# complex functions, this includes every function that only works
+# on real numbers: at conj(s) it either gets the same real
+# arguments or fails the same way.
+_realAnalytic = {
+    "exp", "log", "ln", "log10", "sqrt", "sin", "cos", "tan", "asin",
+    "acos", "atan", "sinh", "cosh", "tanh", "asinh", "acosh", "atanh",
+    "zeta", "gamma", "loggamma", "conj", "real", "re", "Re", "abs",
+    "norm", "sgn", "sign", "isbadnum", "isfinite", "isinf", "isnan",
+    "ceil", "floor", "trunc", "fabs", "erf", "erfc", "lgamma", "expm1",
+    "log1p", "log2", "degrees", "radians", "factorial", "fact", "hypot",
+    "atan2", "fmod", "ldexp", "pow", "mod", "min", "max"
+    }
+_realConstants = {"pi", "tau", "e"}
+
+# Returns True if the (pythonized) formula f is known to satisfy
+#   f(conj(s)) = conj(f(s))
+# which is the case if it's built only out of s, real numbers,
+# arithmetic, comparisons, if-else, sums and products of such
+# things, and the functions above. Anything else (e.g. i, imag()
+# or a mat) makes it return False, even if the formula happens to
+# be symmetric anyway.
+def realAnalytic(pyexpr, extras=None):
+    if extras is None: extras = {}
+    tree = _code(("tree", pyexpr), lambda: _parse(pyexpr))
+    if tree is None:
+        return False
+    try:
+        _ConjugateChecker(extras).visit(tree.body)
+    except NotVectorizable:
+        return False
+    return True
+
+# Parse tree of a formula, or None if it isn't valid python
+def _parse(pyexpr):
+    try:
+        return ast.parse(pyexpr, mode="eval")
+    except SyntaxError:
+        return None
+
+class _ConjugateChecker(ast.NodeVisitor):
+    def __init__(self, extras):
+        self.extras = extras
+        self.loopVars = set()
+
+    def generic_visit(self, node):
+        raise NotVectorizable(type(node).__name__)
+
+    def visitAll(self, nodes):
+        for node in nodes:
+            self.visit(node)
+
+    def visit_Constant(self, node):
+        if type(node.value) not in (int, float, bool):
+            raise NotVectorizable("non-real constant")
+
+    def visit_Name(self, node):
+        if node.id == "s" or node.id in self.loopVars \
+            or node.id in _realConstants:
+            return
+        value = self.extras.get(node.id)
+        if isinstance(value, (int, float)) or \
+            (isinstance(value, Evaluator) and value.realAnalytic):
+            return
+        raise NotVectorizable(node.id)
+
+    def visit_Attribute(self, node):
+        if node.attr != "real":
+            raise NotVectorizable("." + node.attr)
+        self.visit(node.value)
+
+    def visit_BinOp(self, node):
+        self.visit(node.left)
+        self.visit(node.right)
+
+    def visit_UnaryOp(self, node):
+        self.visit(node.operand)
+
+    def visit_Compare(self, node):
+        self.visitAll([node.left] + node.comparators)
+
+    def visit_BoolOp(self, node):
+        self.visitAll(node.values)
+
+    def visit_IfExp(self, node):
+        self.visitAll([node.test, node.body, node.orelse])
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or len(node.keywords) > 0:
+            raise NotVectorizable("call")
+        name = node.func.id
+        if name in _reductions and len(node.args) == 1:
+            return self.visitReduction(node.args[0])
+        if name not in _realAnalytic and not (
+            isinstance(self.extras.get(name), Evaluator)
+            and self.extras[name].realAnalytic):
+            raise NotVectorizable(name)
+        self.visitAll(node.args)
+
+    # Sums and products of a list of terms, or over a literal list,
+    # range() or seq() of real numbers.
+    def visitReduction(self, arg):
+        if isinstance(arg, (ast.List, ast.Tuple)):
+            return self.visitAll(arg.elts)
+        if not isinstance(arg, (ast.GeneratorExp, ast.ListComp)) \
+            or len(arg.generators) != 1:
+            raise NotVectorizable("series")
+        gen = arg.generators[0]
+        if gen.ifs or not isinstance(gen.target, ast.Name):
+            raise NotVectorizable("series")
+        for value in _seriesValues(gen.iter):
+            if isinstance(value, complex):
+                raise NotVectorizable("non-real series")
+        # The loop variable only means something inside the series
+        loopVars = self.loopVars
+        self.loopVars = loopVars | {gen.target.id}
+        self.visit(arg.elt)
+        self.loopVars = loopVars
@@ -4,10 +4,16 @@ from __future__ import division  # For Python 2
 import pyglet as pg
 pyglet = pg
 import morpho.giffer as giffer
-# import time
+import time
 import math
+import bisect
 import cmath
+import ctypes
+import numpy as np
 import os, sys, shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections.abc import MutableSet, MutableSequence
 # import traceback
 
 # Get location of the Morpho directory.
@@ -179,85 +185,71 @@ class Point(object):
 # Path object.
 # Consists of a sequence of complex numbers, an interpolation method,
 # and path thickness (width)
+#
+# The nodes are stored as a contiguous complex128 numpy array in
+# the attribute "nodes", and the deadends as a boolean numpy array
+# "deadmask" of the same length, where deadmask[n] == True means
+# node n is NOT connected to node n+1.
+# The old list-style attributes "seq" and "deadends" still work:
+# "seq" gives a list-like view of the node array and "deadends" a
+# set-like view of the deadmask, and changes made through either
+# go straight to the arrays.
 class Path(object):
     def __init__(self, seq=None):
         if seq is None: seq = [0,1]
-        self.seq = seq
+        self.nodes = np.array(seq, dtype=complex).reshape(-1)
+        self.deadmask = np.zeros(len(self.nodes), dtype=bool)
         self.interp = "linear"  # This is the only interp method for now.
         self.color = (0,0,0)
         self.width = 3
-        self.deadends = set()
         self.static = False
 
+    @property
+    def seq(self):
+        return _NodeList(self)
+
+    # Assigning to seq copies the given sequence into a new node
+    # array. The deadmask is resized to match, keeping whatever
+    # deadends still make sense.
+    @seq.setter
+    def seq(self, value):
+        self.nodes = np.array(value, dtype=complex).reshape(-1)
+        if len(self.deadmask) != len(self.nodes):
+            mask = np.zeros(len(self.nodes), dtype=bool)
+            k = min(len(mask), len(self.deadmask))
+            mask[:k] = self.deadmask[:k]
+            self.deadmask = mask
+
+    @property
+    def deadends(self):
+        return _DeadendSet(self)
+
+    # Accepts any iterable of node indices (e.g. a set)
+    @deadends.setter
+    def deadends(self, value):
+        mask = np.zeros(len(self.nodes), dtype=bool)
+        for n in value:
+            if 0 <= n < len(mask):
+                mask[n] = True
+        self.deadmask = mask
+
     # Returns a (deep-ish) copy of the path
     def copy(self):
-        C = Path()
-        C.seq = self.seq[:]
+        C = Path.__new__(Path)  # Skip making the default nodes
+        C.nodes = self.nodes.copy()
         C.interp = self.interp
         C.color = self.color[:]
         C.width = self.width
-        C.deadends = self.deadends.copy()
+        C.deadmask = self.deadmask.copy()
         C.static = self.static
         return C
 
     # Returns an interpolated path between itself and another path.
+    # If you need to tween the same pair of paths for many values
+    # of t, build a PathTween once and call its tween() method
+    # instead.
     def tween(self, other, t, method="spiral"):
-        p = self
-        q = other
-        if type(q) is not Path:
-            raise Exception("Can't use tweenPath() on non-Path types!")
-        if p == q:
-            return p.copy()
-        # Check for invalid path seq lengths
-        if len(p.seq) != len(q.seq):
-            raise Exception("Can't tween paths of different seq lengths!")
-
-        T = p.copy()
-        T.color = colorTween(p.color, q.color, t)
-        # Tween the stroke widths if necessary
-        if p.width != q.width:
-            T.width = p.width + t*(q.width - p.width)
-
-        if method == "spiral":
-            dthList = []
-            for n in range(len(p.seq)):
-                r1 = abs(p.seq[n])
-                r2 = abs(q.seq[n])
-                th1 = cmath.phase(p.seq[n]) % tau
-                th2 = cmath.phase(q.seq[n]) % tau
-
-                dr = r2-r1
-                dth = argShift(th1, th2)
-                dthList.append(dth)
-
-                r = r1 + t*dr
-                th = th1 + t*dth
-
-                T.seq[n] = r*cmath.exp(th*1j)
-
-            # This clause disconnects two nodes if they are
-            # revolving in different directions too much.
-            # The value angle_tol represents how far two oppositely
-            # revolving nodes have to angularly differ before
-            # we disconnect them.
-            angle_tol = 0.053
-            if 0.01 < t and t < 0.99:
-                for n in range(len(dthList)-1):
-                    dth1 = dthList[n]
-                    dth2 = dthList[n+1]
-                    if dth1*dth2 < 0 and abs(dth1-dth2) > angle_tol:
-                        T.deadends.add(n)
-        elif method == "direct":
-            for n in range(len(p.seq)):
-                T.seq[n] = twVal = tween(p.seq[n], q.seq[n], t)
-                # Deadend unplottable points
-                if isbadnum(twVal):
-                    T.deadends.add(n-1)
-                    T.deadends.add(n)
-        else:
-            raise Exception('Tween method "'+method+'" not recognized!')
-
-        return T
+        return PathTween(self, other, method).tween(t)
 
     # Returns boolean on whether a path has the same
     # color and width as another. This method is useful
@@ -289,10 +281,11 @@ class Path(object):
         if setup:
             self.setupStyle()
             pg.gl.glBegin(pg.gl.GL_LINES)
-        for n in range(len(S.seq)-1):
-            if n in S.deadends: continue
-            z1 = S.seq[n]
-            z2 = S.seq[n+1]
+        seq = S.nodes.tolist()
+        for n in range(len(seq)-1):
+            if S.deadmask[n]: continue
+            z1 = seq[n]
+            z2 = seq[n+1]
 
             if isbadnum(z1) or isbadnum(z2): continue
 
@@ -336,11 +329,7 @@ class Path(object):
         f = func
         if S.static: return S
         fS = S.copy()
-        for n in range(len(S.seq)):
-            try:
-                fS.seq[n] = f(S.seq[n])
-            except:  # Errors map to nan
-                fS.seq[n] = nan
+        fS.nodes = evalNodes(f, S.nodes)
 
         # fS.seq = [f(z) for z in S.seq]
         return fS
@@ -352,14 +341,12 @@ class Path(object):
     # to the first node of other.
     def concat(self, other, connectEnds=True):
         result = self.copy()
-        result.seq += other.seq
-        len_self = len(self.seq)
-        if not connectEnds:
-            result.deadends.add(len_self-1)
-
+        result.nodes = np.concatenate((self.nodes, other.nodes))
         # Merge deadends from other into result
-        for n in other.deadends:
-            result.deadends.add(n+len_self)
+        result.deadmask = np.concatenate((self.deadmask, other.deadmask))
+        len_self = len(self.nodes)
+        if not connectEnds and len_self > 0:
+            result.deadmask[len_self-1] = True
 
         return result
 
@@ -367,6 +354,131 @@ class Path(object):
     def __add__(self, other):
         return self.concat(other)
 
+    # Concatenates a list of paths in one go, with none of them
+    # connected to the next. Same as concatenating them one by one
+    # with connectEnds=False, so the result has the first path's
+    # style.
+    @staticmethod
+    def join(paths):
+        first = paths[0]
+        result = Path.__new__(Path)
+        result.interp = first.interp
+        result.color = first.color[:]
+        result.width = first.width
+        result.static = first.static
+        result.nodes = np.concatenate([path.nodes for path in paths])
+        result.deadmask = np.concatenate([path.deadmask for path in paths])
+        end = 0
+        for path in paths[:-1]:
+            end += len(path.nodes)
+            if end > 0:
+                result.deadmask[end-1] = True
+        return result
+
+# List-like view of a path's nodes so that code written for the
+# old "seq" list (e.g. path.seq.append(z), path.seq + other.seq)
+# keeps working. Nodes are read as python complex numbers, and + and
+# slices give ordinary lists. Anything that changes the number of
+# nodes builds a new node array (see the Path.seq setter).
+class _NodeList(MutableSequence):
+    def __init__(self, path):
+        self.path = path
+
+    def __len__(self):
+        return len(self.path.nodes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.path.nodes[index].tolist()
+        return complex(self.path.nodes[index])
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = list(value)
+            if len(range(*index.indices(len(self)))) != len(value):
+                seq = self.path.nodes.tolist()
+                seq[index] = value
+                self.path.seq = seq
+                return
+        self.path.nodes[index] = value
+
+    def __delitem__(self, index):
+        seq = self.path.nodes.tolist()
+        del seq[index]
+        self.path.seq = seq
+
+    def insert(self, index, value):
+        seq = self.path.nodes.tolist()
+        seq.insert(index, value)
+        self.path.seq = seq
+
+    # All at once rather than one append at a time
+    def extend(self, values):
+        values = np.array(list(values), dtype=complex).reshape(-1)
+        self.path.seq = np.concatenate((self.path.nodes, values))
+
+    def __iter__(self):
+        return iter(self.path.nodes.tolist())
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __eq__(self, other):
+        if not isinstance(other, (_NodeList, list, tuple)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(self.path.nodes, dtype=dtype)
+
+    def copy(self):
+        return list(self)
+
+    def __repr__(self):
+        return repr(list(self))
+
+# Set-like view of a path's deadmask so that code written for
+# the old "deadends" set (e.g. path.deadends.add(n), n in path.deadends)
+# keeps working. Indices outside the path are silently ignored.
+class _DeadendSet(MutableSet):
+    def __init__(self, path):
+        self.path = path
+
+    # Set operations like | and & return ordinary sets
+    @classmethod
+    def _from_iterable(cls, it):
+        return set(it)
+
+    def __contains__(self, n):
+        mask = self.path.deadmask
+        try:
+            return 0 <= n < len(mask) and bool(mask[n])
+        except TypeError:
+            return False
+
+    def __iter__(self):
+        return iter(np.flatnonzero(self.path.deadmask).tolist())
+
+    def __len__(self):
+        return int(np.count_nonzero(self.path.deadmask))
+
+    def add(self, n):
+        if 0 <= n < len(self.path.deadmask):
+            self.path.deadmask[n] = True
+
+    def discard(self, n):
+        if 0 <= n < len(self.path.deadmask):
+            self.path.deadmask[n] = False
+
+    def copy(self):
+        return set(self)
+
+    def __repr__(self):
+        return repr(set(self))
+
 # A single (key)frame of animation
 class Frame(object):
     def __init__(self, points=None, paths=None):
@@ -388,111 +500,68 @@ class Frame(object):
         frame.optimized = self.optimized
         return frame
 
+    # Returns an interpolated frame between itself and another frame.
+    # If you need to tween the same pair of frames for many values
+    # of t, build a FrameTween once and call its tween() method
+    # instead.
     def tween(self, other, t, method="spiral"):
-        p = self
-        q = other
-        if type(q) is not Frame:
-            raise Exception("Can't use tweenFrame() on non-Frame types!")
-        if p == q: return p.copy()
-
-        if len(p.points) != len(q.points):
-            raise Exception("Can't tween Frames with different number of points!")
-        if len(p.paths) != len(q.paths):
-            raise Exception("Can't tween Frames with different number of paths!")
-
-        T = p.copy()
-        T.delay = 0  # Tweened frames are never delayed
-        T.background = colorTween(p.background, q.background, t)
-        # In future, T.background will be tweened.
-        # Also will take into account T.delay
-
-        for n in range(len(p.points)):
-            T.points[n] = p.points[n].tween(q.points[n], t, method)
-        for n in range(len(p.paths)):
-            T.paths[n] = p.paths[n].tween(q.paths[n], t, method)
-
-        return T
+        return FrameTween(self, other, method).tween(t)
 
     # This function optimizes a frame for plotting by concatenating
     # all sequential paths of matching style in the path list.
     def optimizePaths(self):
         if self.optimized: return
         if len(self.paths) == 0: return
-        paths = []
-        basePath = self.paths[0]
-        for n in range(1, len(self.paths)):
-            currentPath = self.paths[n]
-            if basePath.matchesStyle(currentPath):
-                basePath = basePath.concat(currentPath, connectEnds=False)
+        # Runs of paths that match in style get joined all at once
+        runs = [[self.paths[0]]]
+        for currentPath in self.paths[1:]:
+            if runs[-1][0].matchesStyle(currentPath):
+                runs[-1].append(currentPath)
             else:
-                paths.append(basePath)
-                basePath = currentPath
-        paths.append(basePath)
-        self.paths = paths
+                runs.append([currentPath])
+        self.paths = [run[0] if len(run) == 1 else Path.join(run)
+            for run in runs]
         self.optimized = True
 
     # Returns a copy of the frame as a FastFrame frame.
     # Note that this will automatically optimize the Paths of
     # the frame!
     def prerender(self, view, window):
-        pre = FastFrame()
-        pre.background = self.background
-        pre.delay = self.delay
-
-        # Batch up the frame point by point
-        for point in self.points:
-            # batch = pg.graphics.Batch()
-            vertices = []
-            for th in range(0, 360, 10):
-                th *= DEG2RAD
-                x,y = screenCoords(point.pos, view, window)
-                r = point.size/2
-                vertices.append(x + r*math.cos(th))
-                vertices.append(y + r*math.sin(th))
-
-            color = tuple(round(255*c) for c in point.fill)
-            num_segments = len(vertices)//2
-            pre.pointTable_add(vertices, color*num_segments)
-            # num_segments = len(vertices)//2
-            # batch.add(num_segments, pg.gl.GL_TRIANGLE_FAN, None,
-            #     ("v2f", tuple(vertices)),
-            #     ("c3B", color*num_segments) )
-            # pre.points.append(batch)
-
-        # Populate the pathTable of the fast frame.
         self.optimizePaths()
-        for p in range(len(self.paths)):
-            path = self.paths[p]
-            # batch = pg.graphics.Batch()
-
-            # Get a list of vertices the batch should render
-            vertices = []
-            for n in range(len(path.seq)-1):
-                if n in path.deadends:
-                    xy0 = xy1 = (inf, inf)
-                else:
-                    z0 = path.seq[n]
-                    z1 = path.seq[n+1]
-                    xy0 = screenCoords(z0, view, window)
-                    xy1 = screenCoords(z1, view, window)
-                vertices.extend(xy0)
-                vertices.extend(xy1)
-
-            # Convert path RGB color into (255,255,255) form
-            color = tuple(round(255*c) for c in path.color)
-            num_segments = len(vertices)//2
-
-            # batch.add(num_segments, pg.gl.GL_LINES, None,
-            #     ("v2f", tuple(vertices)),
-            #     ("c3B", color*num_segments) )
-            pre.pathTable_add(
-                tuple(vertices),
-                color*num_segments,
-                )
-            # pre.paths.append(batch)
-            pre.pathWidths.append(path.width)
-
-        return pre
+        return self.pack().prerender(view, window)
+
+    # Returns the frame in PackedFrame form (see PackedFrame).
+    def pack(self):
+        pf = PackedFrame()
+        pf.background = self.background
+        pf.delay = self.delay
+        pf.optimized = self.optimized
+
+        paths = self.paths
+        lengths = [len(path.nodes) for path in paths]
+        pf.offsets = np.zeros(len(paths)+1, dtype=int)
+        pf.offsets[1:] = np.cumsum(lengths)
+        if len(paths) > 0:
+            pf.nodes = np.concatenate([path.nodes for path in paths])
+            pf.deadmask = np.concatenate([path.deadmask for path in paths])
+        pf.colors = np.array([path.color for path in paths],
+            dtype=float).reshape(-1,3)
+        pf.widths = np.array([path.width for path in paths], dtype=float)
+        pf.static = np.array([path.static for path in paths], dtype=bool)
+
+        points = self.points
+        pf.pointPos = np.array([point.pos for point in points],
+            dtype=complex)
+        pf.pointFill = np.array([point.fill for point in points],
+            dtype=float).reshape(-1,3)
+        pf.pointSize = np.array([point.size for point in points],
+            dtype=float)
+        pf.pointStrokeWeight = np.array(
+            [point.strokeWeight for point in points], dtype=float)
+        pf.pointStatic = np.array([point.static for point in points],
+            dtype=bool)
+        pf.pointStyles = [point.style for point in points]
+        return pf
 
     def plot(self, view, window):
         S = self
@@ -519,14 +588,473 @@ class Frame(object):
         for obj in S.points:
             obj.plot(view, window)
 
+    # Returns the "image" of the frame under the complex function
+    # func. All the non-static nodes of the frame are gathered up
+    # and each distinct one evaluated once (see evalUniqueNodes()).
     def fimage(self, func):
+        return self.withDynamicNodes(
+            evalUniqueNodes(func, self.pack().dynamicNodes()))
+
+    # Returns a copy of the frame where the nodes of the non-static
+    # paths and points are replaced by the given array of values
+    # (in the order PackedFrame.dynamicNodes() gives them).
+    # The new nodes are views into values.
+    def withDynamicNodes(self, values):
         S = self
-        f = func
         fS = S.copy()
-        fS.paths = [obj.fimage(f) for obj in S.paths]
-        fS.points = [obj.fimage(f) for obj in S.points]
+        values = np.asarray(values, dtype=complex)
+
+        # Static objects are passed along as-is just like
+        # Path.fimage() and Point.fimage() do. The rest are copied
+        # and given their new positions.
+        start = 0
+        fS.paths = []
+        for path in S.paths:
+            if not path.static:
+                end = start + len(path.nodes)
+                path = path.copy()
+                path.nodes = values[start:end]
+                start = end
+            fS.paths.append(path)
+        fS.points = []
+        for point in S.points:
+            if not point.static:
+                point = point.copy()
+                point.pos = complex(values[start])
+                start += 1
+            fS.points.append(point)
         return fS
 
+# Packed ("struct of arrays") form of a Frame.
+# Instead of a list of Path objects each holding their own node
+# array, a PackedFrame keeps every path of the frame in a handful
+# of flat numpy arrays:
+#   nodes    -- complex array of all the nodes of all the paths
+#   offsets  -- int array of length (number of paths)+1 where the
+#               nodes of path k are nodes[offsets[k]:offsets[k+1]]
+#   deadmask -- boolean array of deadends over the whole node array
+#   colors   -- (number of paths) x 3 float array of path colors
+#   widths   -- float array of path widths
+#   static   -- boolean array marking the static paths
+# Points are stored similarly in the arrays pointPos, pointFill,
+# pointSize, pointStrokeWeight and pointStatic.
+# This lets fimage(), tweening and prerendering act on a whole
+# frame with a few array operations instead of looping over the
+# paths and points one at a time.
+# Use Frame.pack() to make one and unpack() to get a Frame back.
+class PackedFrame(object):
+    def __init__(self):
+        self.nodes = np.zeros(0, dtype=complex)
+        self.offsets = np.zeros(1, dtype=int)
+        self.deadmask = np.zeros(0, dtype=bool)
+        self.colors = np.zeros((0,3))
+        self.widths = np.zeros(0)
+        self.static = np.zeros(0, dtype=bool)
+
+        self.pointPos = np.zeros(0, dtype=complex)
+        self.pointFill = np.zeros((0,3))
+        self.pointSize = np.zeros(0)
+        self.pointStrokeWeight = np.zeros(0)
+        self.pointStatic = np.zeros(0, dtype=bool)
+        self.pointStyles = []
+
+        self.background = (0,0,0)
+        self.delay = 0
+        self.optimized = False
+
+    # Returns a copy of the packed frame
+    def copy(self):
+        pf = PackedFrame()
+        pf.nodes = self.nodes.copy()
+        pf.offsets = self.offsets.copy()
+        pf.deadmask = self.deadmask.copy()
+        pf.colors = self.colors.copy()
+        pf.widths = self.widths.copy()
+        pf.static = self.static.copy()
+
+        pf.pointPos = self.pointPos.copy()
+        pf.pointFill = self.pointFill.copy()
+        pf.pointSize = self.pointSize.copy()
+        pf.pointStrokeWeight = self.pointStrokeWeight.copy()
+        pf.pointStatic = self.pointStatic.copy()
+        pf.pointStyles = self.pointStyles[:]
+
+        pf.background = self.background[:]
+        pf.delay = self.delay
+        pf.optimized = self.optimized
+        return pf
+
+    # Number of paths in the frame
+    @property
+    def pathCount(self):
+        return len(self.offsets) - 1
+
+    # Returns a boolean mask over the node array marking the last
+    # node of every path. Segments starting at these nodes join
+    # two different paths and so must never be drawn.
+    def lastNodeMask(self):
+        mask = np.zeros(len(self.nodes), dtype=bool)
+        offsets = self.offsets
+        ends = offsets[1:][offsets[1:] > offsets[:-1]] - 1
+        mask[ends] = True
+        return mask
+
+    # Returns a boolean mask over the node array marking the nodes
+    # belonging to the paths selected by the given boolean mask
+    # over the paths.
+    def nodeMask(self, pathMask):
+        return np.repeat(pathMask, np.diff(self.offsets))
+
+    # Returns a single array of every node a function would act on
+    # i.e. the nodes of the non-static paths followed by the
+    # positions of the non-static points.
+    def dynamicNodes(self):
+        return np.concatenate((
+            self.nodes[self.nodeMask(~self.static)],
+            self.pointPos[~self.pointStatic]
+            ))
+
+    # Returns a copy of the packed frame where the nodes given by
+    # dynamicNodes() are replaced by the given array of values.
+    def withDynamicNodes(self, values):
+        pf = self.copy()
+        dyn = self.nodeMask(~self.static)
+        count = np.count_nonzero(dyn)
+        pf.nodes[dyn] = values[:count]
+        pf.pointPos[~self.pointStatic] = values[count:]
+        return pf
+
+    # Returns the "image" of the packed frame under the complex
+    # function func. Static paths and points are left alone, and
+    # coincident nodes are only evaluated once.
+    def fimage(self, func):
+        return self.withDynamicNodes(
+            evalUniqueNodes(func, self.dynamicNodes()))
+
+    # Converts the packed frame back into a regular Frame.
+    # The nodes of the new paths are views into the packed
+    # node array.
+    def unpack(self):
+        frm = Frame()
+        frm.background = self.background
+        frm.delay = self.delay
+        frm.optimized = self.optimized
+
+        offsets = self.offsets.tolist()
+        colors = self.colors.tolist()
+        widths = self.widths.tolist()
+        static = self.static.tolist()
+        for k in range(self.pathCount):
+            a = offsets[k]
+            b = offsets[k+1]
+            path = Path()
+            path.nodes = self.nodes[a:b]
+            path.deadmask = self.deadmask[a:b]
+            path.color = tuple(colors[k])
+            path.width = widths[k]
+            path.static = static[k]
+            frm.paths.append(path)
+
+        pos = self.pointPos.tolist()
+        fill = self.pointFill.tolist()
+        size = self.pointSize.tolist()
+        strokeWeight = self.pointStrokeWeight.tolist()
+        pointStatic = self.pointStatic.tolist()
+        for k in range(len(pos)):
+            point = Point(pos[k])
+            point.fill = tuple(fill[k])
+            point.size = size[k]
+            point.strokeWeight = strokeWeight[k]
+            point.static = pointStatic[k]
+            point.style = self.pointStyles[k]
+            frm.points.append(point)
+        return frm
+
+    # Returns the packed frame as a FastFrame.
+    # Consecutive paths of matching style are drawn together as a
+    # single batch the same way Frame.optimizePaths() would
+    # concatenate them.
+    def prerender(self, view, window):
+        pre = FastFrame()
+        pre.background = self.background
+        pre.delay = self.delay
+
+        # Vertices are worked out in double precision and stored in
+        # single precision, which is what OpenGL gets anyway ("v2f").
+        # Anything too big for that just becomes infinite.
+        with np.errstate(over="ignore"):
+            self._prerenderTables(pre, view, window)
+        return pre
+
+    # Fills in the tables of the FastFrame pre (see prerender())
+    def _prerenderTables(self, pre, view, window):
+        a,b,c,d = view
+        xscale = window.width/(b-a)
+        yscale = window.height/(d-c)
+
+        # Batch up the frame point by point
+        x = xscale * (self.pointPos.real - a)
+        y = yscale * (self.pointPos.imag - c)
+        r = self.pointSize/2
+        fill = _colorBytes(self.pointFill)
+        num_segments = len(_circleCos)
+        for k in range(len(x)):
+            vertices = np.empty(2*num_segments, dtype=np.float32)
+            vertices[0::2] = x[k] + r[k]*_circleCos
+            vertices[1::2] = y[k] + r[k]*_circleSin
+            pre.pointTable_add(vertices, np.tile(fill[k], num_segments))
+
+        # Every segment joining node n to node n+1 becomes a pair
+        # of vertices (4 numbers) in one big table. Segments that
+        # are deadended or join two different paths are sent
+        # off to infinity.
+        nodes = self.nodes
+        segments = np.empty((max(len(nodes)-1, 0), 4), dtype=np.float32)
+        segments[:,0] = xscale * (nodes.real[:-1] - a)
+        segments[:,1] = yscale * (nodes.imag[:-1] - c)
+        segments[:,2] = xscale * (nodes.real[1:] - a)
+        segments[:,3] = yscale * (nodes.imag[1:] - c)
+        cut = (self.deadmask | self.lastNodeMask())[:-1]
+        segments[cut] = inf
+
+        # Find the paths that start a new batch, i.e. whose style
+        # doesn't match the path before them.
+        count = self.pathCount
+        if count == 0: return
+        newStyle = np.ones(count, dtype=bool)
+        newStyle[1:] = (self.colors[1:] != self.colors[:-1]).any(axis=1) \
+            | (self.widths[1:] != self.widths[:-1]) \
+            | (self.static[1:] != self.static[:-1])
+        starts = np.flatnonzero(newStyle).tolist()
+        stops = starts[1:] + [count]
+
+        offsets = self.offsets.tolist()
+        colors = _colorBytes(self.colors)
+        widths = self.widths.tolist()
+        for k, m in zip(starts, stops):
+            vertices = segments[offsets[k]:max(offsets[m]-1, offsets[k])]
+            num_segments = 2*len(vertices)
+            pre.pathTable_add(
+                vertices.reshape(-1),
+                np.tile(colors[k], num_segments),
+                )
+            pre.pathWidths.append(widths[k])
+
+# Copies data into the ctypes array of a vertex list (e.g.
+# vlist.vertices) that pyglet hands out. A numpy array of the
+# matching type and size is copied over in one go. Anything else
+# goes through pyglet's own (much slower) element by element copy.
+def _upload(region, data):
+    if isinstance(data, np.ndarray):
+        target = np.ctypeslib.as_array(region)
+        if data.dtype == target.dtype and data.shape == target.shape \
+            and data.flags.c_contiguous:
+            ctypes.memmove(region, data.ctypes.data, data.nbytes)
+            return
+    region[:] = data
+
+# Vertex lists FastFrame.plot() draws through, one for each vertex
+# count. Consecutive frames of a tween have tables of the same
+# sizes, so they keep reusing the same lists. At most maxPlotLists
+# are kept, the least recently used being deleted first.
+maxPlotLists = 64
+_plotLists = {}
+
+# Vertex list for count vertices (see _plotLists)
+def _plotList(count):
+    vlist = _plotLists.pop(count, None)
+    if vlist is None:
+        vlist = pg.graphics.vertex_list(count, "v2f/stream", "c3B/stream")
+    _plotLists[count] = vlist
+    while len(_plotLists) > maxPlotLists:
+        _plotLists.pop(next(iter(_plotLists))).delete()
+    return vlist
+
+# Draws one table of a FastFrame in the given OpenGL mode
+def _plotTable(mode, vertexData, colorData):
+    count = len(vertexData)//2
+    if count == 0: return
+    vlist = _plotList(count)
+    _upload(vlist.vertices, vertexData)
+    _upload(vlist.colors, colorData)
+    vlist.draw(mode)
+
+# Converts an array of RGB colors in [0,1] into bytes for OpenGL
+# (wrapping around out of range values the way ctypes does).
+def _colorBytes(colors):
+    return np.rint(255*colors).astype(int).astype(np.uint8)
+
+# Precomputed tween between two paths p and q.
+# Everything that doesn't depend on the tween time t is computed
+# once in the constructor: for the spiral method that's the polar
+# decomposition of both paths and the deadends caused by nodes
+# revolving in opposite directions (which only depend on the sign
+# of dth). Calling tween(t) is then just a cheap evaluation of
+# r1 + t*dr and th1 + t*dth.
+class PathTween(object):
+    def __init__(self, p, q, method="spiral"):
+        if type(q) is not Path:
+            raise Exception("Can't use tweenPath() on non-Path types!")
+        # Check for invalid path seq lengths
+        if p != q and len(p.nodes) != len(q.nodes):
+            raise Exception("Can't tween paths of different seq lengths!")
+        if method not in ("spiral", "direct"):
+            raise Exception('Tween method "'+method+'" not recognized!')
+
+        self.start = p
+        self.end = q
+        self.method = method
+        if p == q: return
+
+        if method == "spiral":
+            self.r1, self.dr, self.th1, self.dth = spiralPolar(p.nodes, q.nodes)
+            self.rotmask = rotationDeadends(self.dth)
+        else:
+            self.dz = q.nodes - p.nodes
+
+    # Returns the tweened path at time t in [0,1]
+    def tween(self, t):
+        p = self.start
+        q = self.end
+        if p == q:
+            return p.copy()
+
+        T = p.copy()
+        T.color = colorTween(p.color, q.color, t)
+        # Tween the stroke widths if necessary
+        if p.width != q.width:
+            T.width = p.width + t*(q.width - p.width)
+
+        if self.method == "spiral":
+            T.nodes = spiralNodes(self.r1, self.dr, self.th1, self.dth, t)
+
+            # Disconnect nodes revolving in different directions
+            # too much. (see rotationDeadends())
+            if 0.01 < t and t < 0.99:
+                T.deadmask |= self.rotmask
+        else:
+            T.nodes = p.nodes + t*self.dz
+            # Deadend unplottable points
+            T.deadmask |= badnodeDeadends(T.nodes)
+
+        return T
+
+# Precomputed tween between two frames p and q.
+# Both frames are packed (see PackedFrame) and everything that
+# doesn't depend on t is worked out over the whole node array at
+# once, the same way PathTween does it for a single path.
+# tween(t) returns a Frame and tweenPacked(t) a PackedFrame.
+class FrameTween(object):
+    def __init__(self, p, q, method="spiral"):
+        if type(q) is not Frame:
+            raise Exception("Can't use tweenFrame() on non-Frame types!")
+        if method not in ("spiral", "direct"):
+            raise Exception('Tween method "'+method+'" not recognized!')
+
+        self.start = p
+        self.end = q
+        self.method = method
+        self.P = None
+        if p == q: return
+
+        if len(p.points) != len(q.points):
+            raise Exception("Can't tween Frames with different number of points!")
+        if len(p.paths) != len(q.paths):
+            raise Exception("Can't tween Frames with different number of paths!")
+
+        # Paths (and points) that are literally the same object
+        # in both frames (e.g. static ones) are just copied over.
+        samePath = np.array([p.paths[n] is q.paths[n]
+            for n in range(len(p.paths))], dtype=bool)
+        samePoint = np.array([p.points[n] is q.points[n]
+            for n in range(len(p.points))], dtype=bool)
+        self._prepare(p.pack(), q.pack(), samePath, samePoint)
+
+    # Tween between two different frames that are already packed.
+    # samePath and samePoint are boolean masks over the paths and
+    # points marking the ones the frames share (see __init__()).
+    # Only tweenPacked() works on these since there are no Frames
+    # to go back to.
+    @classmethod
+    def fromPacked(cls, P, Q, samePath, samePoint, method="spiral"):
+        if method not in ("spiral", "direct"):
+            raise Exception('Tween method "'+method+'" not recognized!')
+        tw = cls.__new__(cls)
+        tw.start = tw.end = None
+        tw.method = method
+        tw._prepare(P, Q, samePath, samePoint)
+        return tw
+
+    def _prepare(self, P, Q, samePath, samePoint):
+        method = self.method
+        self.P = P
+        self.Q = Q
+        self.samePoint = samePoint
+        if np.any((np.diff(P.offsets) != np.diff(Q.offsets)) & ~samePath):
+            raise Exception("Can't tween paths of different seq lengths!")
+        self.sameNodes = P.nodeMask(samePath)
+        self.lastNode = P.lastNodeMask()
+
+        if method == "spiral":
+            self.r1, self.dr, self.th1, self.dth = spiralPolar(P.nodes, Q.nodes)
+            # Rotation deadends never join two different paths
+            self.rotmask = rotationDeadends(self.dth) \
+                & ~self.lastNode & ~self.sameNodes
+            self.pointPolar = spiralPolar(P.pointPos, Q.pointPos)
+        else:
+            self.dz = Q.nodes - P.nodes
+        self.dcolors = Q.colors - P.colors
+        self.dwidths = Q.widths - P.widths
+
+    # Returns the tweened frame at time t in [0,1]
+    def tween(self, t):
+        if self.P is None: return self.start.copy()
+        return self.tweenPacked(t).unpack()
+
+    # Returns the tweened frame at time t in [0,1] as a PackedFrame
+    def tweenPacked(self, t):
+        if self.P is None: return self.start.pack()
+
+        P = self.P
+        Q = self.Q
+        same = self.sameNodes
+        T = P.copy()
+        T.delay = 0  # Tweened frames are never delayed
+        T.background = colorTween(P.background, Q.background, t)
+        T.colors = P.colors + t*self.dcolors
+        T.widths = P.widths + t*self.dwidths
+
+        if self.method == "spiral":
+            T.nodes = spiralNodes(self.r1, self.dr, self.th1, self.dth, t)
+            T.nodes[same] = P.nodes[same]
+
+            # Disconnect nodes revolving in different directions
+            # too much. (see rotationDeadends())
+            if 0.01 < t and t < 0.99:
+                T.deadmask |= self.rotmask
+        else:
+            T.nodes = P.nodes + t*self.dz
+            T.nodes[same] = P.nodes[same]
+
+            # Deadend unplottable points (but only within a path)
+            bad = ~np.isfinite(T.nodes) & ~same
+            T.deadmask |= bad
+            T.deadmask[:-1] |= bad[1:] & ~self.lastNode[:-1]
+
+        # Tween the points. Note that like Point.tween(), the direct
+        # method only moves the points and leaves their style alone.
+        moving = ~self.samePoint
+        if self.method == "spiral":
+            T.pointFill[moving] = tween(P.pointFill, Q.pointFill, t)[moving]
+            T.pointSize[moving] = tween(P.pointSize, Q.pointSize, t)[moving]
+            T.pointStrokeWeight[moving] = \
+                tween(P.pointStrokeWeight, Q.pointStrokeWeight, t)[moving]
+            T.pointPos[moving] = spiralNodes(*self.pointPolar, t=t)[moving]
+        else:
+            T.pointPos[moving] = tween(P.pointPos, Q.pointPos, t)[moving]
+
+        return T
+
 # This is a special frame object that contains batches of
 # prerendered OpenGL vertices. Objects from this class are
 # generated from the prerender() method in an Animation
@@ -561,28 +1089,370 @@ class FastFrame(object):
         (20,20, 30,30),
         (0,255,0, 0,255,0)
         )
+
+    PackedFrame.prerender() gives it numpy arrays (float32 vertices
+    and uint8 colors), which Animation.drawBatchesAccordingTo()
+    copies straight into the vertex lists.
     """
     def pathTable_add(self, vertexData, colorData):
         # Update pathTable
         self.pathTable.append([vertexData, colorData])
 
-    def plot(self):  # You may want to add a "window" param later
-        raise Exception("FastFrame.plot() is no longer implemented.")
-
-        if len(self.paths) != len(self.pathWidths):
-            raise Exception("Unequal lengths of paths and pathWidths!")
+    # Returns all the vertex and color data of the FastFrame as two
+    # flat arrays (float32 and uint8) along with a layout describing
+    # how to split them back up into tables (see unflatten()).
+    # Used to send prerendered frames between processes.
+    def flatten(self):
+        tables = self.pointTable + self.pathTable
+        vertices = np.concatenate([np.empty(0, dtype=np.float32)] +
+            [np.asarray(vertexData, dtype=np.float32)
+                for vertexData, _ in tables])
+        colors = np.concatenate([np.empty(0, dtype=np.uint8)] +
+            [np.asarray(colorData, dtype=np.uint8) for _, colorData in tables])
+        layout = (self.background, self.delay, list(self.pathWidths),
+            [(len(v), len(c)) for v, c in self.pointTable],
+            [(len(v), len(c)) for v, c in self.pathTable])
+        return vertices, colors, layout
+
+    # Rebuilds a FastFrame from the output of flatten(). The tables
+    # of the new FastFrame are views into the given arrays.
+    @classmethod
+    def unflatten(cls, vertices, colors, layout):
+        fframe = cls()
+        fframe.background, fframe.delay, fframe.pathWidths, \
+            pointSizes, pathSizes = layout
+        v = c = 0
+        for sizes, add in ((pointSizes, fframe.pointTable_add),
+            (pathSizes, fframe.pathTable_add)):
+            for vlen, clen in sizes:
+                add(vertices[v:v+vlen], colors[c:c+clen])
+                v += vlen
+                c += clen
+        return fframe
+
+    # Draws the FastFrame straight from its tables (the vertices are
+    # already in window coordinates). Unlike Animation's
+    # drawBatchesAccordingTo() it doesn't need any batches set up
+    # beforehand, so it works for frames prerendered on the fly.
+    # The tables are copied into reusable vertex lists the same way
+    # (see _plotList()).
+    def plot(self):
+        if len(self.pathTable) != len(self.pathWidths):
+            raise Exception("Unequal lengths of pathTable and pathWidths!")
 
         R,G,B = self.background
         pg.gl.glClearColor(R,G,B,1)
         pg.gl.glClear(pg.gl.GL_COLOR_BUFFER_BIT)
 
-        for n in range(len(self.paths)):
-            pg.gl.glLineWidth(self.pathWidths[n])
-            self.paths[n].draw()
+        for (vertexData, colorData), width in zip(self.pathTable, self.pathWidths):
+            pg.gl.glLineWidth(width)
+            _plotTable(pg.gl.GL_LINES, vertexData, colorData)
+
+        pg.gl.glLineWidth(1)
+        for vertexData, colorData in self.pointTable:
+            _plotTable(pg.gl.GL_TRIANGLE_FAN, vertexData, colorData)
+
+# Computes the frames of an animation ahead of the playhead on a
+# background thread and keeps up to size of them ready in a ring
+# buffer. render(index) returns the frame with the given index and
+# count is the total number of frames.
+# Frames are taken out with get(index), which never waits: if the
+# thread hasn't caught up yet it hands back the newest frame it has
+# instead and the thread skips ahead. Asking for a frame before the
+# ones in the buffer makes the thread start over from there
+# (throwing away whatever it had computed), except that the frame
+# last taken out can be asked for again. Any error render() raises
+# is raised again by get().
+class FramePrefetcher(object):
+    def __init__(self, render, count, size=30):
+        self.render = render
+        self.count = count
+        self.size = max(1, size)
+        self.buffer = [None]*self.size
+        self.start = 0  # Index of the next frame to take out
+        self.end = 0  # Index of the next frame to compute
+        self.last = None  # (index, frame) last taken out
+        self.generation = 0  # Goes up on every seek()
+        self.stopped = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._produce, daemon=True)
+        self.thread.start()
+
+    def _produce(self):
+        condition = self.condition
+        while True:
+            with condition:
+                while not self.stopped and (self.end >= self.count
+                    or self.end - self.start >= self.size):
+                    condition.wait()
+                if self.stopped: return
+                index = self.end
+                generation = self.generation
 
-        # Plot point batches
-        for point in self.points:
-            point.draw()
+            try:
+                entry = (self.render(index), None)
+            except Exception as e:
+                entry = (None, e)
+
+            with condition:
+                if generation != self.generation: continue
+                self.buffer[index % self.size] = entry
+                self.end += 1
+                condition.notify_all()
+
+    # Returns the frame with the given index if it's done. If it
+    # isn't, returns the newest frame done before it (or else the
+    # frame last taken out, or None if there isn't one) and lets the
+    # thread catch up, skipping any frames that are already late.
+    # With wait=True it waits for the frame itself instead.
+    def get(self, index, wait=False):
+        if self.last is not None and self.last[0] == index:
+            return self.last[1]
+        with self.condition:
+            if index < self.start or (wait and index > self.end):
+                self._seek(index)
+            if wait:
+                while self.end <= index and not self.stopped:
+                    self.condition.wait()
+
+            # Take out the newest frame done up to index. Frames
+            # skipped over are just thrown away.
+            found = min(index, self.end - 1)
+            entry = None
+            if found >= self.start:
+                entry = self.buffer[found % self.size]
+                for n in range(self.start, found+1):
+                    self.buffer[n % self.size] = None
+                self.start = found + 1
+
+            # The thread is behind. Rather than finish frames that
+            # are already late, it starts on this one.
+            if index > self.end:
+                self.generation += 1
+                self.start = self.end = index
+            self.condition.notify_all()
+
+        if entry is None:
+            return None if self.last is None else self.last[1]
+        frame, error = entry
+        if error is not None:
+            raise error
+        self.last = (found, frame)
+        return frame
+
+    # Makes the thread start computing frames from the given index
+    def seek(self, index):
+        with self.condition:
+            self._seek(index)
+
+    def _seek(self, index):
+        self.generation += 1
+        self.start = self.end = index
+        self.buffer = [None]*self.size
+        self.condition.notify_all()
+
+    # Number of frames ready to be taken out
+    def ready(self):
+        with self.condition:
+            return self.end - self.start
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+# Running totals over the tweens of an animation for finding
+# frames quickly. Frame n of the animation lies in the tween
+# starting at the last keyframe keyID with firstFrame[keyID] <= n,
+# which bisect finds in O(log(keyframes)) steps.
+# Likewise firstTime[keyID] is when the first frame of that tween is
+# due when playing, in frames (i.e. units of 1/frameRate seconds)
+# counting from the start of the animation. Every frame lasts one
+# frame, plus the delay of its keyframe if it's the first frame of
+# a tween. The last entry of both lists is the final keyframe.
+class Timeline(object):
+    def __init__(self, frameCount, delays):
+        self.frameCount = list(frameCount)
+        self.delays = list(delays)
+        self.firstFrame = [0]
+        self.firstTime = [0.0]
+        for count, delay in zip(self.frameCount, self.delays):
+            self.firstFrame.append(self.firstFrame[-1] + count)
+            self.firstTime.append(self.firstTime[-1] + count + delay)
+
+    # Index of the final frame (i.e. the final keyframe)
+    @property
+    def lastFrame(self):
+        return self.firstFrame[-1]
+
+    # Returns the keyframe keyID the frame with the given index
+    # tweens from and its position subFrame within that tween.
+    def locate(self, index):
+        keyID = bisect.bisect_right(self.firstFrame, index) - 1
+        keyID = min(max(keyID, 0), len(self.frameCount))
+        return keyID, index - self.firstFrame[keyID]
+
+    # Returns when the frame with the given index is due
+    def frameTime(self, index):
+        keyID, subFrame = self.locate(index)
+        if subFrame == 0:
+            return self.firstTime[keyID]
+        return self.firstTime[keyID] + self.delays[keyID] + subFrame
+
+    # Returns the index of the last frame due at the given time
+    # (clamped to the frames there are)
+    def frameAt(self, time):
+        keyID = bisect.bisect_right(self.firstTime, time) - 1
+        if keyID < 0: return 0
+        if keyID >= len(self.frameCount): return self.lastFrame
+        subFrame = math.floor(time - self.firstTime[keyID] - self.delays[keyID])
+        subFrame = min(max(subFrame, 0), self.frameCount[keyID]-1)
+        return self.firstFrame[keyID] + subFrame
+
+# List that counts the changes made to it so that anything worked
+# out from it can tell when it's out of date. Animation keeps its
+# keyframes and frameCount in these (see Animation.timeline).
+class _TrackedList(list):
+    def __init__(self, *args):
+        list.__init__(self, *args)
+        self.version = 0
+
+    def _changed(self):
+        self.version += 1
+
+    def __setitem__(self, key, value):
+        list.__setitem__(self, key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        list.__delitem__(self, key)
+        self._changed()
+
+    def __iadd__(self, other):
+        list.__iadd__(self, other)
+        self._changed()
+        return self
+
+    def __imul__(self, n):
+        list.__imul__(self, n)
+        self._changed()
+        return self
+
+    def append(self, value):
+        list.append(self, value)
+        self._changed()
+
+    def extend(self, values):
+        list.extend(self, values)
+        self._changed()
+
+    def insert(self, index, value):
+        list.insert(self, index, value)
+        self._changed()
+
+    def pop(self, *args):
+        value = list.pop(self, *args)
+        self._changed()
+        return value
+
+    def remove(self, value):
+        list.remove(self, value)
+        self._changed()
+
+    def clear(self):
+        list.clear(self)
+        self._changed()
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self._changed()
+
+    def reverse(self):
+        list.reverse(self)
+        self._changed()
+
+# Decides which frame of an animation to show from the time that
+# has passed since it started playing rather than from the number
+# of frames shown so far. That way an animation takes as long as
+# it should even when frames can't be drawn fast enough (some get
+# skipped instead).
+# timeline is the animation's Timeline, which gives when each
+# frame is due. The frame shown
+# at a given moment is the last one due within half a frame, so
+# that ticks arriving a hair early or late (as they do) don't make
+# frames get shown twice or skipped. The clock starts ticking at
+# the first call to tick().
+# It also keeps track of how well playback kept up (see stats()).
+class PlaybackClock(object):
+    def __init__(self, timeline, frameRate, timer=time.perf_counter):
+        self.timeline = timeline
+        self.frameRate = frameRate
+        self.timer = timer
+        self.start()
+
+    # Index of the final frame
+    @property
+    def lastFrame(self):
+        return self.timeline.lastFrame
+
+    # Restarts playback from the given frame (and resets the stats)
+    def start(self, index=0):
+        self.startFrame = index
+        self.origin = None  # Time frame 0 was (or would have been) due
+        self.pausedAt = None
+        self.lastIndex = index - 1
+        self.lastTick = None
+        self.shown = 0
+        self.dropped = 0
+        self.ticks = 0
+        self.intervalSum = 0.0
+        self.intervalSumSq = 0.0
+        self.maxLateness = 0.0
+
+    def pause(self):
+        if self.pausedAt is None:
+            self.pausedAt = self.timer()
+
+    # Picks up where pause() left off
+    def resume(self):
+        if self.pausedAt is None: return
+        if self.origin is not None:
+            self.origin += self.timer() - self.pausedAt
+        self.pausedAt = None
+        self.lastTick = None
+
+    # Returns the index of the frame to show now
+    def tick(self):
+        now = self.timer()
+        timeline = self.timeline
+        if self.origin is None:
+            self.origin = now - timeline.frameTime(self.startFrame)/self.frameRate
+        index = timeline.frameAt((now - self.origin)*self.frameRate + 0.5)
+
+        if self.lastTick is not None:
+            interval = now - self.lastTick
+            self.ticks += 1
+            self.intervalSum += interval
+            self.intervalSumSq += interval**2
+        self.lastTick = now
+        if index > self.lastIndex:
+            self.shown += 1
+            self.dropped += index - self.lastIndex - 1
+            self.maxLateness = max(self.maxLateness,
+                now - self.origin - timeline.frameTime(index)/self.frameRate)
+        self.lastIndex = index
+        return index
+
+    # Returns a dict of playback statistics: the number of frames
+    # shown and dropped, the mean time between ticks and its standard
+    # deviation (jitter), and the most any frame was shown after it
+    # was due (all in seconds).
+    def stats(self):
+        mean = self.intervalSum / max(1, self.ticks)
+        variance = self.intervalSumSq / max(1, self.ticks) - mean**2
+        return {"shown": self.shown, "dropped": self.dropped,
+            "meanInterval": mean, "jitter": math.sqrt(max(0.0, variance)),
+            "maxLateness": self.maxLateness}
 
 # A sequence of keyframes, tweened.
 class Animation(object):
@@ -615,6 +1485,16 @@ class Animation(object):
         # plane "spiral" over to their destinations during a tween.
         self.tweenMethod = "spiral"
 
+        # Timeline of the animation, worked out again whenever
+        # keyframes or frameCount have changed (see timeline).
+        self._timeline = None
+        self._timelineKey = None
+
+        # FrameTween objects for each pair of consecutive keyframes,
+        # keyed by the index of the first keyframe in the pair.
+        # Built as needed by tweenKeyframes().
+        self.tweenCache = {}
+
         # Prerendering attributes
         self.prerendered = False
         self.vertexMode = "v2f/stream"
@@ -625,6 +1505,17 @@ class Animation(object):
         self.path_vlists = []
         self.point_vlists = []
 
+        # How many frames ahead of the playhead to compute while
+        # playing an animation that isn't prerendered (see
+        # FramePrefetcher). 0 computes and draws each frame only
+        # when it's due, the old way.
+        self.prefetch = 30
+        self.prefetcher = None
+
+        # PlaybackClock of the current (or last) run(). Its stats()
+        # tell how well playback kept up.
+        self.clock = None
+
         # Active animation variables
         self.active = False
         self.window = None
@@ -633,6 +1524,42 @@ class Animation(object):
         self.currentFrame = 0
         self.delay = 0
 
+    # keyframes and frameCount can be changed freely (replaced or
+    # changed in place). Either way the timeline notices.
+    @property
+    def keyframes(self):
+        return self._keyframes
+
+    @keyframes.setter
+    def keyframes(self, value):
+        self._keyframes = _TrackedList(value)
+
+    @property
+    def frameCount(self):
+        return self._frameCount
+
+    @frameCount.setter
+    def frameCount(self, value):
+        self._frameCount = _TrackedList(value)
+
+    # The Timeline of the animation. It's only worked out again
+    # when keyframes or frameCount have changed, so changing the
+    # delay of a keyframe already in the animation needs a call to
+    # updateTimeline() (run() and export() call it anyway).
+    @property
+    def timeline(self):
+        key = (id(self._keyframes), self._keyframes.version,
+            id(self._frameCount), self._frameCount.version)
+        if self._timeline is None or key != self._timelineKey:
+            self.updateTimeline()
+        return self._timeline
+
+    def updateTimeline(self):
+        self._timeline = Timeline(self.frameCount,
+            [keyframe.delay for keyframe in self.keyframes])
+        self._timelineKey = (id(self._keyframes), self._keyframes.version,
+            id(self._frameCount), self._frameCount.version)
+
     # Returns a (deep-ish) copy of the animation
     def copy(self):
         ani = Animation()
@@ -651,6 +1578,7 @@ class Animation(object):
         ani.point_batches = self.point_batches[:]
         ani.path_vlists = self.path_vlists[:]
         ani.point_vlists = self.point_vlists[:]
+        ani.prefetch = self.prefetch
 
         ani.currentFrame = self.currentFrame
         ani.delay = self.delay
@@ -691,71 +1619,39 @@ class Animation(object):
         self.active = True
         self.window.switch_to()  # Focus on this window for rendering.
 
+        # Unless the animation is prerendered, start computing frames
+        # in the background.
+        if not self.prerendered and self.prefetch > 0 \
+            and self.prefetcher is None:
+            self.prefetcher = FramePrefetcher(self.renderFrame,
+                self.timeline.lastFrame+1, self.prefetch)
+            self.prefetcher.seek(self.currentFrame)
+
+        # The frame to show is picked by the clock on every tick.
+        # Frames with a delay simply stay due for longer (and get
+        # drawn again on every tick in the meantime).
+        self.updateTimeline()
+        self.clock = PlaybackClock(self.timeline, self.frameRate)
+        self.clock.start(self.currentFrame)
+
         def update(dt, mation=self):
             # if not mation.active:
                 # print("update() called while inactive")
-            if mation.delay > 0:
-                pg.clock.unschedule(mation.update)
-                pg.clock.schedule_interval(mation.update, \
-                    mation.delay/mation.frameRate)
-                mation.delay = -1
-            elif mation.delay < 0:
-                pg.clock.unschedule(mation.update)
-                pg.clock.schedule_interval(mation.update, 1.0/mation.frameRate)
-                mation.delay = 0
-
-            if mation.prerendered:
-                # Negative delay means we're actively delaying, so
-                # decrement the currentFrame to fool Pyglet into
-                # freezing on the correct frame.
-                if mation.delay < 0:
-                    mation.currentFrame -= 1
-                else:
-                    mation.delay = mation.frames[mation.currentFrame].delay
+            index = mation.clock.tick()
+            mation.currentFrame = index
+            mation.drawFrame(index)
 
-                mation.drawBatchesAccordingTo(mation.frames[mation.currentFrame])
-
-                mation.currentFrame += 1
-                if mation.currentFrame >= len(mation.frames):
-                    mation.currentFrame = 0
-                    mation.active = False
-                    pg.clock.unschedule(mation.update)
-                    if autoclose:
-                        pg.app.exit()
-                        mation.window.close()
-
-            elif mation.currentFrame >= sum(mation.frameCount):
+            if index >= mation.clock.lastFrame:
                 mation.currentFrame = 0
-                mation.keyframes[-1].plot(mation.view, mation.window)
                 mation.active = False
                 pg.clock.unschedule(mation.update)
+                # Get the start ready in case of a replay
+                if mation.prefetcher is not None:
+                    mation.prefetcher.seek(0)
                 if autoclose:
                     pg.app.exit()
                     mation.window.close()
 
-            else:
-                if mation.delay < 0: mation.currentFrame -= 1
-                # Compute which keyframe and subFrame we need to plot
-                keyID = 0
-                subFrame = mation.currentFrame
-                while subFrame >= mation.frameCount[keyID]:
-                    subFrame -= mation.frameCount[keyID]
-                    keyID += 1
-
-                if subFrame == 0:
-                    frm = mation.keyframes[keyID]
-                    if mation.delay >= 0:
-                        mation.delay = frm.delay
-                else:
-                    frm = mation.keyframes[keyID].tween( \
-                        mation.keyframes[keyID+1], \
-                        mation.transition(subFrame/mation.frameCount[keyID]), \
-                        mation.tweenMethod)
-
-                frm.plot(mation.view, mation.window)
-
-                mation.currentFrame += 1
-
         self.update = update
 
         @self.window.event
@@ -764,6 +1660,9 @@ class Animation(object):
 
         @self.window.event
         def on_close(mation=self):
+            if mation.prefetcher is not None:
+                mation.prefetcher.stop()
+                mation.prefetcher = None
             # Reset active animation attributes
             mation.active = False
             mation.window = None
@@ -780,12 +1679,37 @@ class Animation(object):
                 mation.paused = False
                 mation.delay = 0
                 mation.currentFrame = 0
+                mation.clock.start(0)
                 pg.clock.schedule_interval(self.update, 1.0/self.frameRate)
             elif mation.paused:
                 mation.resume()
             else:
                 mation.pause()
 
+        # Dragging across the window scrubs through the animation
+        # (left edge is the start, right edge the end).
+        @self.window.event
+        def on_mouse_drag(x, y, dx, dy, buttons, modifiers, mation=self):
+            mation.pause()
+            mation.seek(round(x/mation.window.width*mation.timeline.lastFrame))
+
+        # Space works like a click, the arrow keys step a frame
+        # (a second with shift) and Home/End go to the start/end.
+        @self.window.event
+        def on_key_press(symbol, modifiers, mation=self):
+            key = pg.window.key
+            if symbol == key.SPACE:
+                on_mouse_press(0, 0, None, modifiers)
+            elif symbol in (key.LEFT, key.RIGHT):
+                count = mation.frameRate if modifiers & key.MOD_SHIFT else 1
+                mation.step(count if symbol == key.RIGHT else -count)
+            elif symbol == key.HOME:
+                mation.pause()
+                mation.seek(0)
+            elif symbol == key.END:
+                mation.pause()
+                mation.seek(mation.timeline.lastFrame)
+
         # Reset delay attribute
         self.delay = 0
 
@@ -806,14 +1730,17 @@ class Animation(object):
         self.active = True
         self.window.switch_to()  # Focus on this window for rendering.
 
+        self.updateTimeline()
+        lastFrame = self.timeline.lastFrame
+
         # Describes the delay of each gif frame of animation.
         # It is equal to 1/frameRate unless there's a keyframe delay.
-        gifDelays = [1.0/self.frameRate]*(1+sum(self.frameCount))
+        gifDelays = [1.0/self.frameRate]*(1+lastFrame)
         def update(dt, mation=self):
             self.window.set_visible(False)
             animationEnd = False
             # Reached end of animation. Render final keyframe.
-            if mation.currentFrame >= sum(mation.frameCount):
+            if mation.currentFrame >= lastFrame:
                 mation.keyframes[-1].plot(mation.view, mation.window)
                 mation.active = False
                 pg.clock.unschedule(mation.update)
@@ -822,27 +1749,21 @@ class Animation(object):
                     max(1.0/mation.frameRate, mation.keyframes[-1].delay/mation.frameRate)
             else:
                 # Compute which keyframe and subFrame we need to plot
-                keyID = 0
-                subFrame = mation.currentFrame
-                while subFrame >= mation.frameCount[keyID]:
-                    subFrame -= mation.frameCount[keyID]
-                    keyID += 1
+                keyID, subFrame = mation.locateFrame(mation.currentFrame)
 
                 if subFrame == 0:
                     frm = mation.keyframes[keyID]
                     gifDelays[mation.currentFrame] = \
                         max(1.0/mation.frameRate, mation.keyframes[keyID].delay/mation.frameRate)
                 else:
-                    frm = mation.keyframes[keyID].tween( \
-                        mation.keyframes[keyID+1], \
-                        mation.transition(subFrame/mation.frameCount[keyID]), \
-                        mation.tweenMethod)
+                    frm = mation.tweenKeyframes(keyID, \
+                        mation.transition(subFrame/mation.frameCount[keyID]))
 
                 frm.plot(mation.view, mation.window)
 
             # Save current frame as a numbered PNG image.
             imgfile = pwd+"resources"+os.sep+"temp"+os.sep + int2fixedstr(mation.currentFrame, \
-                digits=numdigits(1+sum(mation.frameCount))) + ".png"
+                digits=numdigits(1+lastFrame)) + ".png"
             try:
                 pyglet.image.get_buffer_manager().get_color_buffer().save(imgfile)
             except:
@@ -905,19 +1826,142 @@ class Animation(object):
         pg.app.run()
         pg.app.exit()
 
+    # Returns the keyframe keyID the frame with the given index
+    # tweens from and its position subFrame within that tween.
+    # Index sum(frameCount) is the final keyframe.
+    def locateFrame(self, index):
+        return self.timeline.locate(index)
+
+    # Returns the frame with the given index prerendered into a
+    # FastFrame, the way run() shows it.
+    def renderFrame(self, index):
+        keyID, subFrame = self.locateFrame(index)
+        # subFrame == 0 means we're at a keyframe:
+        # no tweening necessary
+        if subFrame == 0:
+            return self.keyframes[keyID].pack().prerender(
+                self.view, self.window)
+        return prerenderTween(self.keyframeTween(keyID),
+            self.transition(subFrame/self.frameCount[keyID]), None,
+            self.view, self.window)
+
+    # Returns the index of the frame shown the given number of
+    # seconds into playing the animation (delays included), or the
+    # nearest one if it's between frames.
+    def frameIndex(self, seconds):
+        return self.timeline.frameAt(seconds*self.frameRate + 0.5)
+
+    # Returns the frame with the given index, or the one shown the
+    # given number of seconds in (see frameIndex()), as a Frame.
+    # Only the pair of keyframes the frame lies between gets
+    # tweened, so any frame costs the same to get.
+    def frameAt(self, index=None, seconds=None):
+        if index is None:
+            if seconds is None:
+                raise TypeError("frameAt() needs an index or seconds")
+            index = self.frameIndex(seconds)
+        keyID, subFrame = self.locateFrame(index)
+        # subFrame == 0 means we're at a keyframe:
+        # no tweening necessary
+        if subFrame == 0:
+            return self.keyframes[keyID]
+        return self.tweenKeyframes(keyID,
+            self.transition(subFrame/self.frameCount[keyID]))
+
+    # Returns the frame tweened between keyframes[keyID] and
+    # keyframes[keyID+1] at time t in [0,1].
+    # The FrameTween for a keyframe pair is only built the first
+    # time the pair is needed. After that it's reused from
+    # self.tweenCache unless the keyframes or the tween method
+    # changed in the meantime.
+    def tweenKeyframes(self, keyID, t):
+        return self.keyframeTween(keyID).tween(t)
+
+    # Returns the (cached) FrameTween between keyframes[keyID] and
+    # keyframes[keyID+1]. See tweenKeyframes().
+    def keyframeTween(self, keyID):
+        p = self.keyframes[keyID]
+        q = self.keyframes[keyID+1]
+        tw = self.tweenCache.get(keyID)
+        if tw is None or tw.start is not p or tw.end is not q \
+            or tw.method != self.tweenMethod:
+
+            tw = FrameTween(p, q, self.tweenMethod)
+            self.tweenCache[keyID] = tw
+        return tw
+
     def pause(self):
         if not self.active: return
         self.paused = True
         pg.clock.unschedule(self.update)
+        self.clock.pause()
 
     def resume(self):
         if not self.active: return
         self.paused = False
+        self.clock.resume()
         pg.clock.schedule_interval(self.update, 1.0/self.frameRate)
 
+    # Jumps to the frame with the given index. If the animation is
+    # playing it carries on from there, if it's paused (or over) the
+    # frame is just shown, and if it hasn't been run yet run() starts
+    # there.
+    def seek(self, index):
+        index = min(max(int(index), 0), self.timeline.lastFrame)
+        self.currentFrame = index
+        if self.update is None: return
+
+        # Having reached the end, the animation stays put (paused) at
+        # the new frame instead.
+        if not self.active:
+            self.active = True
+            self.paused = True
+        self.clock.start(index)
+        if self.prefetcher is not None:
+            self.prefetcher.seek(index)
+        self.window.switch_to()
+        self.drawFrame(index, wait=True)
+
+    # Pauses and moves count frames forward (or backward if it's
+    # negative).
+    def step(self, count=1):
+        self.pause()
+        self.seek(self.currentFrame + count)
+
+    # Returns the playback statistics of the current (or last) run
+    # (see PlaybackClock.stats()), or None if it hasn't been run.
+    def pacingStats(self):
+        if self.clock is None: return None
+        return self.clock.stats()
+
+    # Returns the times at which each frame is due when the
+    # animation plays, in frames (i.e. units of 1/frameRate seconds)
+    # from the start. Every frame lasts one frame, plus the delay of
+    # its keyframe if it's the first frame of a tween.
+    def frameStarts(self):
+        timeline = self.timeline
+        return np.array([timeline.frameTime(index)
+            for index in range(timeline.lastFrame+1)])
+
+    # Draws the frame with the given index in the animation's window.
+    # While playing, a frame the prefetcher hasn't finished yet is
+    # stood in for by the newest one it has (see
+    # FramePrefetcher.get()) unless wait is True.
+    def drawFrame(self, index, wait=False):
+        if self.prerendered:
+            self.drawBatchesAccordingTo(self.frames[index])
+        elif self.prefetcher is not None:
+            frame = self.prefetcher.get(index, wait)
+            if frame is not None:
+                frame.plot()
+        else:
+            self.frameAt(index).plot(self.view, self.window)
+
     # Prerenders and optimizes the animation and stores
     # all the frames in self.frames
-    def prerender(self):
+    # If given, progress(done, total) is called every so often with
+    # the number of frames prerendered so far and the total.
+    def prerender(self, progress=None):
         if self.window is None:
             self.setupWindow()
         mation = self
@@ -932,40 +1976,7 @@ class Animation(object):
 
         if len(mation.keyframes) == 0: return
 
-        currentFrame = 0
-        totalFrameCount = sum(mation.frameCount)
-        while currentFrame < totalFrameCount:
-            # Compute which keyframe and subFrame we need to plot
-            keyID = 0
-            subFrame = currentFrame
-            while subFrame >= mation.frameCount[keyID]:
-                subFrame -= mation.frameCount[keyID]
-                keyID += 1
-
-            basicFrame = mation.keyframes[keyID].tween( \
-                mation.keyframes[keyID+1], \
-                mation.transition(subFrame/mation.frameCount[keyID]), \
-                mation.tweenMethod)
-
-            # subFrame == 0 means we're at a keyframe:
-            # no tweening necessary
-            if subFrame == 0:
-                basicFrame.delay = mation.keyframes[keyID].delay
-
-            basicFrame.optimizePaths()
-
-            # Prerender the basicFrame and store the resulting
-            # FastFrame.
-            mation.frames.append(basicFrame.prerender(mation.view,
-                mation.window))
-
-            currentFrame += 1
-
-        # Manually handle the final frame
-        lastFrame = mation.keyframes[-1].copy()
-        lastFrame.optimizePaths()
-        mation.frames.append(lastFrame.prerender(mation.view,
-            mation.window))
+        mation.frames = mation.prerenderFrames(progress)
 
         # Create initial batches.
         # Initialize them to the first frame's tables
@@ -989,6 +2000,43 @@ class Animation(object):
             self.path_batches.append(batch)
             self.path_vlists.append(vlist)
 
+    # Returns the list of FastFrames making up the animation (see
+    # prerender()). Big animations are spread over several processes
+    # (see morpho.parallel).
+    def prerenderFrames(self, progress=None):
+        import morpho.parallel as parallel  # (imports this module)
+        mation = self
+
+        # Tween times of the frames between each keyframe and the
+        # next, along with their delays. subFrame == 0 means we're
+        # at a keyframe: no tweening necessary, but the frame keeps
+        # the keyframe's delay.
+        times = []
+        for keyID in range(len(mation.keyframes)-1):
+            count = mation.frameCount[keyID]
+            times.append([(mation.transition(subFrame/count),
+                mation.keyframes[keyID].delay if subFrame == 0 else None)
+                for subFrame in range(count)])
+
+        frames = parallel.prerenderTweens(mation, times, progress)
+        if frames is None:
+            frames = []
+            total = sum(len(tweenTimes) for tweenTimes in times) + 1
+            for keyID, tweenTimes in enumerate(times):
+                tw = mation.keyframeTween(keyID)
+                for t, delay in tweenTimes:
+                    frames.append(prerenderTween(tw, t, delay,
+                        mation.view, mation.window))
+                    if progress is not None:
+                        progress(len(frames), total)
+
+        # Manually handle the final frame
+        lastFrame = mation.keyframes[-1].pack()
+        frames.append(lastFrame.prerender(mation.view, mation.window))
+        if progress is not None:
+            progress(len(frames), len(frames))
+        return frames
+
     def drawBatchesAccordingTo(self, fframe):
         R,G,B = fframe.background
         pg.gl.glClearColor(R,G,B,1)
@@ -998,8 +2046,8 @@ class Animation(object):
         for b in range(len(self.path_batches)):
             # Update vertex lists
             vlist = self.path_vlists[b]
-            vlist.vertices = fframe.pathTable[b][0]
-            vlist.colors = fframe.pathTable[b][1]
+            _upload(vlist.vertices, fframe.pathTable[b][0])
+            _upload(vlist.colors, fframe.pathTable[b][1])
 
             pg.gl.glLineWidth(fframe.pathWidths[b])
             self.path_batches[b].draw()
@@ -1008,8 +2056,8 @@ class Animation(object):
         for b in range(len(self.point_batches)):
             # Update vertex lists
             vlist = self.point_vlists[b]
-            vlist.vertices = fframe.pointTable[b][0]
-            vlist.colors = fframe.pointTable[b][1]
+            _upload(vlist.vertices, fframe.pointTable[b][0])
+            _upload(vlist.colors, fframe.pointTable[b][1])
 
             pg.gl.glLineWidth(1)
             self.point_batches[b].draw()
@@ -1051,6 +2099,11 @@ def OpenGL_ellipse(x, y, a, b, dTheta=10):
         pg.gl.glVertex2f(x + a*math.cos(th), y + b*math.sin(th))
     pg.gl.glEnd()
 
+# Unit circle vertices used to prerender points
+# (same angles as OpenGL_ellipse() with its default dTheta).
+_circleCos = np.array([math.cos(th*DEG2RAD) for th in range(0,360,10)])
+_circleSin = np.array([math.sin(th*DEG2RAD) for th in range(0,360,10)])
+
 # Creates a window that animations can take place in.
 def createWindow(width=800, height=800):
     return pg.window.Window(width, height)
@@ -1130,6 +2183,193 @@ def argShift(th1, th2):
         dth = dth - math.copysign(tau, dth)
     return dth
 
+# Vectorized version of argShift() that works on whole numpy
+# arrays of angles at once.
+def argShiftArray(th1, th2):
+    th1 = th1 % tau
+    th2 = th2 % tau
+
+    dth = th2 - th1
+    return np.where(np.abs(dth) > pi + 1.189e-12,
+        dth - np.copysign(tau, dth), dth)
+
+# Splits two arrays of nodes into the polar pieces used by the
+# spiral tween: the starting radii and angles of z1 and how much
+# each needs to change to reach z2.
+# Returns the tuple (r1, dr, th1, dth).
+def spiralPolar(z1, z2):
+    # np.hypot() matches python's abs() bit-for-bit. np.abs() doesn't.
+    r1 = np.hypot(z1.real, z1.imag)
+    r2 = np.hypot(z2.real, z2.imag)
+    # Angles in the argument order of cmath.phase()
+    th1 = np.arctan2(z1.imag, z1.real) % tau
+    th2 = np.arctan2(z2.imag, z2.real) % tau
+
+    dr = r2 - r1
+    dth = argShiftArray(th1, th2)
+    return r1, dr, th1, dth
+
+# Builds the spiral-tweened nodes at time t out of the pieces
+# returned by spiralPolar().
+def spiralNodes(r1, dr, th1, dth, t):
+    r = r1 + t*dr
+    th = th1 + t*dth
+    return r*np.exp(th*1j)
+
+# Given the array of angle shifts (dth) of a spiral tween, returns
+# a boolean mask marking which nodes should be disconnected from
+# the next node because the two are revolving in different
+# directions too much.
+# The value angle_tol represents how far two oppositely
+# revolving nodes have to angularly differ before
+# we disconnect them.
+def rotationDeadends(dth, angle_tol=0.053):
+    mask = np.zeros(len(dth), dtype=bool)
+    dth1 = dth[:-1]
+    dth2 = dth[1:]
+    mask[:-1] = (dth1*dth2 < 0) & (np.abs(dth1-dth2) > angle_tol)
+    return mask
+
+# Returns a boolean mask that disconnects every unplottable node
+# (inf or nan) from both of its neighbors.
+def badnodeDeadends(nodes):
+    bad = ~np.isfinite(nodes)
+    mask = bad.copy()
+    mask[:-1] |= bad[1:]
+    return mask
+
+# Evaluates the function func on every node of the given complex
+# array and returns the results as a new complex array.
+# If func can evaluate whole arrays at once (i.e. it has an
+# evalArray() method like the Evaluators in morpho.compiler) that
+# is used. Otherwise the nodes are handed to func one by one as
+# plain python complex numbers and any error raised by func maps
+# that node to nan. That's also done for fewer than minArrayNodes
+# nodes, where the fixed cost of each numpy call adds up to more
+# than the loop.
+#
+# Big arrays are split into chunks of chunkSize nodes which are
+# evaluated on a pool of worker threads. numpy releases the GIL
+# while it works, so this only pays off for formulas evalArray()
+# can vectorize (see compiler.Evaluator.vectorized). Everything
+# else is evaluated in one go on the calling thread. Whether to
+# use evalArray() is decided once for all the nodes, so a short
+# last chunk is evaluated the same way as the others and the
+# values never depend on how the nodes got split up.
+def evalNodes(func, nodes):
+    array = getattr(func, "evalArray", None) is not None \
+        and len(nodes) >= minArrayNodes
+    if workers > 1 and len(nodes) > chunkSize \
+        and getattr(func, "vectorized", False):
+        chunks = [nodes[n:n+chunkSize] for n in range(0, len(nodes), chunkSize)]
+        return np.concatenate(list(_threadPool().map(
+            lambda chunk: _evalChunk(func, chunk, array), chunks)))
+    return _evalChunk(func, nodes, array)
+
+# Evaluates func on the nodes using its evalArray() method if array
+# is True (falling back on the loop if that gives None).
+def _evalChunk(func, nodes, array):
+    if array:
+        values = func.evalArray(nodes)
+        if values is not None:
+            return values
+
+    values = np.empty(len(nodes), dtype=complex)
+    for n, z in enumerate(nodes.tolist()):
+        try:
+            values[n] = func(z)
+        except:  # Errors map to nan
+            values[n] = nan
+    return values
+
+# Number of threads evalNodes() uses, the most nodes each thread
+# evaluates at a time, and the fewest nodes worth evaluating as an
+# array. Set workers = 1 to evaluate everything on the calling
+# thread.
+workers = min(32, os.cpu_count() or 1)
+chunkSize = 2**14
+minArrayNodes = 128
+
+_pool = None
+_poolWorkers = 0
+_poolLock = threading.Lock()
+
+# Thread pool with the current number of workers (made again if
+# workers has changed since the last time).
+def _threadPool():
+    global _pool, _poolWorkers
+    with _poolLock:
+        if _pool is None or _poolWorkers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ThreadPoolExecutor(max_workers=workers)
+            _poolWorkers = workers
+        return _pool
+
+# Set this to False to have evalUniqueNodes() evaluate every node
+# even if it appears more than once.
+dedup = True
+
+# Running totals of the nodes handed to evalUniqueNodes() and of
+# the distinct ones among them that actually got evaluated (see
+# dedupRatio()).
+dedupCounts = {"nodes": 0, "unique": 0}
+
+# Nodes are compared by their raw bytes so that e.g. 0.0 and -0.0
+# (which can lie on different sides of a branch cut) stay apart.
+_nodeKey = np.dtype((np.void, 16))
+
+# Same as evalNodes(), but every distinct node is evaluated just
+# once and the values scattered back to all its copies. Grids have
+# lots of coincident nodes (e.g. where grid lines cross), so this
+# saves evaluations of expensive functions like zeta for free.
+# If func has a true "symmetric" attribute (see
+# compiler.Evaluator.symmetric), nodes below the real axis are
+# swapped for their mirror images first, and their values
+# conjugated back at the end. On grids symmetric about the real
+# axis this halves the number of distinct nodes.
+# Functions with a true "cheap" attribute (see
+# compiler.Evaluator.cheap) just get evaluated on every node.
+def evalUniqueNodes(func, nodes):
+    nodes = np.asarray(nodes, dtype=complex)
+    flip = None
+    if getattr(func, "symmetric", False):
+        flip = nodes.imag < 0
+        nodes = np.where(flip, nodes.conjugate(), nodes)
+
+    if not dedup or len(nodes) < 2 or getattr(func, "cheap", False):
+        values = evalNodes(func, nodes)
+    else:
+        keys = np.ascontiguousarray(nodes).view(_nodeKey)
+        unique, index, inverse = np.unique(keys,
+            return_index=True, return_inverse=True)
+        dedupCounts["nodes"] += len(nodes)
+        dedupCounts["unique"] += len(unique)
+        if len(unique) == len(nodes):
+            values = evalNodes(func, nodes)
+        else:
+            values = evalNodes(func, nodes[index])[inverse.reshape(-1)]
+
+    if flip is not None:
+        values[flip] = values[flip].conjugate()
+    return values
+
+# Returns the average number of copies of each node evaluated by
+# evalUniqueNodes() so far (1 means deduplication saved nothing).
+def dedupRatio():
+    return dedupCounts["nodes"] / max(1, dedupCounts["unique"])
+
+# Prerenders the frame at time t of the given FrameTween. If delay
+# isn't None, it becomes the delay of the frame.
+def prerenderTween(tw, t, delay, view, window):
+    # Tween straight into packed form. There's no need to
+    # build Path objects or optimize them since prerendering
+    # a PackedFrame batches matching paths together anyway.
+    basicFrame = tw.tweenPacked(t)
+    if delay is not None:
+        basicFrame.delay = delay
+    return basicFrame.prerender(view, window)
+
 # Converts complex coordinates into screen pixel coordinates
 # according to the screen dimensions and the set window values.
 def screenCoords(z, view, window):
@@ -1147,10 +2387,10 @@ def screenCoords(z, view, window):
 def line(z1, z2, steps=50):
     steps = int(steps)
     dz = (z2-z1)/steps
-    seq = [z1]
-    for n in range(1,steps):
-        seq.append(z1 + n*dz)
-    seq.append(z2)
+    seq = np.empty(steps+1, dtype=complex)
+    seq[:-1] = z1 + np.arange(steps)*dz
+    seq[0] = z1
+    seq[-1] = z2
     return Path(seq)
 
 # Generates a path in the shape of an ellipse centered
@@ -1274,7 +2514,7 @@ def zetaGrid(res=1):
 
         # thin Lines
         thin = Line.copy()
-        thin.seq = [z+0.5*1j for z in Line.seq]
+        thin.nodes = Line.nodes + 0.5*1j
         thin.color = (0.5, 0.5, 1)
         thin.width = 1
         thins.append(thin)
@@ -1287,7 +2527,7 @@ def zetaGrid(res=1):
         # thin Lines
         if y == 4: continue
         thin = Line.copy()
-        thin.seq = [z+0.5*1j for z in Line.seq]
+        thin.nodes = Line.nodes + 0.5*1j
         thin.color = (0.5, 0.5, 1)
         thin.width = 1
         thins.append(thin)
@@ -1301,7 +2541,7 @@ def zetaGrid(res=1):
 
         # thin Lines
         thin = Line.copy()
-        thin.seq = [z+0.5 for z in Line.seq]
+        thin.nodes = Line.nodes + 0.5
         thin.color = (0.5, 0.5, 1)
         thin.width = 1
         thins.append(thin)
@@ -1315,7 +2555,7 @@ def zetaGrid(res=1):
         # thin Lines
         if x == 7: continue
         thin = Line.copy()
-        thin.seq = [z+0.5 for z in Line.seq]
+        thin.nodes = Line.nodes + 0.5
         thin.color = (0.5, 0.5, 1)
         thin.width = 1
         thins.append(thin)
@@ -1332,7 +2572,7 @@ def zetaGrid(res=1):
 
         # thin Lines
         thin = Line.copy()
-        thin.seq = [z + 0.5*1j for z in Line.seq]
+        thin.nodes = Line.nodes + 0.5*1j
         thin.color = (0.5, 0.5, 1)
         thin.width = 1
         thins.append(thin)
@@ -1348,7 +2588,7 @@ def zetaGrid(res=1):
 
         # thin Lines
         thin = Line.copy()
-        thin.seq = [z + 0.5 for z in Line.seq]
+        thin.nodes = Line.nodes + 0.5
         thin.color = (0.5, 0.5, 1)
         thin.width = 1
         thins.append(thin)
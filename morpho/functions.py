@@ -2,36 +2,64 @@
 This module defines the functions and constants that users
 can use in the Morpho GUI like
 sin, cos, tan, log, exp, sqrt, i, j, inf, real, imag,
-conj, zeta.
+conj, zeta, gamma.
 
 It also implements a 2x2 matrix class so that linear
 transformations can also be animated.
 '''
 
 
-import mpmath as mp
+import morpho.memo as memo
+import morpho.special as special
 from math import *
 from cmath import *
 import numpy as np
 
+# Turns an operation on vfunctions._Mats into a method of _Mat.
+# Mats among the arguments and the result are converted, and
+# numbers come back as plain python ones.
+def _viaArray(op):
+    def method(self, *args):
+        import morpho.vfunctions as vfunctions
+        args = [x._array() if isinstance(x, _Mat) else x for x in args]
+        result = op(self._array(), *args)
+        if isinstance(result, vfunctions._Mat):
+            return Mat(*[np.asarray(x).item() for x in result.entries])
+        return np.asarray(result).item()
+    return method
+
 # Special 2x2 matrix class for Morpho which can handle
 # multiplication on a complex number by treating it as
 # a 2D column vector.
+# The arithmetic is done by the array version of mats
+# (vfunctions._Mat) on the four entries, rather than by the BLAS
+# behind np.matrix, so a formula gives exactly the same values
+# node by node as it does on a whole array of nodes.
 class _Mat(np.matrix):
 
-    def __mul__(self, other):
-        if type(other) is _Mat:
-            # Use the superclass to compute the matrix product
-            return np.matrix.__mul__(self, other)
-        else:
-            Z = np.matrix([[other.real], [other.imag]])
-            prod = np.matrix.__mul__(self, Z)
-            return float(prod[0,0]) + float(prod[1,0])*1j
+    # The entries as a vfunctions._Mat
+    def _array(self):
+        import morpho.vfunctions as vfunctions
+        entries = getattr(self, "entries", None)
+        if entries is None:
+            entries = tuple(np.asarray(self).reshape(-1).tolist())
+        return vfunctions._Mat(*entries)
+
+    __mul__ = _viaArray(lambda M, other: M*other)
+    __rmul__ = _viaArray(lambda M, other: other*M)
+    __add__ = _viaArray(lambda M, other: M+other)
+    __radd__ = _viaArray(lambda M, other: other+M)
+    __sub__ = _viaArray(lambda M, other: M-other)
+    __rsub__ = _viaArray(lambda M, other: other-M)
+    __truediv__ = _viaArray(lambda M, other: M/other)
+    __rtruediv__ = _viaArray(lambda M, other: other/M)
+    __neg__ = _viaArray(lambda M: -M)
+    __pow__ = _viaArray(lambda M, n: M**n)
+    det = _viaArray(lambda M: M.det())
+    T = property(_viaArray(lambda M: M.T))
 
     # Convenience function: returns inverse of the mat
-    @property
-    def inv(self):
-        return self**(-1)
+    inv = I = property(_viaArray(lambda M: M.inv))
 
 
 # # Converts a numpy matrix into a Morpho _Mat
@@ -43,14 +71,16 @@ class _Mat(np.matrix):
 # Overriding the inherited __init__ from np.matrix turned out
 # to be more complicated than I thought, so this was a workaround.
 def Mat(x1=0, x2=0, y1=0, y2=0):
-    return _Mat([[x1, x2], [y1, y2]])
+    M = _Mat([[x1, x2], [y1, y2]])
+    M.entries = (x1, x2, y1, y2)
+    return M
 
 
 
 ### VARIOUS OTHER CONSTANTS AND FUNCTIONS ###
 
 mat = MAT = Mat  # Any case works.
-det = lambda M: np.linalg.det(M)  # For mats only
+det = lambda M: M.det()  # For mats only
 i = j = 1j
 tau = 2*pi  # pi is wrong, apparently...
 ln = log
@@ -64,10 +94,19 @@ mod = lambda a,b: a % b
 fact = factorial
 conj = lambda s: s.conjugate()
 
+# Set this to True to have the special functions (e.g. zeta)
+# computed by mpmath in high precision instead of by the much
+# faster double precision versions in morpho.special. They use a
+# context of their own rather than mpmath's global one, which isn't
+# safe to use from several threads (see special.mpEval()).
+useMpmath = False
+
 # Standard Riemann Zeta function
+@memo.memoize("zeta")
 def zeta(s):
     if s == 1: return nan
-    else: return complex(mp.zeta(s))
+    elif useMpmath: return special.mpEval("zeta", s)
+    else: return complex(special.zeta(s))
 
 # Treats s as a 2D vector and returns its lp-norm
 def norm(s, p=2):
@@ -103,9 +142,22 @@ product = prod
 # and 0 given 0.
 sgn = sign = lambda x: 0 if x==0 else x/abs(x)
 
-# Complex gamma function
+# Complex gamma function. Gives nan at the poles.
+@memo.memoize("gamma")
 def gamma(s):
-    try:
-        return mp.gamma(s)
-    except ValueError:
-        return nan
+    if useMpmath:
+        try:
+            return special.mpEval("gamma", s)
+        except ValueError:
+            return nan
+    return complex(special.gamma(s))
+
+# Principal branch of the complex log gamma function
+@memo.memoize("loggamma")
+def loggamma(s):
+    if useMpmath:
+        try:
+            return special.mpEval("loggamma", s)
+        except ValueError:
+            return nan
+    return complex(special.loggamma(s))
@@ -24,6 +24,9 @@ import platform
 
 import morpho.engine as eng
 import morpho.whitelist as wh
+import morpho.compiler as compiler
+import morpho.cache as cache
+import morpho.parallel as parallel
 
 # Current Morpho version
 version = 1.11
@@ -314,6 +317,21 @@ class RootWindow(object):
         tk.Button(bFrame1, text="Exit", width=5, command=self.exit) \
             .grid(sticky="we", padx=5, pady=5, row=1, column=3)
 
+        # Timeline slider picking the moment (in seconds) that
+        # PLAY! starts the animation from
+        self.startTime = tk.DoubleVar(value=0)
+
+        timeFrame = tk.Frame(optFrame)
+        timeFrame.grid(sticky="we", row=11, column=0)
+
+        tk.Label(master=timeFrame, text="Start at (sec):") \
+            .grid(sticky="sw", padx=5, row=0, column=0)
+
+        self.timeline = tk.Scale(master=timeFrame, orient="horizontal",
+            length=220, resolution=0.1, variable=self.startTime)
+        self.timeline.grid(sticky="we", padx=5, row=0, column=1)
+        self.updateTimeline()
+
         # Catch close event
         self.root.protocol("WM_DELETE_WINDOW", self.exit)
 
@@ -335,6 +353,20 @@ class RootWindow(object):
             name = frm.name if not frm.hide else frm.name + "***"
             self.listbox.insert("end", name)
 
+        self.updateTimeline()
+
+    # Returns how long the animation lasts (in seconds) when played
+    # up to its final frame: the delays of all the visible frames
+    # but the last, plus the tweens between them.
+    def animationLength(self):
+        visibleFrames = [frm for frm in self.frames if not frm.hide]
+        return sum(frm.delay for frm in visibleFrames[:-1]) \
+            + sum(frm.tweenDuration for frm in visibleFrames[1:])
+
+    # Fits the timeline slider to the length of the animation
+    def updateTimeline(self):
+        self.timeline.configure(to=self.animationLength())
+
     # Returns the frame structure object corresponding to the
     # currently highlighted name in the Frames listbox.
     def getSelection(self):
@@ -611,12 +643,13 @@ class RootWindow(object):
                 )
             return
 
+        start = self.startTime.get()
         if runLocal:
             state = GUIstate()
             state.load(pwd+"resources"+os.sep+"lastplay.mrm")
-            state.run()
+            state.run(start=start)
         else:
-            callPlayer()
+            callPlayer(start=start)
 
     # This method will ACTUALLY play the animation.
     # The play() method just writes the animation
@@ -1592,42 +1625,43 @@ class GUIstate(object):
         domFrame.optimizePaths()
 
         # Create polar grid from square, centered domain grid
-        polargrid = lambda s: Re(s)*exp(Im(s)/imagMax*pi/2*i)
+        polargrid = parallel.polarGrid(imagMax)
 
         # Now let's create all the other frames!
-        # Construct the (visible) descendents of a parent mframe
-        def constructDescendents(parent, ID):
-            nonlocal polargrid
-
-            # Get child list of framedata structures
-            children = []
+        # First work out what each one is made from: its parent,
+        # its compiled function (which evaluates the whole parent
+        # frame at once wherever it can) and its key in the
+        # keyframe cache (see morpho.cache), which is built from the
+        # key of its parent and its own formula.
+        # Plan the (visible) descendents of a parent mframe
+        children = []
+        jobs = []
+        def planDescendents(ID, parentKey):
             for frm in self.frames:
                 if frm.type != "domain" and frm.base == ID:
+                    func, options = parallel.keyframeFunction(
+                        frm.function, polargrid, version, mation.view)
+                    key = cache.childKey(parentKey, frm.function, *options)
                     children.append(frm)
+                    jobs.append(parallel.Job(frm.id, ID, frm.function,
+                        func, key))
+                    planDescendents(frm.id, key)
 
-            mframes = []
-            for child in children:
-                # Construct evaluation function
-                expr = child.function
-                expr = expr.replace("^", "**")  # Pythonize carets
-
-                func = eval("lambda s, polargrid=polargrid: complex(" + expr + ")")
-
-                # Apply the function to the parent frame
-                try:
-                    mframe = parent.fimage(func)
-                except:
-                    raise Exception("fimage error")
-
-                mframe.delay = round(child.delay*frameRate)
-                mframe.id = child.id
-                mframes.append(mframe)
-                mframes.extend(constructDescendents(mframe, child.id))
-            return mframes
+        planDescendents(0, cache.rootKey(domFrame, version, mation.view))
 
+        # Then apply the functions (in several processes at once
+        # if it's worth it).
+        try:
+            keyframes = parallel.constructKeyframes(domFrame, jobs,
+                imagMax, version, mation.view)
+        except:
+            raise Exception("fimage error")
 
         mframes = [domFrame]
-        mframes.extend(constructDescendents(domFrame, ID=0))
+        for child, mframe in zip(children, keyframes):
+            mframe.delay = round(child.delay*frameRate)
+            mframe.id = child.id
+            mframes.append(mframe)
 
         # Isolate visible frames
         visibleFrames = []
@@ -1658,9 +1692,12 @@ class GUIstate(object):
         return mation
 
     # Create and locally run the animation described by the GUIstate.
-    def run(self, autoclose=False):
+    # Playback starts the given number of seconds in.
+    def run(self, autoclose=False, start=0):
         mation = self.makeAnimation()
         if mation is None: return  # Something went wrong. Abort!
+        if start > 0:
+            mation.seek(mation.frameIndex(start))
         mation.run(autoclose=autoclose)
 
     # Create and export the animation described by the GUIstate.
@@ -1793,7 +1830,7 @@ def str2floatTuple(st):
 # WARNING: callPlayer() will NOT check the supplied exportFilename
 # to make sure it's sanitary. Do that BEFORE calling callPlayer
 # with an exportFilename argument!
-def callPlayer(exportFilename="", autoclose=False):
+def callPlayer(exportFilename="", autoclose=False, start=0):
     # exportMode should be set to True at the beginning of this file
     # if you're about to export Morpho as a standalone.
     # If you're just trying to run the script, exportMode should
@@ -1824,6 +1861,11 @@ def callPlayer(exportFilename="", autoclose=False):
     if autoclose:
         cmd.append("--autoclose")
 
+    # Append the start time (in seconds) if not playing from the top
+    if start > 0:
+        cmd.append("--start")
+        cmd.append(str(start))
+
     if platform.system() == "Windows":
         sp.call(cmd, creationflags=CREATE_NO_WINDOW)
     else:
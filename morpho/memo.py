@@ -0,0 +1,236 @@
+'''
+This module implements optional memoization of the expensive
+Morpho functions (zeta, gamma and loggamma).
+
+When enabled, every value those functions compute is remembered
+(keyed by the exact bits of the complex number it was computed
+at), so evaluating them again at the same nodes, e.g. for sibling
+frames sharing a parent frame or when replaying an animation,
+costs a lookup instead of a recomputation. Each memoized function
+keeps at most maxsize values, throwing out the least recently used
+ones first.
+
+Memoization is off by default. Turn it on with
+
+    morpho.memo.enabled = True
+
+The values depend on whether the functions go through mpmath
+(functions.useMpmath) and at what precision, so the memos forget
+everything by themselves whenever that changes (see mode()).
+'''
+
+import struct
+import functools
+import threading
+import numpy as np
+import mpmath
+from collections import OrderedDict
+
+# Memoization is opt-in
+enabled = False
+
+# Most values each memoized function remembers
+maxsize = 2**18
+
+# All memos by name
+memos = {}
+
+# Describes how the memoized functions currently compute their
+# values: in double precision, or in mpmath at some precision.
+def mode():
+    import morpho.functions as functions
+    import morpho.mpfunctions as mpfunctions
+    if functions.useMpmath:
+        return ("mpmath", mpmath.mp.prec, mpfunctions.dps)
+    return "double"
+
+# Complex numbers as 16 raw bytes so that e.g. 0.0 and -0.0 (which
+# can lie on different sides of a branch cut) get different keys,
+# and nans can be looked up too.
+def _scalarKey(z):
+    z = complex(z)
+    return struct.pack("<dd", z.real, z.imag)
+
+# Arrays of nodes are looked up all at once by a 64 bit hash of
+# their bits (see Memo). Both halves of every hit are compared
+# too, so two nodes with the same hash can never mix up values.
+def _bits(nodes):
+    return nodes.view(np.uint64).reshape(-1, 2)
+
+def _hashes(nodes):
+    bits = _bits(nodes)
+    with np.errstate(over="ignore"):
+        h = bits[:,0] * np.uint64(0x9E3779B97F4A7C15) ^ bits[:,1]
+        h ^= h >> np.uint64(31)
+        h *= np.uint64(0xBF58476D1CE4E5B9)
+        h ^= h >> np.uint64(29)
+    return h
+
+def _same(a, b):
+    a = _bits(a)
+    b = _bits(b)
+    return (a[:,0] == b[:,0]) & (a[:,1] == b[:,1])
+
+# Least recently used cache of the values of func. func can take
+# either single numbers or numpy arrays of them (or both). Called
+# on an array, only the distinct nodes the memo hasn't seen before
+# get passed on to func, all at once.
+# Single numbers are remembered in a dict. The values remembered
+# for arrays are kept in numpy arrays sorted by hash, so looking
+# up a whole array is a binary search rather than a loop over its
+# nodes. Their last use is counted in calls to the memo.
+# hits and misses count the values found and not found in the memo.
+# Memos can be shared between threads. func itself runs outside of
+# the lock, so two threads may compute the same value at once.
+class Memo(object):
+    def __init__(self, func, maxsize=None):
+        self.func = func
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.nodes = np.empty(0, dtype=complex)
+        self.values = np.empty(0, dtype=complex)
+        self.used = np.empty(0, dtype=np.int64)
+        self.calls = 0
+        self.mode = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.cache) + len(self.hashes)
+
+    def _size(self):
+        return maxsize if self.maxsize is None else self.maxsize
+
+    def _forget(self):
+        self.cache.clear()
+        self.hashes = self.hashes[:0]
+        self.nodes = self.nodes[:0]
+        self.values = self.values[:0]
+        self.used = self.used[:0]
+
+    # Forgets every value if the functions have changed how they
+    # compute them since the last call (see mode()).
+    def _checkMode(self):
+        current = mode()
+        if current != self.mode:
+            self._forget()
+            self.mode = current
+
+    def _trim(self):
+        size = self._size()
+        while len(self) > size and len(self.cache) > 0:
+            self.cache.popitem(last=False)
+        if len(self) > size:
+            keep = np.sort(np.argsort(self.used, kind="stable")
+                [len(self) - size:])
+            self.hashes = self.hashes[keep]
+            self.nodes = self.nodes[keep]
+            self.values = self.values[keep]
+            self.used = self.used[keep]
+
+    def __call__(self, s):
+        if not isinstance(s, np.ndarray):
+            key = _scalarKey(s)
+            with self.lock:
+                self._checkMode()
+                computing = self.mode
+                if key in self.cache:
+                    self.hits += 1
+                    self.cache.move_to_end(key)
+                    return self.cache[key]
+                self.misses += 1
+            value = self.func(s)
+            with self.lock:
+                if self.mode == computing:
+                    self.cache[key] = value
+                    self._trim()
+            return value
+
+        flat = np.ascontiguousarray(s, dtype="<c16").reshape(-1)
+        hashes, first, inverse = np.unique(_hashes(flat),
+            return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        nodes = flat[first]
+        values = np.empty(len(hashes), dtype=complex)
+
+        with self.lock:
+            self._checkMode()
+            computing = self.mode
+            self.calls += 1
+            found = np.zeros(len(hashes), dtype=bool)
+            if len(self.hashes) > 0:
+                index = np.minimum(np.searchsorted(self.hashes, hashes),
+                    len(self.hashes) - 1)
+                found = (self.hashes[index] == hashes) \
+                    & _same(self.nodes[index], nodes)
+                values[found] = self.values[index[found]]
+                self.used[index[found]] = self.calls
+            hits = int(np.count_nonzero(found[inverse]))
+            self.hits += hits
+            self.misses += len(flat) - hits
+
+        missing = ~found
+        if np.any(missing):
+            computed = np.asarray(self.func(nodes[missing]), dtype=complex)
+            values[missing] = computed
+            with self.lock:
+                if self.mode == computing:
+                    self._insert(hashes[missing], nodes[missing], computed)
+
+        result = values[inverse]
+        # Nodes sharing a hash with a different node get their own
+        # values (this practically never happens).
+        other = ~_same(flat, nodes[inverse])
+        if np.any(other):
+            result[other] = np.asarray(self.func(flat[other]), dtype=complex)
+        return result.reshape(s.shape)
+
+    # Adds newly computed values, keeping everything sorted by hash.
+    # Values another thread has added in the meantime (or a node
+    # whose hash is already taken) are only kept once.
+    def _insert(self, hashes, nodes, values):
+        allHashes = np.concatenate([self.hashes, hashes])
+        order = np.argsort(allHashes, kind="stable")
+        allHashes = allHashes[order]
+        keep = np.ones(len(order), dtype=bool)
+        keep[1:] = allHashes[1:] != allHashes[:-1]
+        order = order[keep]
+        self.hashes = allHashes[keep]
+        self.nodes = np.concatenate([self.nodes, nodes])[order]
+        self.values = np.concatenate([self.values, values])[order]
+        self.used = np.concatenate([self.used,
+            np.full(len(hashes), self.calls, dtype=np.int64)])[order]
+        self._trim()
+
+    def clear(self):
+        with self.lock:
+            self._forget()
+            self.hits = 0
+            self.misses = 0
+
+# Decorator memoizing a function under the given name. The memo
+# only gets used while memoization is enabled.
+def memoize(name):
+    def decorator(func):
+        memo = Memo(func)
+        memos[name] = memo
+        @functools.wraps(func)
+        def wrapper(s):
+            if enabled:
+                return memo(s)
+            return func(s)
+        wrapper.memo = memo
+        return wrapper
+    return decorator
+
+# Forgets every remembered value (and resets the counters)
+def clear():
+    for memo in memos.values():
+        memo.clear()
+
+# Returns a dict giving for each memo its hits, misses and size
+def stats():
+    return dict((name, {"hits": memo.hits, "misses": memo.misses,
+        "size": len(memo)}) for name, memo in memos.items())
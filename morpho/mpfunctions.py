@@ -0,0 +1,121 @@
+'''
+This module provides mpmath versions of the Morpho functions
+(see morpho.functions) so that a formula can be evaluated in
+extended precision. The compiler uses them for the nodes where
+double precision fails (see compiler.hybrid), e.g. gamma(s)/gamma(s-1)
+at s = 200, where both gammas overflow even though the quotient
+is just 199.
+
+Functions that only make sense for real numbers keep refusing
+complex ones, so a formula fails at the same nodes it would in
+double precision.
+'''
+
+import types
+import threading
+import mpmath
+
+import morpho.engine as eng
+import morpho.functions as functions
+
+# Decimal digits of precision to evaluate in
+dps = 30
+
+# mpmath's precision is a setting of the context doing the
+# arithmetic, so these functions get a context of their own, and
+# only one thread at a time gets to use it (see evaluate()). That
+# way raising the precision here can't change the values of
+# anything else using mpmath (e.g. functions.zeta with useMpmath).
+mp = mpmath.MPContext()
+_lock = threading.Lock()
+
+# Everything in morpho.functions, with the mpmath versions below
+# swapped in.
+namespace = {}
+for name, value in vars(functions).items():
+    if name.startswith("_") or isinstance(value, types.ModuleType):
+        continue
+    namespace[name] = value
+namespace["isbadnum"] = eng.isbadnum
+
+def _real(x):
+    if isinstance(x, (complex, mp.mpc)):
+        raise TypeError("must be real number, not complex")
+    return mp.mpf(x)
+
+# Wraps an mpmath function of real numbers
+def _realOnly(func):
+    return lambda *args: func(*[_real(x) for x in args])
+
+def _factorial(n):
+    n = _real(n)
+    if n < 0 or n != mp.floor(n):
+        raise ValueError("factorial() only accepts nonnegative integral values")
+    return mp.factorial(n)
+
+def _log(s, base=None):
+    if base is None:
+        return mp.log(s)
+    return mp.log(s) / mp.log(base)
+
+def _zeta(s):
+    if s == 1: return functions.nan
+    return mp.zeta(s)
+
+def _gamma(s):
+    try:
+        return mp.gamma(s)
+    except ValueError:
+        return functions.nan
+
+def _loggamma(s):
+    try:
+        return mp.loggamma(s)
+    except ValueError:
+        return functions.nan
+
+namespace.update({
+    "exp": mp.exp, "log": _log, "ln": _log, "log10": mp.log10,
+    "sqrt": mp.sqrt, "sin": mp.sin, "cos": mp.cos, "tan": mp.tan,
+    "asin": mp.asin, "acos": mp.acos, "atan": mp.atan,
+    "sinh": mp.sinh, "cosh": mp.cosh, "tanh": mp.tanh,
+    "asinh": mp.asinh, "acosh": mp.acosh, "atanh": mp.atanh,
+    "phase": mp.arg, "arg": mp.arg, "Arg": mp.arg, "angle": mp.arg,
+    "Angle": mp.arg, "Phase": mp.arg,
+    "isfinite": mp.isfinite, "isinf": mp.isinf, "isnan": mp.isnan,
+    "zeta": _zeta, "gamma": _gamma, "loggamma": _loggamma,
+    "factorial": _factorial, "fact": _factorial,
+    "lgamma": _realOnly(mp.loggamma), "erf": _realOnly(mp.erf),
+    "erfc": _realOnly(mp.erfc), "expm1": _realOnly(mp.expm1),
+    "log1p": _realOnly(mp.log1p), "log2": _realOnly(lambda x: mp.log(x, 2)),
+    "fabs": _realOnly(mp.fabs),
+    "hypot": _realOnly(lambda *args: mp.sqrt(mp.fsum(x**2 for x in args))),
+    "pow": _realOnly(mp.power), "atan2": _realOnly(mp.atan2),
+    "degrees": _realOnly(mp.degrees), "radians": _realOnly(mp.radians),
+    "conj": mp.conj
+    })
+
+# The constants are looked up at the current precision whenever
+# a formula is compiled (see makeLambda()). A function made at one
+# dps shouldn't be used at a higher one (compiler.Evaluator makes
+# its function again whenever dps changes).
+def _constants():
+    return {"pi": +mp.pi, "tau": 2*mp.pi, "e": +mp.e}
+
+# Compiles a (pythonized) formula into a function of a single mpc
+# giving the formula's value (as an mpmath number). extras are
+# extra names the formula can use.
+def makeLambda(pyexpr, extras=None):
+    names = dict(namespace)
+    with mp.workdps(dps):
+        names.update(_constants())
+    if extras is not None:
+        names.update(extras)
+    return eval("lambda s: " + pyexpr, names)
+
+# Evaluates a function made by makeLambda() at the complex number z
+# in mpmath at dps digits, and rounds the value back to a python
+# complex.
+def evaluate(func, z):
+    with _lock, mp.workdps(dps):
+        return complex(func(mp.mpc(z)))
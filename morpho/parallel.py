@@ -0,0 +1,425 @@
+'''
+This module spreads the construction of an animation's keyframes,
+and the prerendering of its frames, over several processes.
+
+Keyframes form a tree: every keyframe is a function applied to
+its parent (ultimately the domain frame). Siblings, and more
+generally any keyframes whose parents are done, don't depend on
+each other, so they can be computed at the same time in a pool
+of worker processes. This is the only way formulas that can't
+be vectorized (see morpho.compiler) get to use more than one core.
+
+Node arrays are handed to the workers through shared memory
+instead of being pickled: the parent's nodes go in one shared
+block (which all its children read), and each worker writes the
+values it computes straight into another one.
+
+The pool is only used when there are at least two keyframes to
+compute (i.e. not found in the keyframe cache) under formulas that
+can't be vectorized, with enough nodes between them to make up for
+the overhead. Vectorized formulas already get evaluated on every
+core by engine.evalNodes(). Set processes = 1 to always build
+keyframes in this process.
+
+Prerendering (see engine.Animation.prerender()) works the same way:
+every frame only depends on the keyframes it lies between and its
+tween time, so runs of consecutive frames are handed out to the
+workers, which send back the vertex and color data of the frames
+they prerendered in shared memory. Each pair of keyframes goes into
+shared memory once too, so a run only takes the names of those
+blocks and its tween times.
+
+Any script starting Morpho needs the usual
+    if __name__ == "__main__":
+guard around its top level code, since on some platforms every
+worker process imports the main module. A frozen executable also
+needs to call multiprocessing.freeze_support() first thing in it.
+'''
+
+import os
+import types
+import pickle
+import atexit
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, wait, as_completed, \
+    FIRST_COMPLETED
+import numpy as np
+
+import morpho.engine as eng
+import morpho.functions as functions
+import morpho.compiler as compiler
+import morpho.mpfunctions as mpfunctions
+import morpho.memo as memo
+import morpho.cache as cache
+import morpho.surrogate as surrogate
+
+# Number of worker processes (1 means don't use any)
+processes = min(32, os.cpu_count() or 1)
+
+# Fewest nodes (summed over all the keyframes left to compute
+# under formulas that can't be vectorized) worth starting up the
+# pool for
+minNodes = 2**17
+
+# Same for prerendering, summed over all the frames
+minPrerenderNodes = 2**22
+
+### SHARED MEMORY ###
+
+# Numpy array living in a block of shared memory. Create one with
+# SharedArray(shape, dtype) and pass its handle to another process,
+# which can then get at the same array with SharedArray.attach().
+# Call close() in every process when done with it. The memory is
+# freed when the owner closes it, which is the process that created
+# it unless owner says otherwise (so that a process can create an
+# array for another one to take over).
+class SharedArray(object):
+    def __init__(self, shape, dtype=complex, name=None, owner=None):
+        dtype = np.dtype(dtype)
+        shape = tuple(shape) if np.ndim(shape) > 0 else (int(shape),)
+        size = max(1, int(np.prod(shape)) * dtype.itemsize)
+        self.owner = (name is None) if owner is None else owner
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.array = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf)
+
+    # Copies the given array into a new SharedArray
+    @classmethod
+    def fromArray(cls, array, owner=True):
+        array = np.asarray(array)
+        shared = cls(array.shape, array.dtype, owner=owner)
+        shared.array[...] = array
+        return shared
+
+    # What another process needs to attach to the array
+    @property
+    def handle(self):
+        return (self.shm.name, self.array.shape, self.array.dtype.str)
+
+    @classmethod
+    def attach(cls, handle, owner=False):
+        name, shape, dtype = handle
+        return cls(shape, dtype, name=name, owner=owner)
+
+    def close(self):
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+### PROCESS POOL ###
+
+_pool = None
+_poolProcesses = 0
+
+# Process pool with the current number of processes (made again if
+# processes has changed since the last time). Workers are always
+# spawned rather than forked since forking a process that has
+# threads running (see engine.evalNodes()) isn't safe.
+def pool():
+    global _pool, _poolProcesses
+    if _pool is None or _poolProcesses != processes:
+        shutdown()
+        _pool = ProcessPoolExecutor(max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"))
+        _poolProcesses = processes
+    return _pool
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+atexit.register(shutdown)
+
+# Module settings that change the values keyframes get. These are
+# sent along with every job so that workers evaluate formulas
+# exactly the way this process would (workers start off with the
+# defaults and may be reused by later animations).
+_settings = [
+    (functions, "useMpmath"), (compiler, "conjugateSymmetry"),
+    (compiler, "hybrid"), (mpfunctions, "dps"), (memo, "enabled"),
+    (eng, "dedup"), (cache, "enabled"), (cache, "directory"),
+    (surrogate, "enabled"), (surrogate, "cells"), (surrogate, "degree"),
+    (surrogate, "depth"), (surrogate, "probes"), (surrogate, "tol")
+    ]
+
+def settings():
+    return [getattr(module, name) for module, name in _settings]
+
+def applySettings(values):
+    for (module, name), value in zip(_settings, values):
+        setattr(module, name, value)
+
+### KEYFRAMES ###
+
+# Polar grid function available to every keyframe formula. It maps
+# the square domain grid centered at the origin onto a disk.
+# Compiled once for each imagMax, since every build needs one.
+_polarGrids = {}
+
+def polarGrid(imagMax):
+    func = _polarGrids.get(imagMax)
+    if func is None:
+        func = _polarGrids[imagMax] = compiler.compileExpr(
+            "Re(s)*exp(Im(s)/imagMax*pi/2*i)", imagMax=imagMax)
+    return func
+
+# Compiles a keyframe formula the way the GUI does. Returns the
+# function to apply to the parent frame along with the options
+# that go into its cache key (see cache.childKey()).
+def keyframeFunction(formula, polargrid, morphoVersion, view):
+    func = compiler.compileExpr(formula, polargrid=polargrid)
+    options = [func.symmetric, compiler.precision()]
+    if surrogate.enabled:
+        func = surrogate.SurrogateEvaluator(func,
+            morphoVersion, formula, view)
+        options.append(surrogate.settings())
+    return func, options
+
+# Keyframe to construct: the one with the given ID, made by applying
+# the formula (compiled into func) to the keyframe with ID base.
+# key is its key in the keyframe cache (None while it's off).
+class Job(object):
+    def __init__(self, ID, base, formula, func, key):
+        self.id = ID
+        self.base = base
+        self.formula = formula
+        self.func = func
+        self.key = key
+
+# Constructs the keyframes described by the given jobs (parents
+# listed before their children, the domain frame having ID 0) and
+# returns them in the same order as the jobs. imagMax, morphoVersion
+# and view are what the workers need to compile the formulas again.
+def constructKeyframes(domFrame, jobs, imagMax, morphoVersion, view):
+    scalar = [job for job in jobs
+        if not getattr(job.func, "vectorized", False)]
+    if cache.enabled and processes > 1:
+        scalar = [job for job in scalar if not cache.contains(job.key)]
+    if processes < 2 or len(scalar) < 2 or \
+        len(scalar)*len(domFrame.pack().dynamicNodes()) < minNodes:
+        keyframes = {0: domFrame}
+        for job in jobs:
+            keyframes[job.id] = cache.fimage(keyframes[job.base], job.func, job.key)
+        return [keyframes[job.id] for job in jobs]
+
+    count = len(domFrame.pack().dynamicNodes())
+    keyframes = {0: domFrame}
+    shared = {}  # Node arrays of the keyframes in shared memory
+    children = {}
+    for job in jobs:
+        children.setdefault(job.base, []).append(job)
+    state = settings()
+    # Each worker gets an even share of the threads (see
+    # engine.evalNodes()).
+    threads = max(1, eng.workers // processes)
+    running = {}
+
+    # Shared memory copy of the nodes of a keyframe
+    def sharedNodes(ID):
+        if ID not in shared:
+            shared[ID] = SharedArray.fromArray(
+                keyframes[ID].pack().dynamicNodes())
+        return shared[ID]
+
+    # Starts on a job, or finishes it right away if its keyframe is
+    # in the cache or its formula is vectorized.
+    def start(job):
+        parent = keyframes[job.base]
+        # Vectorized formulas are no faster in a worker (evalNodes()
+        # already uses every core) and would only cost a trip through
+        # shared memory.
+        if getattr(job.func, "vectorized", False):
+            finish(job, cache.fimage(parent, job.func, job.key))
+            return
+        values = cache.load(job.key, count) if cache.enabled else None
+        if values is not None:
+            cache.hits += 1
+            finish(job, parent.withDynamicNodes(values))
+            return
+        source = sharedNodes(job.base)
+        target = SharedArray(count)
+        shared[job.id] = target
+        future = pool().submit(_evaluate, job.formula, imagMax,
+            morphoVersion, view, source.handle, target.handle,
+            state, threads)
+        running[future] = job
+
+    def finish(job, keyframe):
+        keyframes[job.id] = keyframe
+        for child in children.get(job.id, []):
+            start(child)
+
+    try:
+        for job in children.get(0, []):
+            start(job)
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                future.result()  # Reraises any error from the worker
+                values = np.array(shared[job.id].array)
+                cache.misses += 1
+                if cache.enabled:
+                    cache.save(job.key, values)
+                finish(job, keyframes[job.base].withDynamicNodes(values))
+    finally:
+        for future in running:
+            future.cancel()
+        wait(running)
+        for array in shared.values():
+            array.close()
+
+    return [keyframes[job.id] for job in jobs]
+
+# Worker side of constructKeyframes(): evaluates a formula at the
+# nodes in the shared array source and writes the values into the
+# shared array target.
+def _evaluate(formula, imagMax, morphoVersion, view, source, target,
+    state, threads):
+    applySettings(state)
+    eng.workers = threads
+    source = SharedArray.attach(source)
+    target = SharedArray.attach(target)
+    try:
+        func, options = keyframeFunction(formula, polarGrid(imagMax),
+            morphoVersion, view)
+        target.array[...] = eng.evalUniqueNodes(func, source.array)
+    finally:
+        source.close()
+        target.close()
+
+### PRERENDERING ###
+
+# Prerenders the tweens of an animation in the process pool.
+# times[keyID] lists the (t, delay) pairs of the frames of the tween
+# starting at keyframe keyID (see Animation.prerenderFrames()).
+# Returns the FastFrames of all the tweens in order, or None if the
+# animation is too small to be worth it (in which case the caller
+# should prerender it itself). progress is as for
+# Animation.prerender().
+def prerenderTweens(mation, times, progress=None):
+    total = sum(len(tweenTimes) for tweenTimes in times)
+    frame = mation.keyframes[0].pack()
+    nodes = len(frame.nodes) + len(frame.pointPos)
+    if processes < 2 or total < 2 or total*nodes < minPrerenderNodes:
+        return None
+
+    # Hand out runs of consecutive frames, a few per worker so
+    # that they all stay busy until the end.
+    size = (mation.window.width, mation.window.height)
+    run = max(1, -(-total // (4*processes)))
+    tasks = {}
+    shared = []  # Keyframe pairs in shared memory
+    frames = [None]*total
+    done = 0
+    try:
+        start = 0
+        for keyID, tweenTimes in enumerate(times):
+            if len(tweenTimes) == 0: continue
+            pair = _sharePair(mation.keyframes[keyID],
+                mation.keyframes[keyID+1])
+            shared.extend(pair)
+            handles = [array.handle for array in pair]
+            for n in range(0, len(tweenTimes), run):
+                future = pool().submit(_prerender, handles,
+                    mation.tweenMethod, mation.view, size,
+                    tweenTimes[n:n+run])
+                tasks[future] = start + n
+            start += len(tweenTimes)
+
+        for future in as_completed(tasks):
+            start = tasks.pop(future)
+            fframes = _collect(future.result())
+            frames[start:start+len(fframes)] = fframes
+            done += len(fframes)
+            if progress is not None:
+                progress(done, total+1)  # (+1 for the final frame)
+    finally:
+        # Something went wrong. Free the memory of any frames that
+        # got prerendered anyway.
+        for future in tasks:
+            future.cancel()
+        wait(tasks)
+        for future in tasks:
+            if not future.cancelled() and future.exception() is None:
+                _collect(future.result())
+        for array in shared:
+            array.close()
+    return frames
+
+# Puts the keyframes p and q in shared memory for _prerender(). Their
+# nodes and point positions go in one complex array (p's in the first
+# row, q's in the second). Everything else about them is pickled into
+# a byte array: the rest of the packed frames, and which paths and
+# points they share (see engine.FrameTween). Returns both arrays.
+def _sharePair(p, q):
+    P = p.pack()
+    Q = q.pack()
+    samePath = np.array([p.paths[n] is q.paths[n]
+        for n in range(len(p.paths))], dtype=bool)
+    samePoint = np.array([p.points[n] is q.points[n]
+        for n in range(len(p.points))], dtype=bool)
+    nodes = SharedArray.fromArray(np.stack([
+        np.concatenate((P.nodes, P.pointPos)),
+        np.concatenate((Q.nodes, Q.pointPos))]))
+    P.nodes = P.pointPos = Q.nodes = Q.pointPos = None
+    rest = SharedArray.fromArray(np.frombuffer(
+        pickle.dumps((P, Q, samePath, samePoint)), dtype=np.uint8))
+    return nodes, rest
+
+# Takes over the shared arrays sent back by _prerender() and
+# returns the FastFrames in them.
+def _collect(result):
+    handles, layouts = result
+    shared = [SharedArray.attach(handle, owner=True) for handle in handles]
+    try:
+        vertices, colors = [np.array(array.array) for array in shared]
+    finally:
+        for array in shared:
+            array.close()
+    fframes = []
+    v = c = 0
+    for vlen, clen, layout in layouts:
+        fframes.append(eng.FastFrame.unflatten(
+            vertices[v:v+vlen], colors[c:c+clen], layout))
+        v += vlen
+        c += clen
+    return fframes
+
+# Worker side of prerenderTweens(): prerenders the frames at the
+# given (t, delay) pairs of the tween between the keyframes shared
+# by _sharePair() and returns the handles of the shared arrays
+# holding all their vertex and color data, along with the layout of
+# each frame.
+def _prerender(handles, method, view, size, tweenTimes):
+    nodes, rest = [SharedArray.attach(handle) for handle in handles]
+    try:
+        P, Q, samePath, samePoint = pickle.loads(rest.array.tobytes())
+        count = len(P.deadmask)
+        P.nodes = nodes.array[0,:count].copy()
+        P.pointPos = nodes.array[0,count:].copy()
+        Q.nodes = nodes.array[1,:count].copy()
+        Q.pointPos = nodes.array[1,count:].copy()
+    finally:
+        nodes.close()
+        rest.close()
+
+    window = types.SimpleNamespace(width=size[0], height=size[1])
+    tw = eng.FrameTween.fromPacked(P, Q, samePath, samePoint, method)
+    flat = [eng.prerenderTween(tw, t, delay, view, window).flatten()
+        for t, delay in tweenTimes]
+    vertices = SharedArray.fromArray(
+        np.concatenate([vertexData for vertexData, _, _ in flat]), owner=False)
+    colors = SharedArray.fromArray(
+        np.concatenate([colorData for _, colorData, _ in flat]), owner=False)
+    handles = (vertices.handle, colors.handle)
+    vertices.close()
+    colors.close()
+    return handles, [(len(vertexData), len(colorData), layout)
+        for vertexData, colorData, layout in flat]
@@ -0,0 +1,280 @@
+'''
+This module implements fast double precision versions of the
+special functions Morpho provides (the Riemann zeta function and
+the complex gamma function) that work on whole numpy arrays of
+complex numbers.
+
+They are meant to replace evaluating the mpmath versions one
+node at a time, which is very accurate but very slow. Their
+accuracy against mpmath is checked by the tests in
+tests/test_conformance.py.
+
+Setting functions.useMpmath = True switches the Morpho functions
+back to mpmath for when the extra precision matters.
+
+Single numbers are worked on as arrays of one element. numpy's
+arithmetic on scalars can round differently from its array loops,
+and the scalar functions have to give exactly the array values.
+'''
+
+import math
+import threading
+import numpy as np
+import mpmath as mp
+
+pi = math.pi
+inf = float("inf")
+nan = float("nan")
+
+### MPMATH ###
+
+# mpmath keeps its precision in the context doing the arithmetic,
+# and its global context isn't safe to use from several threads at
+# once (engine.evalNodes() evaluates on a pool of them). So the
+# special functions get a context of their own (at mpmath's default
+# precision), which one thread at a time may use. Like mpmath's own
+# contexts it points _mp at itself (the Riemann-Siegel code for zeta
+# does its extra precision work there).
+_mp = mp.MPContext()
+_mp._mp = _mp
+_mpLock = threading.Lock()
+
+# Value of the mpmath function of the given name (e.g. "zeta") at
+# s as a complex number. Errors are passed on.
+def mpEval(name, s):
+    with _mpLock:
+        return complex(getattr(_mp, name)(s))
+
+### SINE AND COSINE OF PI*X ###
+
+# sin(pi*x) and cos(pi*x) for real arrays x. The argument is
+# reduced exactly before multiplying by pi, so the zeros at the
+# integers (and half-integers for cos) come out exactly zero.
+def _sinpi(x):
+    r = np.fmod(x, 2)  # Exact, and in (-2, 2)
+    sign = np.where(r < 0, -1.0, 1.0)
+    r = np.abs(r)
+    sign = np.where(r > 1, -sign, sign)
+    r = np.where(r > 1, r-1, r)  # Now in [0,1]
+    return sign*np.sin(pi*np.minimum(r, 1-r))
+
+def _cospi(x):
+    r = np.abs(np.fmod(x, 2))
+    r = np.where(r > 1, 2-r, r)  # Now in [0,1]
+    return np.where(r <= 0.25, np.cos(pi*r), np.sin(pi*(0.5-r)))
+
+# Principal logarithm of sin(pi*z) for complex arrays z. Far from
+# the real axis sin(pi*z) itself overflows, so its asymptotic form
+# is used.
+def _logsinpi(z):
+    x = np.fmod(z.real, 2)
+    y = z.imag
+    near = np.abs(y) < 200
+    yn = np.where(near, y, 0)
+    sinpi = _sinpi(x)*np.cosh(pi*yn) + 1j*_cospi(x)*np.sinh(pi*yn)
+    th = np.sign(y)*(pi/2 - pi*x)
+    th = th - 2*pi*np.round(th/(2*pi))  # Into [-pi, pi]
+    far = pi*np.abs(y) - math.log(2) + 1j*th
+    # Where sin(pi*z) lands exactly on the branch cut of the log,
+    # the side of it is picked to match _reflectedLoggamma(): the
+    # one z would be on if it were nudged right and upward (the real
+    # axis counts as just above itself).
+    logsin = np.log(sinpi)
+    cut = (sinpi.imag == 0) & (sinpi.real < 0)
+    side = np.where(y < 0, -pi, pi) * np.where(_cospi(x) < 0, -1, 1)
+    logsin = np.where(cut, logsin.real + 1j*side, logsin)
+    return np.where(near, logsin, far)
+
+### GAMMA ###
+
+# Lanczos approximation (g = 607/128, 15 terms) to log(gamma(z))
+# for Re(z) >= 1/2. Accurate to about 1e-15.
+_lanczosG = 607/128
+_lanczosCoeffs = [
+    0.99999999999999709182, 57.156235665862923517,
+    -59.597960355475491248, 14.136097974741747174,
+    -0.49191381609762019978, 0.33994649984811888699e-4,
+    0.46523628927048575665e-4, -0.98374475304879564677e-4,
+    0.15808870322491248884e-3, -0.21026444172410488319e-3,
+    0.21743961811521264320e-3, -0.16431810653676389022e-3,
+    0.84418223983852743293e-4, -0.26190838401581408670e-4,
+    0.36899182659531622704e-5
+    ]
+def _lanczosLoggamma(z):
+    z = z - 1
+    x = _lanczosCoeffs[0]
+    for k in range(len(_lanczosCoeffs)-1, 0, -1):
+        x = x + _lanczosCoeffs[k]/(z+k)
+    t = z + (_lanczosG + 0.5)
+    return 0.5*math.log(2*pi) + (z+0.5)*np.log(t) - t + np.log(x)
+
+# Log gamma for Re(z) < 1/2 by the reflection formula
+#   gamma(z) = pi / (sin(pi*z) gamma(1-z))
+# The principal logarithms of the factors don't add up to the
+# principal branch of loggamma, so the right multiple of 2*pi*i
+# is added back.
+def _reflectedLoggamma(z):
+    k = np.floor((z.real+0.5)/2)
+    k = np.where(z.imag < 0, -k, k)
+    return math.log(pi) - _logsinpi(z) - _lanczosLoggamma(1-z) \
+        + 2j*pi*k
+
+# n! for n = 0..170 (171! overflows). gamma() looks up positive
+# integers here so they come out exact.
+_factorials = np.array([float(math.factorial(n)) for n in range(171)])
+
+# Nonpositive integers (where gamma has its poles)
+def _gammaPoles(z):
+    return (z.imag == 0) & (z.real <= 0) & (z.real == np.floor(z.real))
+
+# Principal branch of the log gamma function (the one that's
+# continuous except across the negative real axis, like mpmath's
+# loggamma()) for numpy arrays of complex numbers.
+# Gives nan at the poles (the nonpositive integers).
+def loggamma(z):
+    z = np.asarray(z, dtype=complex)
+    shape = z.shape
+    z = z.reshape(-1)
+    with np.errstate(all="ignore"):
+        left = z.real < 0.5
+        zz = np.where(left, 0.5, z)
+        result = _lanczosLoggamma(zz)
+        if np.any(left):
+            result = np.where(left,
+                _reflectedLoggamma(np.where(left, z, 0)), result)
+        result = np.where(_gammaPoles(z) | ~np.isfinite(z), nan, result)
+    return result.reshape(shape)[()]
+
+# Complex gamma function for numpy arrays of complex numbers.
+# Re(z) < 1/2 goes through the reflection formula. Gives nan at
+# the poles (the nonpositive integers), and exact factorials at
+# the positive integers.
+def gamma(z):
+    z = np.asarray(z, dtype=complex)
+    shape = z.shape
+    z = z.reshape(-1)
+    with np.errstate(all="ignore"):
+        left = z.real < 0.5
+        logs = _lanczosLoggamma(np.where(left, 0.5, z))
+        if np.any(left):
+            zl = np.where(left, z, 0)
+            logs = np.where(left,
+                math.log(pi) - _logsinpi(zl) - _lanczosLoggamma(1-zl), logs)
+        result = np.exp(logs)
+        result = np.where(_gammaPoles(z) | ~np.isfinite(z), nan, result)
+        integer = (z.imag == 0) & (z.real >= 1) & (z.real <= 171) \
+            & (z.real == np.floor(z.real))
+        n = np.where(integer, z.real, 1).astype(int)
+        result = np.where(integer, _factorials[n-1], result)
+    return result.reshape(shape)[()]
+
+### RIEMANN ZETA ###
+
+# Euler-Maclaurin summation uses this many correction terms.
+# _zetaCoeffs[k] = B_(2k+2) / (2k+2)! (Bernoulli numbers)
+_zetaTerms = 13
+_zetaCoeffs = [float(mp.bernoulli(2*k+2)/mp.factorial(2*k+2))
+    for k in range(_zetaTerms)]
+
+# Past this real part, zeta(s) = 1 + 2^-s + 3^-s to machine precision
+_zetaSimple = 64
+
+# Past this imaginary part zeta(s) takes too many terms to compute
+# and is left to mpmath (see _mpZeta()).
+_zetaMaxImag = 1e5
+
+# Zeta function for Re(s) >= 1/2 by Euler-Maclaurin summation:
+#   zeta(s) = sum(n^-s, n=1..N-1) + N^(1-s)/(s-1) + N^-s/2
+#             + sum(B_2k/(2k)! s(s+1)...(s+2k-2) N^(1-s-2k), k=1..M)
+# N is picked for each node large enough (compared to |s|) that
+# the correction terms shrink by at least a factor of 16 each.
+# Optionally s-1 can be given separately in case it's known more
+# precisely than s itself (as with the reflection formula).
+def _zetaEM(s, sm1=None):
+    if sm1 is None: sm1 = s - 1
+    M = _zetaTerms
+    N = np.ceil(2*(np.abs(s) + 2*M)/pi).astype(int)
+
+    # Partial sums. Sorting the nodes by N in decreasing order
+    # means the nodes still summing at step n are always a prefix
+    # of the array.
+    order = np.argsort(-N, kind="stable")
+    ss = s[order]
+    NN = N[order]
+    total = np.zeros(len(ss), dtype=complex)
+    for n in range(1, NN[0] if len(NN) > 0 else 1):
+        count = np.searchsorted(-NN, -n)  # Number of nodes with N > n
+        total[:count] += np.exp(-ss[:count]*math.log(n))
+    partial = np.empty_like(total)
+    partial[order] = total
+
+    # Tail of the sum and the Euler-Maclaurin corrections
+    logN = np.log(N)
+    powN = np.exp(-s*logN)  # N^-s
+    tail = N*powN/sm1 + powN/2
+    term = s*powN/N  # s N^(-s-1)
+    N2 = N*N
+    corr = np.zeros_like(s)
+    for k in range(M):
+        corr += _zetaCoeffs[k]*term
+        term = term*(s+2*k+1)*(s+2*k+2)/N2
+    return partial + tail + corr
+
+# Zeta function for Re(s) >= 1/2 (and 1-s for the reflection
+# formula).
+def _zetaRight(s, sm1=None):
+    if sm1 is None: sm1 = s - 1
+    result = np.empty_like(s)
+    simple = s.real >= _zetaSimple
+    ss = s[simple]
+    result[simple] = 1 + np.exp(-ss*math.log(2)) + np.exp(-ss*math.log(3))
+    result[~simple] = _zetaEM(s[~simple], sm1[~simple])
+    return result
+
+# Zeta function computed one node at a time by mpmath, for the
+# nodes the double precision version can't handle. Nodes where
+# mpmath raises an error give nan.
+def _mpZeta(nodes):
+    values = np.empty(len(nodes), dtype=complex)
+    for n, s in enumerate(nodes.tolist()):
+        try:
+            values[n] = mpEval("zeta", s)
+        except (ValueError, ArithmeticError):
+            values[n] = nan
+    return values
+
+# Riemann zeta function for numpy arrays of complex numbers.
+# Re(s) < 1/2 goes through the reflection formula
+#   zeta(s) = 2^s pi^(s-1) sin(pi*s/2) gamma(1-s) zeta(1-s)
+# (computed as a logarithm so the factors can't overflow on their
+# own). zeta(1) gives nan. Infs and nans, points too far up or
+# down the plane (|Im(s)| > 1e5) and points where the double
+# precision value overflows (e.g. far out on the negative real
+# axis) are handed to mpmath. Real s gives real values.
+def zeta(s):
+    s = np.asarray(s, dtype=complex)
+    shape = s.shape
+    s = s.reshape(-1)
+    original = s
+    pole = s == 1
+    far = ~np.isfinite(s) | (np.abs(s.imag) > _zetaMaxImag)
+    s = np.where(pole | far, 2, s)
+    with np.errstate(all="ignore"):
+        result = np.empty_like(s)
+        left = s.real < 0.5
+        right = ~left
+        result[right] = _zetaRight(s[right])
+
+        sl = s[left]
+        logfactor = sl*math.log(2) + (sl-1)*math.log(pi) \
+            + _lanczosLoggamma(1-sl) + _logsinpi(sl/2)
+        result[left] = np.exp(logfactor)*_zetaRight(1-sl, -sl)
+
+        result[s == 0] = -0.5
+        result.imag[s.imag == 0] = 0
+
+    redo = far | ~(np.isfinite(result) | pole)
+    if np.any(redo):
+        result[redo] = _mpZeta(original[redo])
+    result[pole] = nan
+    return result.reshape(shape)
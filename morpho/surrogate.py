@@ -0,0 +1,371 @@
+'''
+This module implements surrogate evaluation of expensive formulas
+(e.g. nested zetas or long partial sums).
+
+Instead of evaluating the formula at every node of a frame, the
+rectangle around the nodes is cut into cells, and in each cell the
+formula is approximated by a 2D Chebyshev polynomial interpolating
+it on a small grid of sample points. The nodes are then evaluated
+on the polynomials, which costs the same however expensive the
+formula is. Each cell is checked against the formula itself at a
+few random probe points, and by the size of the highest order
+terms of its polynomial (which bound the error along the edges of
+the cell, where random probes rarely land). Cells where the error
+is bigger than tol (or that contain a pole or other non-finite
+values) are split
+into four smaller cells, up to depth times. Cells that still fail
+are thrown out: the nodes falling in them are evaluated directly.
+
+Since the number of samples doesn't depend on the number of nodes,
+raising the resolution of the domain grid barely changes the cost.
+Fitted surrogates are also kept in memory and stored in the
+keyframe cache (see morpho.cache), so they get reused across plays
+and resolutions.
+
+Surrogates are off by default. Turn them on with
+
+    morpho.surrogate.enabled = True
+'''
+
+import math
+import numpy as np
+
+import morpho.engine as eng
+import morpho.cache as cache
+import morpho.compiler as compiler
+import morpho.functions as functions
+
+pi = math.pi
+inf = float("inf")
+nan = float("nan")
+
+# Surrogate evaluation is opt-in
+enabled = False
+
+# Cells per side of the rectangle to start with, degree of the
+# polynomial in each cell (in both x and y), most times a cell can
+# be split in four, probe points per cell, and largest allowed
+# error (relative to max(1, |value|)) at the probes.
+cells = 4
+degree = 16
+depth = 3
+probes = 8
+tol = 1e-10
+
+# The current settings (as a list, e.g. for cache keys)
+def settings():
+    return [cells, degree, depth, probes, tol]
+
+# Number of fitted surrogates kept in memory
+maxSurrogates = 32
+
+# Counts of surrogates fitted and reused, and of nodes evaluated
+# on a surrogate and directly.
+stats = {"fitted": 0, "reused": 0, "surrogateNodes": 0, "directNodes": 0}
+
+# Chebyshev-Lobatto points cos(pi*k/d) on [-1,1]
+def _chebPoints(d):
+    return np.cos(pi*np.arange(d+1)/d)
+
+# Matrix taking values at the Chebyshev-Lobatto points to the
+# coefficients of the interpolating Chebyshev series.
+def _chebMatrix(d):
+    k = np.arange(d+1)
+    M = np.cos(pi*np.outer(k, k)/d) * (2/d)
+    M[:,0] /= 2
+    M[:,-1] /= 2
+    M[0] /= 2
+    M[-1] /= 2
+    return M
+
+# Chebyshev polynomials T_0 ... T_d at the points u as the columns
+# of an array.
+def _chebBasis(u, d):
+    T = np.empty((len(u), d+1))
+    T[:,0] = 1
+    if d > 0: T[:,1] = u
+    for k in range(2, d+1):
+        T[:,k] = 2*u*T[:,k-1] - T[:,k-2]
+    return T
+
+# Piecewise polynomial approximation over the rectangle
+# rect = [x1, x2, y1, y2], refined where needed.
+# levels[k] holds the cells of refinement level k, which cuts the
+# rectangle into m x m cells, m = cells*2^k. levels[k][a,b] holds
+# the Chebyshev series coefficients of cell (a,b) (row a counting
+# up from y1, column b counting right from x1). What kind of cell
+# it is shows in its first coefficient:
+#   finite -- the polynomial passed its check and gets used
+#   inf    -- the cell was split into four cells on the next level
+#   nan    -- the cell failed its check (or had no nodes in it) and
+#             its nodes must be evaluated directly
+# Use fitSurrogate() to make one.
+class Surrogate(object):
+    def __init__(self, rect, cells, degree, levels=None):
+        self.rect = list(rect)
+        self.cells = cells
+        self.degree = degree
+        self.levels = [] if levels is None else levels
+
+    # All the levels packed into a single flat array (e.g. for
+    # caching): for each level, the first coefficient of every cell
+    # (which says what kind of cell it is) followed by all the
+    # coefficients of the cells that passed their check.
+    def flatten(self):
+        parts = []
+        for C in self.levels:
+            first = C[:,:,0,0]
+            parts.append(first.reshape(-1))
+            parts.append(C[np.isfinite(first)].reshape(-1))
+        return np.concatenate(parts)
+
+    # Rebuilds the levels from an array made by flatten(). Raises
+    # ValueError if it doesn't fit the surrogate's settings.
+    def unflatten(self, coeffs, depth):
+        d = self.degree
+        self.levels = []
+        start = 0
+        for k in range(depth+1):
+            m = self.cells*2**k
+            first = coeffs[start:start+m*m].reshape(m, m)
+            start += m*m
+            good = np.isfinite(first)
+            count = np.count_nonzero(good)*(d+1)**2
+            if start + count > len(coeffs):
+                raise ValueError("truncated surrogate")
+            C = np.empty((m, m, d+1, d+1), dtype=complex)
+            C[...] = first[:,:,None,None]
+            C[good] = coeffs[start:start+count].reshape(-1, d+1, d+1)
+            start += count
+            self.levels.append(C)
+        if start != len(coeffs):
+            raise ValueError("bad surrogate size")
+
+    # Cell (a,b) of the given nodes on level k, and the coordinates
+    # of the nodes within their cells (in [-1,1]).
+    def locate(self, nodes, k):
+        x1, x2, y1, y2 = self.rect
+        m = self.cells*2**k
+        with np.errstate(all="ignore"):
+            X = (nodes.real-x1)/(x2-x1)*m
+            Y = (nodes.imag-y1)/(y2-y1)*m
+            b = np.clip(np.floor(X), 0, m-1)
+            a = np.clip(np.floor(Y), 0, m-1)
+        u = np.clip(2*(X-b)-1, -1, 1)
+        v = np.clip(2*(Y-a)-1, -1, 1)
+        return a.astype(int), b.astype(int), u, v
+
+    # Lower left corners and size of the cells (a,b) on level k
+    def corners(self, a, b, k):
+        x1, x2, y1, y2 = self.rect
+        m = self.cells*2**k
+        w = (x2-x1)/m
+        h = (y2-y1)/m
+        return x1 + b*w, y1 + a*h, w, h
+
+    # Fits polynomials to func in the cells (a,b) of level k and
+    # checks them at random probe points. Returns their coefficients
+    # and a boolean array marking the ones that passed.
+    # The error between the samples is largest near the edges of a
+    # cell close to a singularity, where probes rarely land. The
+    # last row and column of coefficients are about that big (the
+    # coefficients of a smooth function shrink geometrically), so
+    # cells where they add up to more than tol fail too.
+    def fitCells(self, func, a, b, k, probes, tol):
+        d = self.degree
+        x, y, w, h = self.corners(a, b, k)
+        pts = (_chebPoints(d)+1)/2
+        X = x[:,None] + w*pts[None,:]
+        Y = y[:,None] + h*pts[None,:]
+        # Z[c,k,l] = sample k (in y), l (in x) of cell c
+        Z = X[:,None,:] + 1j*Y[:,:,None]
+        F = eng.evalUniqueNodes(func, Z.reshape(-1)).reshape(Z.shape)
+        M = _chebMatrix(d)
+        with np.errstate(all="ignore"):
+            coeffs = np.einsum("ik,ckl,jl->cij", M, F, M)
+        good = np.all(np.isfinite(F), axis=(1,2))
+        with np.errstate(all="ignore"):
+            scale = np.maximum(1, np.max(np.abs(F), axis=(1,2)))
+            tail = np.sum(np.abs(coeffs[:,-1,:]), axis=1) \
+                + np.sum(np.abs(coeffs[:,:,-1]), axis=1)
+        good &= tail <= tol*scale
+
+        if probes > 0:
+            rng = np.random.default_rng(k)
+            cell = np.repeat(np.arange(len(a)), probes)
+            u = rng.uniform(-1, 1, len(cell))
+            v = rng.uniform(-1, 1, len(cell))
+            P = x[cell] + w*(u+1)/2 + 1j*(y[cell] + h*(v+1)/2)
+            exact = eng.evalNodes(func, P)
+            with np.errstate(all="ignore"):
+                approx = np.einsum("mi,mij,mj->m",
+                    _chebBasis(v, d), coeffs[cell], _chebBasis(u, d))
+                err = np.abs(approx-exact) / np.maximum(1, np.abs(exact))
+            fail = ~(err <= tol)  # Also catches nans
+            good[cell[fail]] = False
+        return coeffs, good
+
+    # Evaluates the surrogate at the given complex nodes. Nodes
+    # outside the rectangle, or in cells that failed their check,
+    # come out nan.
+    def evaluate(self, nodes):
+        nodes = np.asarray(nodes, dtype=complex)
+        d = self.degree
+        x1, x2, y1, y2 = self.rect
+        values = np.full(len(nodes), nan, dtype=complex)
+        x = nodes.real
+        y = nodes.imag
+        # Nodes with a -0.0 coordinate may lie on the far side of a
+        # branch cut from the cell they fall in, so they're left
+        # to be evaluated directly.
+        negzero = ((x == 0) & np.signbit(x)) | ((y == 0) & np.signbit(y))
+        with np.errstate(invalid="ignore"):
+            left = np.flatnonzero((x >= x1) & (x <= x2) & (y >= y1) & (y <= y2)
+                & ~negzero)
+        for k, C in enumerate(self.levels):
+            if len(left) == 0: break
+            a, b, u, v = self.locate(nodes[left], k)
+            first = C[a, b, 0, 0]
+            leaf = np.isfinite(first)
+            # Evaluate in chunks to keep the gathered coefficients small
+            index = np.flatnonzero(leaf)
+            for start in range(0, len(index), 4096):
+                sub = index[start:start+4096]
+                values[left[sub]] = np.einsum("mi,mij,mj->m",
+                    _chebBasis(v[sub], d), C[a[sub], b[sub]],
+                    _chebBasis(u[sub], d))
+            left = left[np.isinf(first.real)]
+        return values
+
+    # Fraction of the area of the rectangle covered by cells that
+    # passed their check
+    @property
+    def coverage(self):
+        area = 0.0
+        for k, C in enumerate(self.levels):
+            area += np.count_nonzero(np.isfinite(C[:,:,0,0])) / (self.cells*2**k)**2
+        return area
+
+# Fits a surrogate of func over the rectangle around the given
+# nodes. Cells failing their check are split into four, up to
+# depth times. Only cells holding more nodes than it takes to fit
+# them (samples and probes) get fitted at all, so fitting never
+# costs much more than evaluating the nodes directly would.
+def fitSurrogate(func, nodes, rect, cells, degree, depth, probes, tol):
+    sur = Surrogate(rect, cells, degree)
+    d = degree
+    left = nodes
+    for k in range(depth+1):
+        m = cells*2**k
+        C = np.full((m, m, d+1, d+1), nan, dtype=complex)
+        a, b, u, v = sur.locate(left, k)
+        occupied, counts = np.unique(a*m + b, return_counts=True)
+        occupied = occupied[counts > (d+1)**2 + probes]
+        a = occupied // m
+        b = occupied % m
+        coeffs, good = sur.fitCells(func, a, b, k, probes, tol)
+        C[a[good], b[good]] = coeffs[good]
+        if k < depth:
+            C[a[~good], b[~good]] = inf
+        sur.levels.append(C)
+
+        # Nodes in the cells that got split
+        aa, bb, u, v = sur.locate(left, k)
+        left = left[np.isinf(C[aa, bb, 0, 0].real)]
+        if len(left) == 0: break
+    # Levels nobody needed are left empty
+    for k in range(len(sur.levels), depth+1):
+        m = cells*2**k
+        sur.levels.append(np.full((m, m, d+1, d+1), nan, dtype=complex))
+    return sur
+
+# Surrogates fitted so far by cache key, oldest first
+_surrogates = {}
+
+# Rectangle around the finite nodes (never degenerate)
+def _boundingRect(nodes):
+    rect = []
+    for part in (nodes.real, nodes.imag):
+        lo = float(part.min())
+        hi = float(part.max())
+        if hi - lo <= 1e-12*max(1, abs(lo), abs(hi)):
+            lo -= 0.5
+            hi += 0.5
+        rect.extend([lo, hi])
+    return rect
+
+# Wraps an Evaluator (see morpho.compiler) so that evaluating whole
+# frames goes through a surrogate. keyParts is everything besides
+# the rectangle and the surrogate settings that the values of the
+# formula depend on (e.g. the formula itself and the view, which
+# the polar grid depends on), used to look up surrogates fitted
+# before.
+# Calling it on a single number just calls the Evaluator.
+class SurrogateEvaluator(object):
+    def __init__(self, func, *keyParts):
+        self.func = func
+        self.keyParts = keyParts
+
+    def __call__(self, s):
+        return self.func(s)
+
+    @property
+    def symmetric(self):
+        return getattr(self.func, "symmetric", False)
+
+    # Returns the surrogate for the given nodes: one fitted before
+    # if there is one, a new one if it's worth it, or None if
+    # there are too few nodes to bother.
+    def surrogate(self, nodes):
+        rect = _boundingRect(nodes)
+        key = cache.key("surrogate", cache.version, cache.sourceVersion(),
+            functions.useMpmath, compiler.precision(), *self.keyParts,
+            rect, *settings())
+        sur = _surrogates.get(key)
+        if sur is None and cache.enabled:
+            coeffs = cache.load(key)
+            if coeffs is not None:
+                sur = Surrogate(rect, cells, degree)
+                try:
+                    sur.unflatten(coeffs, depth)
+                except ValueError:
+                    sur = None
+        if sur is not None:
+            stats["reused"] += 1
+        else:
+            # Not worth it unless a good share of the cells can
+            # be fitted.
+            if len(nodes) < cells**2 * ((degree+1)**2 + probes):
+                return None
+            sur = fitSurrogate(self.func, nodes, rect, cells, degree, depth,
+                probes, tol)
+            stats["fitted"] += 1
+            if cache.enabled:
+                cache.save(key, sur.flatten())
+
+        _surrogates[key] = sur
+        while len(_surrogates) > maxSurrogates:
+            del _surrogates[next(iter(_surrogates))]
+        return sur
+
+    # Same as the Evaluator's evalArray() except the nodes are
+    # evaluated on a surrogate wherever it passed its check.
+    def evalArray(self, nodes):
+        nodes = np.asarray(nodes, dtype=complex)
+        finite = np.isfinite(nodes)
+        sur = self.surrogate(nodes[finite]) if np.any(finite) else None
+        if sur is None:
+            stats["directNodes"] += len(nodes)
+            return eng.evalNodes(self.func, nodes)
+
+        values = sur.evaluate(nodes)
+        redo = ~np.isfinite(values)
+        if np.any(redo):
+            values[redo] = eng.evalNodes(self.func, nodes[redo])
+        count = int(np.count_nonzero(redo))
+        stats["directNodes"] += count
+        stats["surrogateNodes"] += len(nodes) - count
+        return values
+
+    def __repr__(self):
+        return "SurrogateEvaluator(" + repr(self.func) + ")"
@@ -0,0 +1,540 @@
+'''
+This module is the array counterpart of morpho.functions.
+
+Every function here has the same name as a function in
+morpho.functions, but acts on whole numpy arrays of complex
+numbers at once instead of on single complex numbers.
+The functions give exactly the same values as their scalar twins,
+down to the last bit, which means following cmath (not numpy)
+conventions: e.g. sqrt() and log() always return complex numbers.
+numpy's own exp(), log(), hypot(), ... are vectorized
+approximations that round differently from the C library the math
+and cmath modules use, so anything transcendental applies the very
+function python uses to every element instead (see _elementwise()).
+Only arithmetic, which rounds the same everywhere, is left to numpy.
+
+Where the scalar version would raise an error, the array
+version gives a non-finite value (inf or nan) at that node
+instead so that the evaluator can catch it and sort it out
+(see morpho.compiler).
+'''
+
+import math
+import cmath
+import operator
+import numpy as np
+import morpho.functions as functions
+import morpho.memo as memo
+import morpho.special as special
+
+### CONSTANTS ###
+
+pi = np.pi
+e = np.e
+tau = 2*pi
+inf = float("inf")
+nan = float("nan")
+i = j = 1j
+
+# Converts x into a complex array (cmath functions treat every
+# input as complex)
+def _c(x):
+    return np.asarray(x, dtype=complex)
+
+# Makes an array version of a scalar function of nargs arguments by
+# applying it to every element (in a C loop, not a python one).
+# Errors give nan just like anywhere else. The values come out as
+# the given dtype, or if that's None, complex if any argument is
+# complex and float otherwise (like e.g. sgn() does).
+def _elementwise(func, dtype=float, nargs=1):
+    def safe(*args):
+        try:
+            return func(*args)
+        except (ArithmeticError, ValueError, TypeError):
+            return nan
+    fast = np.frompyfunc(func, nargs, 1)
+    ufunc = np.frompyfunc(safe, nargs, 1)
+    def vfunc(*args):
+        # Most of the time nothing goes wrong, so the error handling
+        # is only paid for when something does.
+        try:
+            values = fast(*args)
+        except (ArithmeticError, ValueError, TypeError):
+            values = ufunc(*args)
+        kind = dtype
+        if kind is None:
+            kind = complex if any(np.iscomplexobj(x) for x in args) else float
+        return np.asarray(values).astype(kind)
+    return vfunc
+
+# Python's complex multiplication and division (see c_prod() and
+# _Py_c_quot() in CPython's complexobject.c) for arrays or numbers.
+# numpy's own versions can round differently in the last bit.
+def _cmul(a, b):
+    a = np.asarray(a, dtype=complex)
+    b = np.asarray(b, dtype=complex)
+    result = np.empty(np.broadcast(a, b).shape, dtype=complex)
+    result.real = a.real*b.real - a.imag*b.imag
+    result.imag = a.real*b.imag + a.imag*b.real
+    return result
+
+def _cquot(a, b):
+    a, b = np.broadcast_arrays(np.asarray(a, dtype=complex),
+        np.asarray(b, dtype=complex))
+    ar, ai, br, bi = a.real, a.imag, b.real, b.imag
+    # Python divides through by the bigger of br and bi. Picking
+    # the operands first means only doing the arithmetic once.
+    first = np.abs(br) >= np.abs(bi)
+    x = np.where(first, br, bi)
+    y = np.where(first, bi, br)
+    p = np.where(first, ar, ai)
+    q = np.where(first, ai, ar)
+    ratio = y / x
+    denom = x + y*ratio
+    t = p*ratio
+    result = np.empty(a.shape, dtype=complex)
+    result.real = (p + q*ratio) / denom
+    result.imag = np.where(first, q - t, t - q) / denom
+    # Dividing by zero gives 0 (and an error) and nans in the
+    # divisor give nan.
+    return result
+
+# a*b and a/b for numbers or arrays, rounded like python does
+def _times(a, b):
+    if np.iscomplexobj(a) or np.iscomplexobj(b):
+        return _cmul(a, b)
+    return np.multiply(a, b)
+
+def _over(a, b):
+    if np.iscomplexobj(a) or np.iscomplexobj(b):
+        return _cquot(a, b)
+    return np.true_divide(a, b)
+
+### BASIC COMPLEX FUNCTIONS ###
+
+def real(s):
+    return np.asarray(s).real
+Re = re = real
+
+def imag(s):
+    return np.asarray(s).imag
+Im = im = imag
+
+def conj(s):
+    return np.conj(s)
+
+# Python's abs(). np.abs() of a complex number can differ from it
+# in the last bit.
+_cabs = _elementwise(abs)
+def _abs(x):
+    x = np.asarray(x)
+    if np.iscomplexobj(x):
+        return _cabs(x)
+    return np.abs(x)
+
+phase = _elementwise(cmath.phase)
+arg = Arg = angle = Angle = Phase = phase
+
+# a % b. Complex numbers can't be modded.
+def mod(a, b):
+    if np.iscomplexobj(a) or np.iscomplexobj(b):
+        return np.full(np.broadcast(a, b).shape, nan)
+    return np.remainder(a, b)
+
+### CMATH FUNCTIONS ###
+
+exp = _elementwise(cmath.exp, complex)
+sqrt = _elementwise(cmath.sqrt, complex)
+log10 = _elementwise(cmath.log10, complex)
+sin = _elementwise(cmath.sin, complex)
+cos = _elementwise(cmath.cos, complex)
+tan = _elementwise(cmath.tan, complex)
+asin = _elementwise(cmath.asin, complex)
+acos = _elementwise(cmath.acos, complex)
+atan = _elementwise(cmath.atan, complex)
+sinh = _elementwise(cmath.sinh, complex)
+cosh = _elementwise(cmath.cosh, complex)
+tanh = _elementwise(cmath.tanh, complex)
+asinh = _elementwise(cmath.asinh, complex)
+acosh = _elementwise(cmath.acosh, complex)
+atanh = _elementwise(cmath.atanh, complex)
+
+# cmath.log() with a base divides the two logarithms itself
+_log = _elementwise(cmath.log, complex)
+_logBase = _elementwise(cmath.log, complex, 2)
+def log(s, base=None):
+    if base is None:
+        return _log(s)
+    return _logBase(s, base)
+ln = log
+
+def isfinite(s):
+    return np.isfinite(s)
+
+def isinf(s):
+    return np.isinf(s)
+
+def isnan(s):
+    return np.isnan(s)
+
+# Detect infinite or nan (real or complex)
+def isbadnum(x):
+    return np.isnan(_abs(x)*0)
+
+### MATH FUNCTIONS ###
+
+# The functions from the math module only work on real numbers.
+# Given complex numbers (even ones with zero imaginary part) they
+# raise an error, so their array versions give nan everywhere.
+def _isreal(*args):
+    for x in args:
+        if np.iscomplexobj(x): return False
+    return True
+
+def _nans(*args):
+    return np.full(np.broadcast(*args).shape, nan)
+
+def _real(x):
+    return np.asarray(x, dtype=float)
+
+_atan2 = _elementwise(math.atan2, float, 2)
+def atan2(y, x):
+    if not _isreal(y, x): return _nans(y, x)
+    return _atan2(_real(y), _real(x))
+
+# ceil(), floor() and trunc() give integers (which matters to
+# e.g. factorial()). Infs, nans and integers too big for numpy
+# can't be turned into int64s and come out 0. The compiler leaves
+# those nodes to the scalar lambda (see compiler._apply()).
+_intLimit = 2.0**63
+def _integers(x):
+    return np.where(np.abs(x) < _intLimit, x, 0).astype(np.int64)
+
+def ceil(x):
+    if not _isreal(x): return _nans(x)
+    return _integers(np.ceil(_real(x)))
+
+def floor(x):
+    if not _isreal(x): return _nans(x)
+    return _integers(np.floor(_real(x)))
+
+def trunc(x):
+    if not _isreal(x): return _nans(x)
+    return _integers(np.trunc(_real(x)))
+
+# Same formulas as the math module so the rounding agrees
+def degrees(x):
+    if not _isreal(x): return _nans(x)
+    return _real(x) * (180/pi)
+
+def radians(x):
+    if not _isreal(x): return _nans(x)
+    return _real(x) * (pi/180)
+
+_expm1 = _elementwise(math.expm1)
+def expm1(x):
+    if not _isreal(x): return _nans(x)
+    return _expm1(_real(x))
+
+_log1p = _elementwise(math.log1p)
+def log1p(x):
+    if not _isreal(x): return _nans(x)
+    return _log1p(_real(x))
+
+_log2 = _elementwise(math.log2)
+def log2(x):
+    if not _isreal(x): return _nans(x)
+    return _log2(_real(x))
+
+def fabs(x):
+    if not _isreal(x): return _nans(x)
+    return np.abs(_real(x))
+
+def fmod(x, y):
+    if not _isreal(x, y): return _nans(x, y)
+    return np.fmod(_real(x), _real(y))
+
+def hypot(*args):
+    if not _isreal(*args): return _nans(*args)
+    return _elementwise(math.hypot, float, len(args))(*args)
+
+# The exponent has to be an actual integer (not a float).
+def ldexp(x, n):
+    if not _isreal(x, n) or np.asarray(n).dtype.kind not in "biu":
+        return _nans(x, n)
+    return np.ldexp(_real(x), n)
+
+# math.pow() (not **): negative numbers to non-integer powers
+# are an error rather than complex.
+_pow = _elementwise(math.pow, float, 2)
+def pow(x, y):
+    if not _isreal(x, y): return _nans(x, y)
+    return _pow(_real(x), _real(y))
+
+erf = _elementwise(math.erf)
+erfc = _elementwise(math.erfc)
+lgamma = _elementwise(math.lgamma)
+
+# Factorials of non-negative integers only (not even floats like
+# 3.0 are allowed). Anything past 170! overflows once it gets
+# converted to a complex number.
+_factorials = special._factorials
+def factorial(n):
+    n = np.asarray(n)
+    if n.dtype.kind not in "biu": return _nans(n)
+    small = (n >= 0) & (n <= 170)
+    table = _factorials[np.where(small, n, 0)]
+    return np.where(small, table, np.where(n >= 0, inf, nan))
+fact = factorial
+
+### SPECIAL FUNCTIONS ###
+
+# Riemann zeta function (see morpho.special). If the user asked
+# for mpmath, it goes through mpmath one element at a time just
+# like the scalar version. Both versions are memoized separately
+# (see morpho.memo).
+_mpZeta = _elementwise(functions.zeta.__wrapped__, complex)
+@memo.memoize("array zeta")
+def zeta(s):
+    if functions.useMpmath:
+        return _mpZeta(s)
+    return special.zeta(s)
+
+# Complex gamma and log gamma functions (see morpho.special)
+_mpGamma = _elementwise(functions.gamma.__wrapped__, complex)
+@memo.memoize("array gamma")
+def gamma(s):
+    if functions.useMpmath:
+        return _mpGamma(s)
+    return special.gamma(s)
+
+_mpLoggamma = _elementwise(functions.loggamma.__wrapped__, complex)
+@memo.memoize("array loggamma")
+def loggamma(s):
+    if functions.useMpmath:
+        return _mpLoggamma(s)
+    return special.loggamma(s)
+
+### MATRICES ###
+
+# Array version of functions._Mat. Each of the four entries can be
+# a number or an array (for mats depending on s), so one _Mat can
+# stand for a different 2x2 matrix at every node.
+# Multiplying a _Mat by a complex array applies the linear map to
+# every node at once. Everything else a _Mat supports mirrors what
+# the np.matrix based original does: * and ** are matrix products
+# and powers, while +, - and / work entry by entry.
+# Anything unsupported raises TypeError, which sends the formula
+# back to the scalar evaluator.
+# The scalar mats (functions._Mat) do their arithmetic through this
+# class too, with numbers for entries. So that it comes out the
+# same either way, complex products and quotients are always
+# rounded like python's (see _times() and _over()).
+class _Mat(object):
+    # Keep numpy from treating a _Mat as an array of objects
+    __array_ufunc__ = None
+
+    def __init__(self, x1, x2, y1, y2):
+        self.entries = (x1, x2, y1, y2)
+
+    def __array__(self, *args, **kwargs):
+        raise TypeError("A mat can't be used as a number")
+
+    # Entrywise operations with another mat or a number
+    def _entrywise(self, other, op):
+        if isinstance(other, _Mat):
+            return _Mat(*[op(x, y) for x, y in zip(self.entries, other.entries)])
+        return _Mat(*[op(x, other) for x in self.entries])
+
+    def __mul__(self, other):
+        a, b, c, d = self.entries
+        if isinstance(other, _Mat):
+            e, f, g, h = other.entries
+            return _Mat(_times(a, e) + _times(b, g), _times(a, f) + _times(b, h),
+                _times(c, e) + _times(d, g), _times(c, f) + _times(d, h))
+
+        # Treat other as a column vector. The components are turned
+        # into floats (dropping any imaginary part of complex
+        # entries) and recombined as x + y*1j the way the original
+        # np.matrix version did, right down to the signs of zeros.
+        x = np.real(other)
+        y = np.imag(other)
+        u = np.real(_times(a, x) + _times(b, y))
+        v = np.real(_times(c, x) + _times(d, y))
+        result = np.empty(np.broadcast(u, v).shape, dtype=complex)
+        result.real = u + (v*0.0 - 0.0)
+        result.imag = v + 0.0
+        return result
+
+    def __rmul__(self, other):
+        return self._entrywise(other, lambda x, y: _times(y, x))
+
+    def __add__(self, other):
+        return self._entrywise(other, lambda x, y: x+y)
+
+    def __radd__(self, other):
+        return self._entrywise(other, lambda x, y: y+x)
+
+    def __sub__(self, other):
+        return self._entrywise(other, lambda x, y: x-y)
+
+    def __rsub__(self, other):
+        return self._entrywise(other, lambda x, y: y-x)
+
+    def __truediv__(self, other):
+        return self._entrywise(other, lambda x, y: _over(x, y))
+
+    def __rtruediv__(self, other):
+        return self._entrywise(other, lambda x, y: _over(y, x))
+
+    def __neg__(self):
+        return _Mat(*[-x for x in self.entries])
+
+    def __pos__(self):
+        return self
+
+    # Integer matrix powers computed the same way as numpy's
+    # matrix_power() (repeated squaring)
+    def __pow__(self, n):
+        if not isinstance(n, (int, np.integer)):
+            raise TypeError("Mats can only be raised to integer powers")
+        n = int(n)
+        if n == 0:
+            one = np.ones(np.broadcast(*self.entries).shape)
+            return _Mat(one, 0*one, 0*one, one)
+        M = self.inv if n < 0 else self
+        n = abs(n)
+        if n <= 3:
+            result = M
+            for k in range(n-1):
+                result = result*M
+            return result
+        z = result = None
+        while n > 0:
+            z = M if z is None else z*z
+            n, bit = divmod(n, 2)
+            if bit:
+                result = z if result is None else result*z
+        return result
+
+    @property
+    def T(self):
+        a, b, c, d = self.entries
+        return _Mat(a, c, b, d)
+
+    # LU factorization with partial pivoting, done the way LAPACK
+    # does it on a 2x2 matrix. Returns the pivoted rows (p, q) and
+    # (r, t), the multiplier l, the second pivot u, and whether the
+    # rows were swapped.
+    def _lu(self):
+        a, b, c, d = [np.asarray(x) for x in self.entries]
+        swap = _cabs1(c) > _cabs1(a)
+        p = np.where(swap, c, a)
+        q = np.where(swap, d, b)
+        r = np.where(swap, a, c)
+        t = np.where(swap, b, d)
+        l = _times(r, _over(1, p))
+        u = t - _times(l, q)
+        return p, q, l, u, swap
+
+    # Determinant. Like np.linalg.det() it's computed from the
+    # logarithms of the pivots, and comes out exactly 0 for
+    # singular matrices.
+    def det(self):
+        p, q, l, u, swap = self._lu()
+        sign = _times(np.where(swap, -1, 1)*_over(p, _abs(p)), _over(u, _abs(u)))
+        logdet = np.log(_abs(p)) + np.log(_abs(u))
+        return np.where((p == 0) | (u == 0), 0, _times(sign, np.exp(logdet)))
+
+    # Inverse by solving against the identity with the LU factors.
+    # Singular matrices have no inverse (an error in the scalar
+    # version) and give nan entries.
+    @property
+    def inv(self):
+        p, q, l, u, swap = self._lu()
+        singular = (p == 0) | (u == 0)
+        columns = []
+        for e1, e2 in ((1, 0), (0, 1)):
+            y1 = np.where(swap, e2, e1)
+            y2 = np.where(swap, e1, e2) - _times(l, y1)
+            x2 = _times(y2, _over(1, u))
+            x1 = _times(y1 - _times(q, x2), _over(1, p))
+            columns.append((np.where(singular, nan, x1), np.where(singular, nan, x2)))
+        (a, c), (b, d) = columns
+        return _Mat(a, b, c, d)
+    I = inv
+
+    @property
+    def real(self):
+        return _Mat(*[np.real(x) for x in self.entries])
+
+    @property
+    def imag(self):
+        return _Mat(*[np.imag(x) for x in self.entries])
+
+    # True at the nodes where all four entries are finite
+    def finite(self):
+        ok = True
+        for x in self.entries:
+            ok = ok & np.isfinite(x)
+        return ok
+
+# LAPACK's cheap absolute value for picking pivots
+def _cabs1(x):
+    return np.abs(np.real(x)) + np.abs(np.imag(x))
+
+def Mat(x1=0, x2=0, y1=0, y2=0):
+    return _Mat(x1, x2, y1, y2)
+mat = MAT = Mat
+
+# Determinant (for mats only)
+def det(M):
+    if not isinstance(M, _Mat):
+        return _nans(M)
+    return M.det()
+
+### VARIOUS OTHER FUNCTIONS ###
+
+# Python's min() and max() on several arguments.
+# Like python, the first of any tied (or incomparable e.g. nan)
+# values wins. Complex numbers can't be compared at all, so they
+# give nan everywhere.
+def _extremum(args, better):
+    if len(args) < 2:
+        raise TypeError("Only min/max of several numbers can be vectorized")
+    for x in args:
+        if np.iscomplexobj(x):
+            return np.full(np.broadcast(*args).shape, nan)
+    result = args[0]
+    for x in args[1:]:
+        result = np.where(better(x, result), x, result)
+    return result
+
+def _min(*args):
+    return _extremum(args, lambda x, y: x < y)
+
+def _max(*args):
+    return _extremum(args, lambda x, y: x > y)
+
+# Treats s as a 2D vector and returns its lp-norm. The powers
+# are worked out by the C library, so this just applies the scalar
+# version to every node.
+_norm = _elementwise(functions.norm, float, 2)
+def norm(s, p=2):
+    if p == inf:
+        return _max(_abs(Re(s)), _abs(Im(s)))
+    return _norm(s, p)
+
+# Squishes squares into their inscribed circles
+# (see functions.disk())
+def disk(s):
+    return np.where(s != 0, _times(norm(s,inf)/_abs(s), s), 0)
+Disk = disk
+
+# Signum function (see functions.sgn())
+def sgn(x):
+    return np.where(x == 0, 0, _over(x, _abs(x)))
+sign = sgn
+
+# Python builtins go by their usual names in formulas
+builtins = {"abs": _abs, "min": _min, "max": _max}
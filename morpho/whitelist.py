@@ -4,6 +4,7 @@
 # It also contains all allowable punctuation symbols.
 whitelist = {
 "zeta",
+"loggamma",
 
 "acos",
 "acosh",
@@ -0,0 +1,86 @@
+'''
+Tests of the keys the keyframe cache (morpho.cache) stores
+keyframes under, and of storing and finding them.
+'''
+
+import numpy as np
+import pytest
+
+import morpho.engine as eng
+import morpho.cache as cache
+import morpho.functions as functions
+
+view = [-5, 5, -5, 5]
+
+def frame(nodes=(0, 1, 1j, 2+2j)):
+    return eng.Frame(paths=[eng.Path(np.array(nodes, dtype=complex))])
+
+@pytest.fixture
+def enabled(monkeypatch, tmp_path):
+    monkeypatch.setattr(cache, "enabled", True)
+    monkeypatch.setattr(cache, "directory", str(tmp_path))
+    monkeypatch.setattr(cache, "hits", 0)
+    monkeypatch.setattr(cache, "misses", 0)
+
+def test_no_keys_while_disabled():
+    assert not cache.enabled
+    assert cache.rootKey(frame(), "1.0", view) is None
+    assert cache.childKey(None, "s^2") is None
+
+def test_root_key(enabled, monkeypatch):
+    k = cache.rootKey(frame(), "1.0", view)
+    assert k == cache.rootKey(frame(), "1.0", view)
+    others = [cache.rootKey(frame((0, 1, 1j, 2)), "1.0", view),
+        cache.rootKey(frame(), "1.1", view),
+        cache.rootKey(frame(), "1.0", [-4, 4, -4, 4])]
+    monkeypatch.setattr(functions, "useMpmath", True)
+    others.append(cache.rootKey(frame(), "1.0", view))
+    assert len(set(others + [k])) == len(others) + 1
+
+# Changing the code of the modules evaluating formulas changes
+# every key.
+def test_source_version_in_key(enabled, monkeypatch):
+    k = cache.rootKey(frame(), "1.0", view)
+    assert len(cache.sourceVersion()) == 64
+    monkeypatch.setattr(cache, "_sourceVersion", "0"*64)
+    assert cache.rootKey(frame(), "1.0", view) != k
+    monkeypatch.setattr(cache, "_sourceVersion", None)
+    monkeypatch.setattr(cache, "_evaluators", cache._evaluators[:-1])
+    assert cache.rootKey(frame(), "1.0", view) != k
+
+def test_child_key(enabled):
+    k = cache.rootKey(frame(), "1.0", view)
+    child = cache.childKey(k, "s^2")
+    assert child == cache.childKey(k, "s^2")
+    assert len(set([k, child, cache.childKey(k, "s^3"),
+        cache.childKey(k, "s^2", True), cache.childKey(child, "s^2")])) == 5
+
+def test_fimage(enabled):
+    f = frame()
+    func = lambda s: s*s + 1
+    k = cache.childKey(cache.rootKey(f, "1.0", view), "s^2+1")
+    assert not cache.contains(k)
+    first = cache.fimage(f, func, k)
+    assert cache.contains(k)
+    second = cache.fimage(f, lambda s: 0, k)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert np.array_equal(first.paths[0].nodes, f.paths[0].nodes**2 + 1)
+    assert np.array_equal(second.paths[0].nodes, first.paths[0].nodes)
+
+# Stored arrays of the wrong size or type aren't used
+def test_load_checks(enabled):
+    cache.save("a", np.arange(3, dtype=complex))
+    assert np.array_equal(cache.load("a", 3), np.arange(3))
+    assert cache.load("a", 4) is None
+    np.save(cache._filename("b"), np.arange(3))
+    assert cache.load("b") is None
+    assert cache.load("c") is None
+
+def test_trim(enabled, monkeypatch):
+    monkeypatch.setattr(cache, "maxBytes", 3000)
+    for n in range(5):
+        cache.save(str(n), np.zeros(100, dtype=complex))
+    assert sum(cache.contains(str(n)) for n in range(5)) == 1
+    assert cache.contains("4")
+    cache.clear()
+    assert not cache.contains("4")
@@ -0,0 +1,72 @@
+'''
+Tests of the PlaybackClock picking the frame of an animation to
+show from the time that has passed since it started playing.
+'''
+
+import pytest
+
+import morpho.engine as eng
+
+# Timer the test moves forward by hand
+class Timer(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+frameRate = 10
+
+def ticks(clock, timer, count, frames=1):
+    indices = []
+    for n in range(count):
+        indices.append(clock.tick())
+        timer.advance(frames/frameRate)
+    return indices
+
+def test_on_time():
+    timer = Timer()
+    clock = eng.PlaybackClock(eng.Timeline([5, 5], [0, 0]), frameRate, timer)
+    assert ticks(clock, timer, 12) == list(range(11)) + [10]
+    stats = clock.stats()
+    assert stats["shown"] == 11
+    assert stats["dropped"] == 0
+    assert stats["meanInterval"] == pytest.approx(1/frameRate)
+    assert stats["jitter"] == pytest.approx(0, abs=1e-6)
+    assert stats["maxLateness"] == pytest.approx(0, abs=1e-9)
+
+# Ticks coming three frames apart skip the two frames in between
+def test_late_frames_dropped():
+    timer = Timer()
+    clock = eng.PlaybackClock(eng.Timeline([10], [0]), frameRate, timer)
+    assert ticks(clock, timer, 4, frames=3) == [0, 3, 6, 9]
+    assert clock.stats()["shown"] == 4
+    assert clock.stats()["dropped"] == 6
+
+# A keyframe delay keeps its frame up for longer
+def test_delays():
+    timer = Timer()
+    clock = eng.PlaybackClock(eng.Timeline([2, 2], [0, 3]), frameRate, timer)
+    assert ticks(clock, timer, 9) == [0, 1, 2, 2, 2, 2, 3, 4, 4]
+    assert clock.stats()["dropped"] == 0
+
+# No time passes while paused
+def test_pause():
+    timer = Timer()
+    clock = eng.PlaybackClock(eng.Timeline([10], [0]), frameRate, timer)
+    assert ticks(clock, timer, 3) == [0, 1, 2]
+    clock.pause()
+    timer.advance(5)
+    clock.resume()
+    assert ticks(clock, timer, 3) == [3, 4, 5]
+    assert clock.stats()["dropped"] == 0
+
+def test_start_part_way():
+    timer = Timer()
+    clock = eng.PlaybackClock(eng.Timeline([4, 4], [0, 2]), frameRate, timer)
+    clock.start(4)
+    assert ticks(clock, timer, 5) == [4, 4, 4, 5, 6]
+    assert clock.stats()["shown"] == 3
@@ -0,0 +1,109 @@
+'''
+Tests of the ways the formula compiler (morpho.compiler) falls
+back on something slower: evaluating only the branches each node
+takes, redoing error nodes through the scalar lambda, and leaving
+formulas it can't vectorize to the scalar lambda altogether.
+'''
+
+import numpy as np
+import pytest
+
+import morpho.engine as eng
+import morpho.compiler as compiler
+
+def grid(radius=3, steps=5):
+    x = np.arange(-radius*steps, radius*steps+1) / steps
+    return (x[:,None] + 1j*x[None,:]).reshape(-1)
+
+def scalarValues(ev, nodes):
+    values = np.empty(len(nodes), dtype=complex)
+    for n, z in enumerate(nodes.tolist()):
+        try:
+            values[n] = ev.scalar(z)
+        except Exception:
+            values[n] = complex("nan")
+    return values
+
+# Formulas with branches and subexpressions shared between them
+_branches = [
+    "(1/s if imag(s) > 0 else log(s)) if real(s) > 0 else (s if imag(s) > 1 else 1/(s-1))",
+    "log(s-1)/2 if imag(s) > 0 else conj(log(s-1)/2)",
+    "(s.real%3 if s.real%3 < 1 else s.real%3*2) + s.real%3",
+    "mat(1,2,3,4)*s if real(s) > 0 else mat(0,1,-1,0)*s",
+    "sum((1/n if real(s) > n else s^n) for n in range(1,10))",
+    "1 < real(s) < 2 and 1/imag(s) or s",
+    "((s+1)^2 if real(s) > 0 else 0) + ((s+1)^2 if imag(s) > 0 else (s+1)^2/2)",
+    ]
+
+@pytest.mark.filterwarnings("ignore::PendingDeprecationWarning")
+@pytest.mark.parametrize("expr", _branches)
+def test_branches_match_scalar(expr):
+    nodes = grid()
+    ev = compiler.compileExpr(expr)
+    values = ev.evalArray(nodes)
+    assert values is not None
+    assert np.allclose(values, scalarValues(ev, nodes),
+        rtol=1e-13, atol=0, equal_nan=True)
+
+# A branch is only evaluated on the nodes that take it, so errors
+# the other nodes would raise in it never happen.
+@pytest.mark.parametrize("expr", ["log(s) if s != 0 else 0",
+    "1/s if real(s) > 0 else s", "real(s) != 0 and 1/real(s)"])
+def test_untaken_branches_raise_nothing(expr):
+    nodes = grid()
+    ev = compiler.compileExpr(expr)
+    values = ev.evalArray(nodes)
+    assert ev.scalarCount == 0
+    assert np.allclose(values, scalarValues(ev, nodes), rtol=1e-13, atol=0)
+
+# Nodes where the scalar formula raises an error are redone through
+# it (so they come out nan like in evalNodes()).
+def test_error_nodes_redone():
+    nodes = np.array([1, 0, 2j, 0, -0.0], dtype=complex)
+    ev = compiler.compileExpr("1/s")
+    values = ev.evalArray(nodes)
+    assert ev.scalarCount == 3
+    assert np.array_equal(values, scalarValues(ev, nodes), equal_nan=True)
+
+# norm(s, inf) takes inf as an argument on purpose, which mustn't
+# send every node to the scalar lambda.
+def test_norm_inf_stays_vectorized():
+    ev = compiler.compileExpr("norm(s, inf)")
+    values = ev.evalArray(grid())
+    assert ev.scalarCount == 0
+    assert np.array_equal(values, scalarValues(ev, grid()))
+
+def test_not_vectorizable():
+    ev = compiler.compileExpr("f(s) + 1", f=lambda s: 2*s)
+    assert ev.vector is None
+    assert not ev.vectorized
+    assert ev.evalArray(grid()) is None
+    assert np.array_equal(eng.evalNodes(ev, grid()), 2*grid() + 1)
+
+# Formulas are only compiled once, and no more than maxCompiled
+# of them are kept.
+def test_compiled_formulas_reused(monkeypatch):
+    monkeypatch.setattr(compiler, "maxCompiled", 4)
+    monkeypatch.setattr(compiler, "_compiled", {})
+    first = compiler.compileExpr("s^2 + 7")
+    second = compiler.compileExpr("s^2 + 7")
+    assert first.scalar.__code__ is second.scalar.__code__
+    for n in range(10):
+        compiler.compileExpr("s + %d" % n)
+    assert len(compiler._compiled) <= 4
+    assert compiler.compileExpr("s^2 + 7").scalar(2) == 11
+
+# Small arrays are evaluated node by node, big ones as arrays, and
+# both give the same.
+def test_small_arrays(monkeypatch):
+    ev = compiler.compileExpr("sqrt(s) + exp(-s)")
+    nodes = grid()
+    big = eng.evalNodes(ev, nodes)
+    monkeypatch.setattr(eng, "minArrayNodes", len(nodes) + 1)
+    small = eng.evalNodes(ev, nodes)
+    assert np.allclose(big, small, rtol=1e-14, atol=0)
+
+def test_special_functions_not_cheap():
+    assert compiler.compileExpr("s^2 + 1").cheap
+    assert not compiler.compileExpr("zeta(s) + 1").cheap
+    assert not compiler.compileExpr("sum(s^n for n in range(3))").cheap
@@ -0,0 +1,270 @@
+'''
+Conformance tests for the array versions of the Morpho functions
+(morpho.vfunctions) and the formula compiler (morpho.compiler).
+
+For every whitelisted name it compiles one or more formulas
+using that name and evaluates them over a dense grid of complex
+numbers (plus a set of awkward values like signed zeros, huge
+numbers, infs and nans) both ways: as an array through
+Evaluator.evalArray() and node by node through the scalar lambda.
+The two must give exactly the same values, down to the last bit
+and the signs of zeros. Since the grid includes points lying
+exactly on the branch cuts, using the wrong side of a cut shows up
+as a large error.
+
+It also checks the accuracy of the fast special functions in
+morpho.special against mpmath.
+'''
+
+import numpy as np
+import pytest
+import mpmath as mp
+
+import morpho.engine as eng
+import morpho.compiler as compiler
+import morpho.special as special
+import morpho.functions as functions
+import morpho.vfunctions as vfunctions
+
+inf = float("inf")
+nan = float("nan")
+
+# The scalar mat() functions are built on np.matrix
+pytestmark = pytest.mark.filterwarnings("ignore::PendingDeprecationWarning")
+
+# Formulas to check for each whitelisted name.
+# Functions of the math module are only defined for real numbers,
+# so they're given real(s) (and also s itself, which should
+# give nan everywhere).
+_complexFunctions = [
+    "acos", "acosh", "asin", "asinh", "atan", "atanh", "cos",
+    "cosh", "exp", "log", "log10", "sin", "sinh", "sqrt", "tan",
+    "tanh", "ln", "phase", "arg", "angle", "real", "imag", "re",
+    "im", "conj", "abs", "norm", "disk", "sgn", "sign", "isbadnum",
+    "isfinite", "isinf", "isnan", "zeta", "gamma", "loggamma"
+    ]
+_realFunctions = [
+    "ceil", "floor", "trunc", "degrees", "radians", "expm1", "log1p",
+    "log2", "fabs", "erf", "erfc", "lgamma"
+    ]
+cases = {}
+for name in _complexFunctions:
+    cases[name] = [name + "(s)"]
+for name in _realFunctions:
+    cases[name] = [name + "(real(s))", name + "(10*imag(s))", name + "(s)"]
+cases.update({
+    "atan2": ["atan2(imag(s), real(s))", "atan2(s, 1)"],
+    "fmod": ["fmod(real(s), imag(s))"],
+    "hypot": ["hypot(real(s), imag(s))", "hypot(real(s), imag(s), 2)"],
+    "factorial": ["factorial(floor(abs(real(s))))", "factorial(real(s))",
+        "factorial(ceil(10*imag(s)))"],
+    "fact": ["fact(trunc(real(s)))", "fact(3)"],
+    "ldexp": ["ldexp(real(s), 3)", "ldexp(real(s), imag(s))"],
+    "pow": ["pow(real(s), imag(s))", "pow(real(s), 0.5)"],
+    "log": ["log(s)", "log(s, 2)", "log(s, 1+i)"],
+    "mod": ["mod(real(s), imag(s))", "mod(s, 2)"],
+    "norm": ["norm(s)", "norm(s, 3)", "norm(s, inf)"],
+    "min": ["min(real(s), imag(s))", "min(real(s), 1, imag(s))", "min(s, 1)"],
+    "max": ["max(real(s), imag(s))", "max(real(s), 1, imag(s))", "max(s, 1)"],
+    "mat": ["mat(1,2,3,4)*s", "mat(2,-1,2,0)^-1*s", "mat(3,-3,1,1).T*s",
+        "mat(1,2,3,4)*mat(0,1,-1,0)*s", "(2*mat(1,1,0,1) + mat(0,0,1,0))^5*s",
+        "mat(real(s),1,0,imag(s))*s", "mat(1,2,2,4)^-1*s", "mat(1,2,3,4)/2*s",
+        "mat(i,1,0,1)*s", "mat(1,2,3,4)*2"],
+    "inv": ["mat(1,2,3,4).inv*s", "mat(real(s),1,1,imag(s)).inv*(1+i)",
+        "mat(1,-1,0,1).I*s"],
+    "det": ["det(mat(1,2,3,4))*s", "det(mat(real(s),2,imag(s),4))", "det(s)"],
+    "sum": ["sum(1/n^s for n in seq(1,100))", "sum([1, s, s^2/2])",
+        "sum(1/(s-n) for n in [-2, -1, 0, 1, 2])"],
+    "prod": ["prod(1/(1-p^-s) for p in [2, 3, 5, 7, 11, 13])",
+        "prod([s, s-1, 1/s])"],
+    "product": ["product(1 - s/n for n in seq(1,5))"],
+    "range": ["sum(s^n/fact(n) for n in range(20))", "sum(s for n in range(0))"],
+    "seq": ["prod(s-n for n in seq(-3,3,2))"],
+    "pi": ["pi*s"], "tau": ["tau*s"], "inf": ["inf*s"], "nan": ["nan*s"],
+    "1j": ["1j*s"],
+    "^": ["s^2", "s^3", "s^-2", "s^0.5", "s^s", "real(s)^imag(s)", "0^s"],
+    "*": ["floor(real(s)*1e10)*floor(real(s)*1e10)",
+        "floor(real(s)*1e18)+floor(real(s)*1e18)*4",
+        "ceil(real(s)*1e18)-floor(-real(s)*1e18)*2",
+        "floor(real(s)*1e18)//floor(imag(s))"],
+    "/": ["1/s", "s/(s-1)", "real(s)/imag(s)"],
+    "%": ["real(s) % imag(s)", "s % 2"],
+    "if": ["s if real(s) > 0 else 1/s", "log(s) if s != 0 else 0"],
+    "and": ["real(s) > 0 and 1/imag(s)"],
+    "or": ["real(s) > 0 or 1/imag(s)"],
+    "not": ["not real(s)"],
+    "<": ["1 < real(s) < 2", "s < 1"],
+    })
+
+# Grid of n x n complex numbers in the square of the given radius
+# about the origin. The grid spacing is 1/steps so the integers and
+# half-integers are hit exactly.
+def grid(radius=4, steps=10):
+    x = np.arange(-radius*steps, radius*steps+1) / steps
+    return (x[:,None] + 1j*x[None,:]).reshape(-1)
+
+# Awkward values: signed zeros (which pick the side of a branch
+# cut), tiny and huge numbers, poles, and infs and nans.
+_awkward = [0.0, -0.0, 1.0, -1.0, 0.5, -0.5, 2.0, -2.0, 1e-310, -1e-310,
+    1e300, -1e300, 171.0, 710.0, -710.0, inf, -inf, nan]
+def awkward():
+    return np.array([complex(x, y) for x in _awkward for y in _awkward])
+
+# Returns True where the two values agree (the same, or both finite
+# and within tol relative to max(1,|b|)), along with the relative
+# errors. Zeros only count as the same if their signs are.
+def _agree(a, b, tol):
+    fa = np.isfinite(a)
+    fb = np.isfinite(b)
+    def equal(x, y):
+        return ((x == y) & (np.signbit(x) == np.signbit(y))) \
+            | (np.isnan(x) & np.isnan(y))
+    same = equal(a.real, b.real) & equal(a.imag, b.imag)
+    err = np.zeros(len(a))
+    both = fa & fb
+    err[both] = np.abs(a[both]-b[both]) / np.maximum(1, np.abs(b[both]))
+    return (fa == fb) & (same | (both & (err <= tol))), err
+
+# Checks a single formula over the given nodes. Returns a dict with
+#   expr       -- the formula
+#   vectorized -- whether it could be evaluated as an array at all
+#   mismatches -- number of nodes where the two evaluations aren't
+#                 within ulps of each other
+#   maxErr     -- largest error of the finite values in ulps of
+#                 max(1,|value|)
+#   scalarFraction -- fraction of nodes evalArray() had to hand over
+#                 to the scalar lambda
+#   worst      -- the node with the largest error (or a mismatch)
+def check(expr, nodes, ulps=0):
+    ev = compiler.compileExpr(expr)
+    result = {"expr": expr, "vectorized": ev.vectorized,
+        "mismatches": 0, "maxErr": 0.0, "scalarFraction": 0.0,
+        "worst": None}
+    values = ev.evalArray(nodes)
+    if values is None:
+        result["vectorized"] = False
+        return result
+    scalar = eng.evalNodes(ev.scalar, nodes)
+
+    ok, err = _agree(values, scalar, inf)
+    both = np.isfinite(values) & np.isfinite(scalar)
+    err[both] = np.abs(values[both] - scalar[both]) \
+        / np.spacing(np.maximum(1, np.abs(scalar[both])))
+    same, _ = _agree(values, scalar, 0)
+    ok &= same | (err <= ulps) & (ulps > 0)
+    result["mismatches"] = int(np.count_nonzero(~ok))
+    result["maxErr"] = float(err.max()) if len(err) > 0 else 0.0
+    result["scalarFraction"] = ev.scalarCount / max(1, len(nodes))
+    if result["mismatches"] > 0:
+        result["worst"] = complex(nodes[np.flatnonzero(~ok)[0]])
+    elif len(err) > 0:
+        result["worst"] = complex(nodes[np.argmax(err)])
+    return result
+
+@pytest.mark.parametrize("expr", [expr for name in sorted(cases)
+    for expr in cases[name]])
+def test_array_matches_scalar(expr):
+    result = check(expr, np.concatenate((grid(), awkward())))
+    assert result["vectorized"]
+    assert result["mismatches"] == 0, result
+
+# Reference values of the special functions computed by mpmath
+_mpFunctions = {
+    "zeta": mp.zeta,
+    "gamma": mp.gamma,
+    "loggamma": mp.loggamma
+    }
+
+def _reference(func, nodes):
+    values = []
+    for s in nodes.tolist():
+        try:
+            values.append(complex(func(s)))
+        except (ArithmeticError, ValueError):
+            values.append(complex(nan))
+    return np.array(values)
+
+# Regions to check the special functions over. The first is the
+# region the zeta grid covers, the others reach well beyond it.
+def specialRegions(count=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    def box(x1, x2, y1, y2):
+        return rng.uniform(x1, x2, count) + 1j*rng.uniform(y1, y2, count)
+    return [
+        ("zeta grid", grid(7, 10)[np.abs(grid(7, 10).imag) <= 4]),
+        ("|s| < 30", box(-30, 30, -30, 30)),
+        ("real axis", np.concatenate((np.arange(-100, 101)/10 + 0j,
+            box(-10, 10, -1e-3, 1e-3)))),
+        ("critical strip", box(0, 1, -200, 200)),
+        ("far left", box(-150, -30, -10, 10)),
+        ]
+
+# The fast special functions (from morpho.special) must be within
+# tol of mpmath (relative to max(1,|value|)) over every region and
+# agree with it on which nodes are finite.
+@pytest.mark.parametrize("name", sorted(_mpFunctions))
+def test_special_accuracy(name, tol=1e-12):
+    func = getattr(special, name)
+    for region, nodes in specialRegions():
+        ok, err = _agree(func(nodes), _reference(_mpFunctions[name], nodes), inf)
+        assert np.all(ok), region
+        assert err.max() <= tol, region
+
+# Applying a mat to nodes gives exactly the scalar mat's values,
+# and those are within an ulp of the sum of the sizes of the two
+# products in each component of what np.matrix (whose BLAS may fuse
+# the multiply-adds) gives.
+@pytest.mark.parametrize("entries", [(1, 2, 3, 4), (2, -1, 2, 0),
+    (0.3, -1.7, 2.2, 5.1), (1, 0, 0, 1), (1j, 2, 0.5, -1j)])
+def test_mat_rounding(entries):
+    rng = np.random.default_rng(0)
+    nodes = rng.standard_normal(20000)*10**rng.uniform(-5, 5, 20000) \
+        + 1j*rng.standard_normal(20000)
+    scalar = np.array([functions.mat(*entries)*z for z in nodes.tolist()])
+    values = vfunctions.mat(*entries)*nodes
+    assert np.array_equal(values, scalar)
+    a, b, c, d = np.real(entries)
+    x, y = nodes.real, nodes.imag
+    old = np.asarray(np.matrix([[a, b], [c, d]]) * np.array([x, y]))
+    for value, expected, bound in [
+        (values.real, old[0], np.abs(a*x) + np.abs(b*y)),
+        (values.imag, old[1], np.abs(c*x) + np.abs(d*y))]:
+        assert np.all(np.abs(value - expected) <= np.spacing(bound))
+
+# Nodes the double precision zeta can't do go to mpmath rather than
+# coming out nan, and real nodes give real values.
+def test_zeta_fallback():
+    nodes = np.array([0.5+2e5j, -3-1e6j, -300.3, -400.5, inf, 1, 2])
+    values = special.zeta(nodes)
+    expected = _reference(mp.zeta, nodes[:4])
+    assert np.allclose(values[:2], expected[:2], rtol=1e-12, atol=0)
+    assert np.array_equal(values[2:4], expected[2:4])
+    assert values[4] == 1
+    assert np.isnan(values[5])
+    real = np.concatenate((np.arange(-100, 101)/10, [-0.5-0.0j]))
+    assert np.all(special.zeta(real).imag == 0)
+
+# Products and sums of big integers (floor() and friends give int64
+# arrays) come out like python's unbounded integers rather than
+# wrapping around.
+@pytest.mark.parametrize("expr, expected", [
+    ("floor(real(s)*1e10)*floor(real(s)*1e10)", 9e20),
+    ("floor(real(s)*1e18)+floor(real(s)*1e18)*4", 1.5e19),
+    ("-floor(real(s)*1e18)-floor(real(s)*1e18)*4", -1.5e19),
+    ("floor(real(s)*1e9)*floor(real(s))", 9e9)])
+def test_integer_overflow(expr, expected):
+    ev = compiler.compileExpr(expr)
+    nodes = np.full(200, 3+0j)
+    assert np.all(ev.evalArray(nodes) == expected)
+    assert ev.scalar(3) == expected
+
+# Positive integers are the commonest arguments of gamma, and give
+# exactly the factorials like mpmath does.
+def test_gamma_integers():
+    n = np.arange(1, 172)
+    expected = [float(mp.factorial(k-1)) for k in n]
+    assert np.array_equal(special.gamma(n + 0j), expected)
+    assert np.array_equal(special.gamma(n + 0j).imag, np.zeros(len(n)))
+    assert functions.gamma(1) == 1
+    assert functions.gamma(2) == 1
+    assert functions.gamma(5) == 24
@@ -0,0 +1,58 @@
+'''
+Tests of hybrid evaluation (compiler.hybrid), which redoes in
+mpmath only the nodes where double precision fails.
+'''
+
+import numpy as np
+import pytest
+
+import morpho.compiler as compiler
+import morpho.mpfunctions as mpfunctions
+
+@pytest.fixture
+def hybrid(monkeypatch):
+    monkeypatch.setattr(compiler, "hybrid", True)
+
+# gamma(200) overflows in double precision, but the ratio doesn't
+def test_gamma_ratio(hybrid):
+    ev = compiler.compileExpr("gamma(s)/gamma(s-1)")
+    assert ev(200) == 199
+    assert ev.preciseCount == 1
+    values = ev.evalArray(np.array([200, 200.5, 5, 2+1j]))
+    assert np.allclose(values, [199, 199.5, 4, 1+1j], rtol=1e-14, atol=0)
+
+def test_gamma_ratio_overflows(monkeypatch):
+    monkeypatch.setattr(compiler, "hybrid", False)
+    ev = compiler.compileExpr("gamma(s)/gamma(s-1)")
+    assert not np.isfinite(ev.evalArray(np.array([200+0j]))[0])
+    assert ev.preciseCount == 0
+
+# Only the nodes that fail in double precision count (and get
+# redone), the rest keep their double precision values.
+def test_precise_count(hybrid, monkeypatch):
+    ev = compiler.compileExpr("gamma(s)/gamma(s-1)")
+    nodes = np.concatenate((np.linspace(1.5, 10, 500) + 0.5j,
+        [200, 300, 250+1j]))
+    values = ev.evalArray(nodes)
+    assert ev.preciseCount == 3
+    assert np.allclose(values[-3:], nodes[-3:] - 1, rtol=1e-14, atol=0)
+    monkeypatch.setattr(compiler, "hybrid", False)
+    assert np.array_equal(values[:-3], ev.evalArray(nodes[:-3]))
+
+# Sums losing most of their digits to cancellation get redone too.
+# At 30 digits, s = 1e-20 keeps about 10 of them through s + 1.
+def test_cancellation(hybrid):
+    ev = compiler.compileExpr("(s + 1) - 1")
+    nodes = np.array([1e-20, 2e-20, 0.5, 3])
+    values = ev.evalArray(nodes)
+    assert ev.preciseCount == 2
+    assert np.allclose(values, nodes, rtol=1e-9, atol=0)
+    assert np.array_equal(values[2:], nodes[2:])
+
+# Constants are rebuilt at the new precision when dps changes
+def test_dps(hybrid, monkeypatch):
+    ev = compiler.compileExpr("gamma(s)/gamma(s-1)")
+    assert ev(200) == 199
+    monkeypatch.setattr(mpfunctions, "dps", 50)
+    assert ev(200) == 199
+    assert ev.preciseCount == 2
@@ -0,0 +1,98 @@
+'''
+Tests of the memoization of the special functions (morpho.memo).
+'''
+
+import numpy as np
+import pytest
+
+import morpho.memo as memo
+import morpho.functions as functions
+import morpho.mpfunctions as mpfunctions
+
+# Function counting the nodes it gets called on
+class Counted(object):
+    def __init__(self):
+        self.nodes = 0
+
+    def __call__(self, s):
+        self.nodes += np.size(s)
+        return s*s + 1
+
+def test_scalar_hits_and_misses():
+    func = Counted()
+    m = memo.Memo(func)
+    assert m(2) == 5
+    assert m(2) == 5
+    assert m(3j) == -8
+    assert (m.hits, m.misses, func.nodes) == (1, 2, 2)
+    # Signed zeros are different nodes
+    m(0.0)
+    m(-0.0)
+    assert func.nodes == 4
+
+def test_array_lookup():
+    func = Counted()
+    m = memo.Memo(func)
+    rng = np.random.default_rng(0)
+    nodes = rng.standard_normal(1000) + 1j*rng.standard_normal(1000)
+    nodes = np.concatenate((nodes, nodes[:300], [0.0, -0.0, complex("nan")]))
+    assert np.array_equal(m(nodes), func(nodes), equal_nan=True)
+    assert func.nodes - len(nodes) == 1003
+
+    more = np.concatenate((nodes[500:], rng.standard_normal(201)))
+    assert np.array_equal(m(more.reshape(-1, 2)), func(more).reshape(-1, 2),
+        equal_nan=True)
+    assert func.nodes - len(nodes) - len(more) == 1003 + 201
+    assert (m.hits, m.misses) == (len(more) - 201, len(nodes) + 201)
+
+# Nodes with the same hash still get their own values
+def test_hash_collisions(monkeypatch):
+    monkeypatch.setattr(memo, "_hashes",
+        lambda nodes: np.zeros(len(nodes), dtype=np.uint64))
+    m = memo.Memo(Counted())
+    nodes = np.array([1, 2, 3, 1, 2j], dtype=complex)
+    assert np.array_equal(m(nodes), nodes*nodes + 1)
+    assert np.array_equal(m(nodes[::-1]), (nodes*nodes + 1)[::-1])
+
+def test_least_recently_used_dropped():
+    m = memo.Memo(Counted(), maxsize=100)
+    old = np.arange(100, dtype=complex)
+    new = np.arange(100, 150, dtype=complex)
+    m(old[:50])
+    m(old[50:])
+    m(old[50:])
+    m(new)
+    assert len(m) == 100
+    assert np.all(np.isin(m.nodes, np.concatenate((old[50:], new))))
+
+# Values computed in double precision aren't used in mpmath or
+# at another precision, and the other way around.
+def test_mode_change_clears(monkeypatch):
+    func = Counted()
+    m = memo.Memo(func)
+    nodes = np.arange(10, dtype=complex)
+    m(nodes)
+    m(1.5)
+    assert len(m) == 11
+    monkeypatch.setattr(functions, "useMpmath", True)
+    m(nodes[:3])
+    assert len(m) == 3
+    monkeypatch.setattr(mpfunctions, "dps", mpfunctions.dps + 5)
+    m(1.5)
+    assert len(m) == 1
+    assert func.nodes == 10 + 1 + 3 + 1
+
+def test_memoize(monkeypatch):
+    func = Counted()
+    wrapped = memo.memoize("test")(func)
+    try:
+        wrapped(2)
+        assert len(wrapped.memo) == 0
+        monkeypatch.setattr(memo, "enabled", True)
+        wrapped(2)
+        wrapped(2)
+        assert memo.stats()["test"] == {"hits": 1, "misses": 1, "size": 1}
+        memo.clear()
+        assert memo.stats()["test"] == {"hits": 0, "misses": 0, "size": 0}
+    finally:
+        del memo.memos["test"]
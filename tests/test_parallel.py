@@ -0,0 +1,144 @@
+'''
+Tests of building keyframes and prerendering frames in worker
+processes (morpho.parallel), and of evaluating nodes on several
+threads (engine.evalNodes()).
+'''
+
+import types
+from concurrent.futures import Future
+import numpy as np
+import pytest
+import mpmath
+
+import morpho.engine as eng
+import morpho.parallel as parallel
+import morpho.functions as functions
+import morpho.memo as memo
+
+view = [-5, 5, -5, 5]
+
+# Stands in for the process pool, running every job it's handed
+# right away in this process and noting which function it ran.
+class Pool(object):
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, func, *args):
+        self.submitted.append((func.__name__, args[0]))
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = Pool()
+    monkeypatch.setattr(parallel, "processes", 4)
+    monkeypatch.setattr(parallel, "minNodes", 0)
+    monkeypatch.setattr(parallel, "pool", lambda: pool)
+    return pool
+
+def domain():
+    x = np.linspace(-3, 3, 41)
+    return eng.Frame(paths=[eng.Path(x + 1j*y) for y in x[::4]])
+
+def keyframes(formulas, parallelize):
+    polargrid = parallel.polarGrid(5)
+    jobs = []
+    for ID, (base, formula) in enumerate(formulas, 1):
+        func, options = parallel.keyframeFunction(formula, polargrid, "1", view)
+        jobs.append(parallel.Job(ID, base, formula, func, None))
+    if not parallelize:
+        parallel.processes = 1
+    return parallel.constructKeyframes(domain(), jobs, 5, "1", view)
+
+# Only the formulas that can't be vectorized go to the pool, and
+# the keyframes come out the same either way.
+def test_only_scalar_jobs_submitted(pool):
+    formulas = [(0, "s^2"), (0, "round(s)"), (1, "int(real(s)) + s"),
+        (2, "exp(s)"), (0, "[s, 1][0]/2")]
+    built = keyframes(formulas, True)
+    assert sorted(pool.submitted) == [("_evaluate", formula)
+        for formula in ["[s, 1][0]/2", "int(real(s)) + s", "round(s)"]]
+    serial = keyframes(formulas, False)
+    for frame, expected in zip(built, serial):
+        assert np.array_equal(frame.pack().nodes, expected.pack().nodes,
+            equal_nan=True)
+
+# Splitting the nodes into chunks evaluated on several threads
+# gives exactly what evaluating them in one go does.
+@pytest.mark.parametrize("expr", ["zeta(s) + 1/s", "log(s) if real(s) > 0 else 1/s",
+    "sum(s^n/fact(n) for n in range(8))", "round(s)"])
+def test_chunked_nodes(expr, monkeypatch):
+    ev = parallel.compiler.compileExpr(expr)
+    x = np.linspace(-3, 3, 61)
+    nodes = (x[:,None] + 1j*x[None,:]).reshape(-1)
+    monkeypatch.setattr(eng, "workers", 1)
+    whole = eng.evalNodes(ev, nodes)
+
+    chunks = []
+    evalChunk = eng._evalChunk
+    monkeypatch.setattr(eng, "_evalChunk", lambda func, chunk, array:
+        chunks.append((len(chunk), array)) or evalChunk(func, chunk, array))
+    monkeypatch.setattr(eng, "workers", 4)
+    monkeypatch.setattr(eng, "chunkSize", 100)
+    threaded = eng.evalNodes(ev, nodes)
+    assert np.array_equal(threaded, whole, equal_nan=True)
+    # Every chunk, including the short last one, is evaluated as an
+    # array. (Error nodes redone through the scalar lambda are
+    # evaluated in chunks of their own.)
+    if ev.vectorized:
+        assert chunks.count((100, True)) == len(nodes) // 100
+        assert (len(nodes) % 100, True) in chunks
+    else:
+        assert chunks == [(len(nodes), True)]
+
+# With useMpmath, the special functions evaluated on several threads
+# give what they do one node at a time, and don't depend on
+# whatever mpmath's global context is set to.
+@pytest.mark.parametrize("expr", ["zeta(s)", "gamma(s) + loggamma(s)"])
+def test_threaded_mpmath(expr, monkeypatch):
+    monkeypatch.setattr(functions, "useMpmath", True)
+    monkeypatch.setattr(memo, "enabled", False)
+    monkeypatch.setattr(mpmath.mp, "dps", 5)
+    ev = parallel.compiler.compileExpr(expr)
+    x = np.linspace(-3, 3, 13)
+    nodes = (x[:,None] + 1j*x[None,:] + 0.1).reshape(-1)
+    monkeypatch.setattr(eng, "workers", 4)
+    monkeypatch.setattr(eng, "chunkSize", 20)
+    threaded = eng.evalNodes(ev, nodes)
+    monkeypatch.setattr(mpmath.mp, "dps", 15)
+    serial = np.array([ev.scalar(z) for z in nodes.tolist()])
+    assert np.array_equal(threaded, serial)
+
+# Prerendering in the process pool gives the same frames as
+# prerendering them one by one here.
+def test_prerender_tweens(monkeypatch):
+    x = np.linspace(-2, 2, 30)
+    domain = eng.Frame(paths=[eng.Path(x + 1j*y) for y in x[::3]]
+        + [eng.Path(y + 1j*x) for y in x[::3]])
+    domain.paths[3].color = [1, 0, 0]
+    keyframes = [domain, domain.fimage(lambda s: s**2/2),
+        domain.fimage(lambda s: np.exp(s))]
+    keyframes[1].delay = 5
+    mation = eng.Animation(keyframes)
+    mation.frameCount = [7, 9]
+    mation.view = [-5, 5, -5, 5]
+    mation.window = types.SimpleNamespace(width=400, height=300)
+
+    monkeypatch.setattr(parallel, "processes", 1)
+    serial = mation.prerenderFrames()
+    monkeypatch.setattr(parallel, "processes", 2)
+    monkeypatch.setattr(parallel, "minPrerenderNodes", 0)
+    done = []
+    try:
+        pooled = mation.prerenderFrames(lambda count, total: done.append(count))
+    finally:
+        parallel.shutdown()
+    assert done[-1] == len(serial)
+    assert len(pooled) == len(serial)
+    for fframe, expected in zip(pooled, serial):
+        vertices, colors, layout = fframe.flatten()
+        expVertices, expColors, expLayout = expected.flatten()
+        assert np.array_equal(vertices, expVertices)
+        assert np.array_equal(colors, expColors)
+        assert layout == expLayout
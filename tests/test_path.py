@@ -0,0 +1,58 @@
+'''
+Tests that the list and set style attributes of engine.Path (seq
+and deadends) behave like the list and set they used to be, with
+changes going through to the node array and deadmask.
+'''
+
+import numpy as np
+
+import morpho.engine as eng
+
+def test_seq_concatenation():
+    p = eng.Path([0, 1, 2])
+    q = eng.Path([1j, 2j])
+    assert p.seq + q.seq == [0, 1, 2, 1j, 2j]
+    assert p.seq + [5] == [0, 1, 2, 5]
+    assert [5] + p.seq == [5, 0, 1, 2]
+    joined = eng.Path(p.seq + q.seq)
+    assert np.array_equal(joined.nodes, [0, 1, 2, 1j, 2j])
+    # The originals are untouched
+    assert len(p.nodes) == 3 and len(q.nodes) == 2
+
+def test_seq_append():
+    p = eng.Path([0, 1])
+    p.deadends.add(0)
+    p.seq.append(2+1j)
+    p.seq.extend([3, 4])
+    p.seq += [5]
+    assert np.array_equal(p.nodes, [0, 1, 2+1j, 3, 4, 5])
+    assert len(p.deadmask) == 6
+    assert p.deadends == {0}
+
+def test_seq_editing():
+    p = eng.Path([0, 1, 2, 3])
+    p.seq[1] = 1j
+    p.seq[2:] = [7]
+    assert np.array_equal(p.nodes, [0, 1j, 7])
+    del p.seq[0]
+    p.seq.insert(1, 5)
+    assert np.array_equal(p.nodes, [1j, 5, 7])
+    assert p.seq[0] == 1j and type(p.seq[0]) is complex
+    assert p.seq[::2] == [1j, 7]
+    assert list(p.seq) == [1j, 5, 7]
+    assert 5 in p.seq
+    assert p.seq.index(7) == 2
+
+    # Copies don't write back
+    copy = p.seq.copy()
+    copy.append(0)
+    assert len(p.nodes) == 3
+    assert np.array_equal(np.array(p.seq), p.nodes)
+
+def test_deadends():
+    p = eng.Path(np.arange(5))
+    p.deadends = {1, 3, 10}
+    assert np.array_equal(p.deadmask, [False, True, False, True, False])
+    p.deadends.discard(1)
+    assert 3 in p.deadends and 1 not in p.deadends
+    assert p.deadends | {4} == {3, 4}
@@ -0,0 +1,105 @@
+'''
+Tests of the FramePrefetcher computing the frames of an animation
+ahead of the playhead while it plays.
+'''
+
+import threading
+import pytest
+
+import morpho.engine as eng
+
+# Renders the frames before the index allowed, and waits for the
+# test to allow the rest
+class Gate(object):
+    def __init__(self):
+        self.allowed = 0
+        self.condition = threading.Condition()
+        self.rendered = []
+
+    def allow(self, index=float("inf")):
+        with self.condition:
+            self.allowed = index
+            self.condition.notify_all()
+
+    def __call__(self, index):
+        with self.condition:
+            while index >= self.allowed:
+                self.condition.wait()
+        self.rendered.append(index)
+        return "frame %d" % index
+
+@pytest.fixture
+def gate():
+    gate = Gate()
+    yield gate
+    gate.allow()
+
+
+def test_frames_in_order():
+    prefetcher = eng.FramePrefetcher(lambda index: index, 100, size=8)
+    try:
+        assert [prefetcher.get(n, wait=True) for n in range(100)] \
+            == list(range(100))
+        # The last frame can be asked for again
+        assert prefetcher.get(99) == 99
+    finally:
+        prefetcher.stop()
+
+
+# get() hands back what it has rather than wait for the thread
+def test_get_never_waits(gate):
+    prefetcher = eng.FramePrefetcher(gate, 100, size=8)
+    try:
+        assert prefetcher.get(0) is None
+        gate.allow(1)
+        assert prefetcher.get(0, wait=True) == "frame 0"
+        assert prefetcher.get(5) == "frame 0"
+        gate.allow()
+        assert prefetcher.get(5, wait=True) == "frame 5"
+    finally:
+        prefetcher.stop()
+
+
+def test_errors_raised_by_get():
+    def render(index):
+        if index == 3: raise ZeroDivisionError
+        return index
+    prefetcher = eng.FramePrefetcher(render, 10, size=4)
+    try:
+        assert [prefetcher.get(n, wait=True) for n in range(3)] == [0, 1, 2]
+        with pytest.raises(ZeroDivisionError):
+            prefetcher.get(3, wait=True)
+        assert prefetcher.get(4, wait=True) == 4
+    finally:
+        prefetcher.stop()
+
+
+def test_stop(gate):
+    prefetcher = eng.FramePrefetcher(gate, 100, size=8)
+    prefetcher.stop()
+    gate.allow()
+    prefetcher.thread.join(5)
+    assert not prefetcher.thread.is_alive()
+
+# A thread that has fallen behind skips the frames already late
+def test_skips_late_frames(gate):
+    prefetcher = eng.FramePrefetcher(gate, 100, size=8)
+    try:
+        prefetcher.get(50)
+        gate.allow()
+        assert prefetcher.get(50, wait=True) == "frame 50"
+        assert prefetcher.get(60, wait=True) == "frame 60"
+        assert all(index == 0 or index >= 50 for index in gate.rendered)
+    finally:
+        prefetcher.stop()
+
+def test_seek_back():
+    prefetcher = eng.FramePrefetcher(lambda index: index, 100, size=8)
+    try:
+        assert prefetcher.get(40, wait=True) == 40
+        assert prefetcher.get(3, wait=True) == 3
+        assert prefetcher.get(4, wait=True) == 4
+        prefetcher.seek(90)
+        assert prefetcher.get(95, wait=True) == 95
+    finally:
+        prefetcher.stop()
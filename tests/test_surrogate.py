@@ -0,0 +1,98 @@
+'''
+Tests of evaluating formulas on piecewise polynomial surrogates
+(morpho.surrogate).
+'''
+
+import numpy as np
+import pytest
+
+import morpho.cache as cache
+import morpho.compiler as compiler
+import morpho.surrogate as surrogate
+
+@pytest.fixture(autouse=True)
+def fresh(monkeypatch):
+    monkeypatch.setattr(cache, "enabled", False)
+    monkeypatch.setattr(surrogate, "_surrogates", {})
+    monkeypatch.setattr(surrogate, "stats", dict.fromkeys(surrogate.stats, 0))
+
+# Grid of n x n nodes over the rectangle [x1,x2] x [y1,y2]
+def grid(x1, x2, y1, y2, n=200):
+    x = np.linspace(x1, x2, n)
+    y = np.linspace(y1, y2, n)
+    return (x[None,:] + 1j*y[:,None]).reshape(-1)
+
+def relErr(values, exact):
+    return np.abs(values - exact) / np.maximum(1, np.abs(exact))
+
+def test_smooth_within_tol():
+    ev = compiler.compileExpr("exp(s)*sin(s) + s^3/7")
+    sev = surrogate.SurrogateEvaluator(ev, "smooth")
+    nodes = grid(-2, 2, -2, 2)
+    values = sev.evalArray(nodes)
+    assert surrogate.stats["fitted"] == 1
+    assert surrogate.stats["directNodes"] == 0
+    assert relErr(values, ev.evalArray(nodes)).max() <= surrogate.tol
+
+    # Anywhere in the rectangle, not just at the grid nodes
+    sur = sev.surrogate(nodes)
+    assert surrogate.stats["reused"] == 1
+    assert sur.coverage == 1
+    rng = np.random.default_rng(1)
+    points = rng.uniform(-2, 2, 5000) + 1j*rng.uniform(-2, 2, 5000)
+    assert relErr(sur.evaluate(points), ev.evalArray(points)).max() \
+        <= surrogate.tol
+
+# Cells the branch cut of log runs through can't be fitted, and
+# their nodes get evaluated directly, on the right side of the cut.
+@pytest.mark.parametrize("expr", ["log(s)", "sqrt(s)"])
+def test_branch_cut_exact(expr):
+    ev = compiler.compileExpr(expr)
+    sev = surrogate.SurrogateEvaluator(ev, "cut")
+    # The cut (the negative real axis) lies inside a row of cells
+    nodes = np.concatenate((grid(-2.3, 1.7, -1.7, 2.3),
+        np.linspace(-2, -0.1, 50) + 0j, np.linspace(-2, -0.1, 50) - 0j,
+        np.linspace(-2, -0.1, 50) - 1e-9j))
+    values = sev.evalArray(nodes)
+    exact = ev.evalArray(nodes)
+    assert relErr(values, exact).max() <= surrogate.tol
+    assert 0 < surrogate.stats["directNodes"] < len(nodes)
+    sur = sev.surrogate(nodes)
+    assert 0 < sur.coverage < 1
+    near = np.abs(nodes.imag) < 0.05
+    assert np.all(np.isnan(sur.evaluate(nodes[near & (nodes.real < -0.5)])))
+    assert np.array_equal(values[np.abs(nodes.imag) < 1e-6],
+        exact[np.abs(nodes.imag) < 1e-6])
+
+# Cells that fail their probes at every depth are thrown out, and
+# all their nodes are evaluated directly.
+def test_failed_probes_fall_back(monkeypatch):
+    monkeypatch.setattr(surrogate, "degree", 2)
+    monkeypatch.setattr(surrogate, "depth", 1)
+    ev = compiler.compileExpr("exp(5*s)")
+    sev = surrogate.SurrogateEvaluator(ev, "coarse")
+    nodes = grid(-1, 1, -1, 1, 50)
+    values = sev.evalArray(nodes)
+    assert sev.surrogate(nodes).coverage == 0
+    assert surrogate.stats["directNodes"] == len(nodes)
+    assert np.array_equal(values, ev.evalArray(nodes))
+
+# Too few nodes aren't worth fitting a surrogate for
+def test_few_nodes():
+    ev = compiler.compileExpr("exp(s)")
+    sev = surrogate.SurrogateEvaluator(ev, "few")
+    nodes = grid(-1, 1, -1, 1, 10)
+    assert sev.surrogate(nodes) is None
+    assert np.array_equal(sev.evalArray(nodes), ev.evalArray(nodes))
+
+def test_flatten():
+    ev = compiler.compileExpr("log(s)")
+    nodes = grid(-2.3, 1.7, -1.7, 2.3)
+    sur = surrogate.fitSurrogate(ev, nodes, surrogate._boundingRect(nodes),
+        4, 8, 2, 8, 1e-10)
+    copy = surrogate.Surrogate(sur.rect, 4, 8)
+    copy.unflatten(sur.flatten(), 2)
+    assert np.array_equal(copy.evaluate(nodes), sur.evaluate(nodes),
+        equal_nan=True)
+    with pytest.raises(ValueError):
+        copy.unflatten(sur.flatten()[:-1], 2)
@@ -0,0 +1,97 @@
+'''
+Tests of evaluating real-analytic formulas only in the upper half
+plane and mirroring the values over to the lower half (see
+compiler.realAnalytic() and engine.evalUniqueNodes()).
+'''
+
+import numpy as np
+import pytest
+
+import morpho.engine as eng
+import morpho.compiler as compiler
+
+# Grid symmetric about the real axis, with the real axis in it
+# twice: once with +0.0 and once with -0.0 imaginary parts, which
+# lie on opposite sides of the branch cuts along it.
+def grid(radius=3, steps=5):
+    x = np.arange(-radius*steps, radius*steps+1) / steps
+    nodes = (x[:,None] + 1j*x[None,:]).reshape(-1)
+    axis = x + 0j
+    return np.concatenate((nodes, axis, axis.conjugate()))
+
+_symmetric = [
+    "sqrt(s)", "log(s)", "s^0.5", "log(1-s)/s", "s^3 - 2*s + 1",
+    "exp(s)/s", "atanh(s) + acos(s)", "zeta(s)", "gamma(s)",
+    "sum(s^k/fact(k) for k in range(10))",
+    "prod(1/(1-p^-s) for p in [2, 3, 5, 7])",
+    "log(s-1) if real(s) > 0 else sqrt(s)", "abs(s)*conj(s)",
+    ]
+
+# Mirrored values are the conjugates of the upper half plane ones,
+# which must match evaluating the lower half directly (down to the
+# side of the branch cut nodes on the real axis end up on).
+@pytest.mark.parametrize("expr", _symmetric)
+def test_mirrored_values(expr):
+    ev = compiler.compileExpr(expr)
+    assert ev.realAnalytic
+    nodes = grid()
+    ev.useSymmetry = False
+    direct = eng.evalUniqueNodes(ev, nodes)
+    ev.useSymmetry = True
+    mirrored = eng.evalUniqueNodes(ev, nodes)
+
+    finite = np.isfinite(direct)
+    assert np.array_equal(finite, np.isfinite(mirrored))
+    assert np.allclose(mirrored[finite], direct[finite], rtol=1e-13, atol=1e-13)
+    onAxis = finite & (nodes.imag == 0) & (np.abs(direct.imag) > 1e-300)
+    assert np.array_equal(np.signbit(mirrored[onAxis].imag),
+        np.signbit(direct[onAxis].imag))
+
+# Only the nodes on or above the real axis get evaluated
+def test_half_evaluated(monkeypatch):
+    monkeypatch.setattr(eng, "dedup", True)
+    ev = compiler.compileExpr("zeta(s)")
+    ev.useSymmetry = True
+    seen = []
+    evalNodes = eng.evalNodes
+    monkeypatch.setattr(eng, "evalNodes",
+        lambda func, nodes: seen.append(nodes) or evalNodes(func, nodes))
+    eng.evalUniqueNodes(ev, grid())
+    assert not np.any(np.concatenate(seen).imag < 0)
+
+def test_module_setting(monkeypatch):
+    ev = compiler.compileExpr("s^2")
+    monkeypatch.setattr(compiler, "conjugateSymmetry", False)
+    assert not ev.symmetric
+    monkeypatch.setattr(compiler, "conjugateSymmetry", True)
+    assert ev.symmetric
+    assert not compiler.compileExpr("i*s").symmetric
+    ev.useSymmetry = False
+    assert not ev.symmetric
+
+# Anything involving i, the imaginary part, mats or series that
+# aren't over real literals could break the symmetry.
+@pytest.mark.parametrize("expr", [
+    "i*s", "s + 1j", "j", "im(s)", "imag(s)", "Im(s)", "s.imag",
+    "exp(i*s)", "mat(1,2,3,4)*s", "sum(s**k for k in [1j, 2])",
+    "sum(s**k for k in range(5) if k > 1)",
+    "sum(s**k for k in range(int(real(s))))",
+    "sum(s**k for k in range(3) for n in range(3))",
+    "prod(s-k for k in [1, 2, i])",
+    ])
+def test_rejected(expr):
+    assert not compiler.realAnalytic(expr, {})
+
+def test_extras():
+    real = compiler.compileExpr("s^2 + 1")
+    other = compiler.compileExpr("s + i")
+    assert compiler.realAnalytic("f(s) + 2", {"f": real})
+    assert not compiler.realAnalytic("f(s) + 2", {"f": other})
+    assert compiler.realAnalytic("a*s", {"a": 2.5})
+    assert not compiler.realAnalytic("a*s", {"a": 2.5j})
+
+# A series loop variable is only known inside its series
+def test_real_analytic_loop_variables():
+    assert compiler.realAnalytic("sum(s**k for k in range(3))", {})
+    assert not compiler.realAnalytic("sum(s**k for k in range(3)) + k", {})
+    assert not compiler.realAnalytic("sum(s**k for k in [1j, 2])", {})
@@ -0,0 +1,77 @@
+'''
+Tests of finding the frames of an animation through the Timeline
+of its tweens.
+'''
+
+import bisect
+import random
+import numpy as np
+import pytest
+
+import morpho.engine as eng
+
+# Due time of every frame worked out one frame at a time
+def dueTimes(frameCount, delays):
+    durations = []
+    for count, delay in zip(frameCount, delays):
+        durations += [1 + delay] + [1]*(count-1)
+    return [0.0] + list(np.cumsum(durations))
+
+@pytest.mark.parametrize("seed", range(20))
+def test_timeline(seed):
+    rng = random.Random(seed)
+    keyframes = rng.randint(1, 6)
+    frameCount = [rng.randint(1, 7) for n in range(keyframes)]
+    delays = [rng.choice([0, 0, 1, 2.5, 3]) for n in range(keyframes)]
+    timeline = eng.Timeline(frameCount, delays)
+    due = dueTimes(frameCount, delays)
+    assert timeline.lastFrame == sum(frameCount)
+
+    index = 0
+    for keyID, count in enumerate(frameCount):
+        for subFrame in range(count):
+            assert timeline.locate(index) == (keyID, subFrame)
+            index += 1
+    assert timeline.locate(index) == (len(frameCount), 0)
+    for index in range(len(due)):
+        assert timeline.frameTime(index) == due[index]
+
+    for time in np.arange(-2, due[-1] + 3, 0.05):
+        expected = min(max(bisect.bisect_right(due, time) - 1, 0), len(due) - 1)
+        assert timeline.frameAt(time) == expected
+
+# An animation works out its timeline again once its keyframes or
+# frame counts change.
+def test_animation_timeline():
+    mation = eng.Animation([eng.Frame(), eng.Frame()])
+    timeline = mation.timeline
+    mation.frameCount[0] = 7
+    assert mation.timeline is not timeline
+    assert mation.timeline.lastFrame == 7
+    mation.keyframes.append(eng.Frame())
+    mation.frameCount.append(3)
+    assert mation.timeline.lastFrame == 10
+    assert mation.copy().timeline.lastFrame == 10
+
+# Any frame can be asked for by index or by time, and comes out the
+# same as tweening its keyframe pair.
+def test_frame_at():
+    paths = [np.array([0, 1, 1+1j]), np.array([2, 3j, -1]), np.array([1j, 1j, 5])]
+    mation = eng.Animation([eng.Frame(paths=[eng.Path(nodes.astype(complex))])
+        for nodes in paths])
+    mation.keyframes[1].delay = 2
+    mation.frameCount = [4, 6]
+    mation.frameRate = 10
+    assert mation.frameAt(0) is mation.keyframes[0]
+    assert mation.frameAt(4) is mation.keyframes[1]
+    assert mation.frameAt(10) is mation.keyframes[2]
+    expected = mation.tweenKeyframes(1, mation.transition(3/6))
+    assert np.array_equal(mation.frameAt(7).paths[0].nodes,
+        expected.paths[0].nodes)
+    # Frame 4 is held for its delay
+    assert mation.frameIndex(0.5) == 4
+    assert mation.frameIndex(0.6) == 4
+    assert mation.frameIndex(0.7) == 5
+    assert mation.frameAt(seconds=0.7) is not mation.keyframes[1]
+    with pytest.raises(TypeError):
+        mation.frameAt()
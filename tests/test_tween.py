@@ -0,0 +1,110 @@
+'''
+Tests that the array tweens in morpho.engine give what the old
+node by node tweens did.
+'''
+
+import math
+import cmath
+import numpy as np
+import pytest
+
+import morpho.engine as eng
+
+tau = 2*math.pi
+
+# The node by node spiral and direct tweens Path.tween() used to
+# do, returning the tweened nodes and the set of deadends.
+def oldSpiral(p, q, t):
+    nodes = []
+    dthList = []
+    for n in range(len(p)):
+        r1 = abs(p[n])
+        r2 = abs(q[n])
+        th1 = cmath.phase(p[n]) % tau
+        th2 = cmath.phase(q[n]) % tau
+
+        dr = r2-r1
+        dth = eng.argShift(th1, th2)
+        dthList.append(dth)
+
+        r = r1 + t*dr
+        th = th1 + t*dth
+        nodes.append(r*cmath.exp(th*1j))
+
+    deadends = set()
+    angle_tol = 0.053
+    if 0.01 < t and t < 0.99:
+        for n in range(len(dthList)-1):
+            dth1 = dthList[n]
+            dth2 = dthList[n+1]
+            if dth1*dth2 < 0 and abs(dth1-dth2) > angle_tol:
+                deadends.add(n)
+    return nodes, deadends
+
+def oldDirect(p, q, t):
+    nodes = []
+    deadends = set()
+    for n in range(len(p)):
+        twVal = eng.tween(p[n], q[n], t)
+        nodes.append(twVal)
+        if eng.isbadnum(twVal):
+            deadends.add(n-1)
+            deadends.add(n)
+    return nodes, deadends
+
+# Random path with some nodes moved onto the axes and the origin,
+# where the angles are most likely to go wrong.
+def randomPath(rng, count):
+    nodes = (rng.standard_normal(count) + 1j*rng.standard_normal(count)) \
+        * 10**rng.uniform(-3, 3, count)
+    special = rng.random(count)
+    nodes[special < 0.05] = 0
+    nodes[(0.05 <= special) & (special < 0.1)] = \
+        nodes.real[(0.05 <= special) & (special < 0.1)]
+    nodes[(0.1 <= special) & (special < 0.15)] = \
+        1j*nodes.imag[(0.1 <= special) & (special < 0.15)]
+    return nodes
+
+def mask(deadends, count):
+    result = np.zeros(count, dtype=bool)
+    for n in deadends:
+        if 0 <= n < count:
+            result[n] = True
+    return result
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("t", [0, 0.005, 0.25, 0.5, 0.9, 1])
+def test_spiral_matches_old_tween(seed, t):
+    rng = np.random.default_rng(seed)
+    p = randomPath(rng, 500)
+    q = randomPath(rng, 500)
+    nodes, deadends = oldSpiral(p.tolist(), q.tolist(), t)
+
+    T = eng.Path(p).tween(eng.Path(q), t, "spiral")
+    scale = np.maximum(np.abs(p), np.abs(q))
+    assert np.all(np.abs(T.nodes - nodes) <= 1e-13*scale)
+    assert np.array_equal(T.deadmask, mask(deadends, len(p)))
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("t", [0, 0.3, 1])
+def test_direct_matches_old_tween(seed, t):
+    rng = np.random.default_rng(seed)
+    p = randomPath(rng, 500)
+    q = randomPath(rng, 500)
+    p[rng.random(500) < 0.05] = complex("nan")
+    q[rng.random(500) < 0.05] = complex("inf")
+    nodes, deadends = oldDirect(p.tolist(), q.tolist(), t)
+
+    T = eng.Path(p).tween(eng.Path(q), t, "direct")
+    assert np.array_equal(T.nodes, nodes, equal_nan=True)
+    assert np.array_equal(T.deadmask, mask(deadends, len(p)))
+
+# The angles come out of np.arctan2() like they come out of
+# cmath.phase(). numpy may use its own SIMD version of atan2, which
+# can be off from the C library's by an ulp, but no more.
+def test_spiral_angles_match_phase():
+    rng = np.random.default_rng(0)
+    z = randomPath(rng, 10000)
+    th = eng.spiralPolar(z, z)[2]
+    old = np.array([cmath.phase(w) % tau for w in z.tolist()])
+    assert np.all(np.abs(th - old) <= 2*np.spacing(np.maximum(old, 1)))